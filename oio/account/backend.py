@@ -22,10 +22,14 @@ import redis.sentinel
 from werkzeug.exceptions import NotFound, Conflict, BadRequest
 from oio.common.timestamp import Timestamp
 from oio.common.easy_value import int_value, true_value, float_value
+from oio.common.cache import LruCache
+from oio.common.green import RateLimiter
 from oio.common.redis_conn import RedisConn
+from oio.account.sharding import DEFAULT_VNODES, HashRing
 
 
 EXPIRE_TIME = 60  # seconds
+REFRESH_BATCH_SIZE = 1000
 
 account_fields = ['ns', 'name', 'ctime', 'containers', 'objects',
                   'bytes', 'storage_policy']
@@ -48,7 +52,98 @@ class AccountBackend(RedisConn):
                end;
                """
 
-    lua_update_container = (lua_is_sup + """
+    # Update the description of a container, and the counters
+    # of its account. Return nil, or the name of an error.
+    lua_update_container_func = (lua_is_sup + """
+               local update_container = function(account_key,
+                                                 containers_key,
+                                                 container_key, name,
+                                                 new_mtime, new_dtime,
+                                                 new_objects, new_bytes,
+                                                 autocreate_container,
+                                                 expire)
+                 if autocreate_container == 'False' then
+                   local container_name = redis.call('HGET', container_key,
+                                                     'name');
+                   if not container_name then
+                     return 'no_container';
+                   end;
+                 end;
+
+                 local objects = redis.call('HGET', container_key,
+                                            'objects');
+                 local mtime = redis.call('HGET', container_key, 'mtime');
+                 local dtime = redis.call('HGET', container_key, 'dtime');
+                 local bytes = redis.call('HGET', container_key, 'bytes');
+
+                 -- When the keys do not exist redis return false and not nil
+                 if objects == false then
+                   objects = 0
+                 end
+                 if dtime == false then
+                   dtime = '0'
+                 end
+                 if mtime == false then
+                   mtime = '0'
+                 end
+                 if bytes == false then
+                   bytes = 0
+                 end
+
+                 if autocreate_container == 'False' and
+                    is_sup(dtime, mtime) then
+                   return 'no_container';
+                 end;
+
+                 local old_mtime = mtime;
+                 local inc_objects;
+                 local inc_bytes;
+
+                 if not is_sup(new_dtime,dtime) and
+                    not is_sup(new_mtime,mtime) then
+                   return 'no_update_needed';
+                 end;
+
+                 if is_sup(new_mtime,mtime) then
+                   mtime = new_mtime;
+                 end;
+
+                 if is_sup(new_dtime,dtime) then
+                   dtime = new_dtime;
+                 end;
+                 if is_sup(dtime,mtime) then
+                   inc_objects = -objects;
+                   inc_bytes = -bytes;
+                   redis.call('HMSET', container_key,
+                              'bytes', 0, 'objects', 0);
+                   redis.call('EXPIRE', container_key, tonumber(expire));
+                   redis.call('ZREM', containers_key, name);
+                 elseif is_sup(mtime,old_mtime) then
+                   redis.call('PERSIST', container_key);
+                   inc_objects = tonumber(new_objects) - objects
+                   inc_bytes = tonumber(new_bytes) - bytes
+                   redis.call('HMSET', container_key,
+                              'bytes', tonumber(new_bytes),
+                              'objects', tonumber(new_objects));
+                   redis.call('ZADD', containers_key, '0', name);
+                 else
+                   return 'no_update_needed';
+                 end;
+
+                 redis.call('HMSET', container_key, 'mtime', mtime,
+                            'dtime', dtime, 'name', name)
+                 if inc_objects ~= 0 then
+                   redis.call('HINCRBY', account_key, 'objects',
+                              inc_objects);
+                 end;
+                 if inc_bytes ~= 0 then
+                   redis.call('HINCRBY', account_key, 'bytes', inc_bytes);
+                 end;
+                 return nil;
+               end;
+               """)
+
+    lua_update_container = (lua_update_container_func + """
                local account_id = redis.call('HGET', KEYS[4], 'id');
                if not account_id then
                  if ARGV[6] == 'True' then
@@ -60,115 +155,53 @@ class AccountBackend(RedisConn):
                  end;
                end;
 
-               if ARGV[9] == 'False' then
-                 local container_name = redis.call('HGET', KEYS[2], 'name');
-                 if not container_name then
-                   return redis.error_reply('no_container');
-                 end;
-               end;
-
-               local objects = redis.call('HGET', KEYS[2], 'objects');
-               local name = ARGV[1];
-               local mtime = redis.call('HGET', KEYS[2], 'mtime');
-               local dtime = redis.call('HGET', KEYS[2], 'dtime');
-               local bytes = redis.call('HGET', KEYS[2], 'bytes');
-
-               -- When the keys do not exist redis return false and not nil
-               if objects == false then
-                 objects = 0
-               end
-               if dtime == false then
-                 dtime = '0'
-               end
-               if mtime == false then
-                 mtime = '0'
-               end
-               if bytes == false then
-                 bytes = 0
-               end
-
-               if ARGV[9] == 'False' and is_sup(dtime, mtime) then
-                 return redis.error_reply('no_container');
-               end;
-
-               local old_mtime = mtime;
-               local inc_objects;
-               local inc_bytes;
-
-               if not is_sup(ARGV[3],dtime) and
-                  not is_sup(ARGV[2],mtime) then
-                 return redis.error_reply('no_update_needed');
-               end;
-
-               if is_sup(ARGV[2],mtime) then
-                 mtime = ARGV[2];
+               local err = update_container(KEYS[4], KEYS[3], KEYS[2],
+                                            ARGV[1], ARGV[2], ARGV[3],
+                                            ARGV[4], ARGV[5], ARGV[9],
+                                            ARGV[8]);
+               if err then
+                 return redis.error_reply(err);
                end;
+               """)
 
-               if is_sup(ARGV[3],dtime) then
-                 dtime = ARGV[3];
-               end;
-               if is_sup(dtime,mtime) then
-                 inc_objects = -objects;
-                 inc_bytes = -bytes;
-                 redis.call('HMSET', KEYS[2], 'bytes', 0, 'objects', 0);
-                 redis.call('EXPIRE', KEYS[2], tonumber(ARGV[8]));
-                 redis.call('ZREM', KEYS[3], name);
-               elseif is_sup(mtime,old_mtime) then
-                 redis.call('PERSIST', KEYS[2]);
-                 inc_objects = tonumber(ARGV[4]) - objects
-                 inc_bytes = tonumber(ARGV[5]) - bytes
-                 redis.call('HMSET', KEYS[2], 'bytes', tonumber(ARGV[5]),
-                            'objects', tonumber(ARGV[4]));
-                 redis.call('ZADD', KEYS[3], '0', name);
-               else
-                 return redis.error_reply('no_update_needed');
+    # KEYS: account ID, account key, containers key,
+    #       prefix of the container keys
+    # ARGV: autocreate_account, ctime, expiration delay,
+    #       autocreate_container, then for each container:
+    #       name, mtime, dtime, objects, bytes
+    # Return the outcome of each update ('ok' or the name of an error).
+    lua_update_containers = (lua_update_container_func + """
+               local account_id = redis.call('HGET', KEYS[2], 'id');
+               if not account_id then
+                 if ARGV[1] == 'True' then
+                   redis.call('HSET', 'accounts:', KEYS[1], 1);
+                   redis.call('HMSET', KEYS[2], 'id', KEYS[1],
+                              'bytes', 0, 'objects', 0, 'ctime', ARGV[2]);
+                 else
+                   return redis.error_reply('no_account');
+                 end;
                end;
 
-               redis.call('HMSET', KEYS[2], 'mtime', mtime,
-                          'dtime', dtime, 'name', name)
-               if inc_objects ~= 0 then
-                 redis.call('HINCRBY', KEYS[4], 'objects', inc_objects);
-               end;
-               if inc_bytes ~= 0 then
-                 redis.call('HINCRBY', KEYS[4], 'bytes', inc_bytes);
+               local results = {};
+               for i = 5, #ARGV, 5 do
+                 local err = update_container(KEYS[2], KEYS[3],
+                                              KEYS[4] .. ARGV[i],
+                                              ARGV[i], ARGV[i+1],
+                                              ARGV[i+2], ARGV[i+3],
+                                              ARGV[i+4], ARGV[4],
+                                              ARGV[3]);
+                 table.insert(results, err or 'ok');
                end;
+               return results;
                """)
 
-    lua_refresh_account = """
-        local account_id = redis.call('HGET', KEYS[1], 'id');
-        if not account_id then
-            return redis.error_reply('no_account');
-        end;
-
-        local containers = redis.call('ZRANGE', KEYS[2], 0, -1);
-        local container_key = ''
-        local bytes_sum = 0;
-        local objects_sum = 0;
-        for _,container in ipairs(containers) do
-            container_key = KEYS[3] .. container;
-            bytes_sum = bytes_sum + redis.call('HGET', container_key, 'bytes')
-            objects_sum = objects_sum + redis.call('HGET', container_key,
-                                                   'objects')
-        end;
-
-        redis.call('HMSET', KEYS[1], 'bytes', bytes_sum,
-                   'objects', objects_sum)
-        """
-
-    lua_flush_account = """
+    lua_set_account_counters = """
         local account_id = redis.call('HGET', KEYS[1], 'id');
         if not account_id then
             return redis.error_reply('no_account');
         end;
 
-        redis.call('HMSET', KEYS[1], 'bytes', 0, 'objects', 0)
-
-        local containers = redis.call('ZRANGE', KEYS[2], 0, -1);
-        redis.call('DEL', KEYS[2]);
-
-        for _,container in ipairs(containers) do
-            redis.call('DEL', KEYS[3] .. container);
-        end;
+        redis.call('HMSET', KEYS[1], 'bytes', ARGV[1], 'objects', ARGV[2])
         """
 
     def __init__(self, conf, connection=None):
@@ -177,10 +210,80 @@ class AccountBackend(RedisConn):
         super(AccountBackend, self).__init__(conf, connection)
         self.script_update_container = self.register_script(
             self.lua_update_container)
-        self.script_refresh_account = self.register_script(
-            self.lua_refresh_account)
-        self.script_flush_account = self.register_script(
-            self.lua_flush_account)
+        self.script_update_containers = self.register_script(
+            self.lua_update_containers)
+        self.script_set_account_counters = self.register_script(
+            self.lua_set_account_counters)
+        # Number of containers loaded (or deleted) at once
+        # by account refreshes (and flushes)
+        self.refresh_batch_size = int_value(
+            conf.get('refresh_batch_size'), REFRESH_BATCH_SIZE)
+        # Pages of container listings, by account. Only the updates
+        # received by this process invalidate them: keep their
+        # time-to-live short.
+        self.listing_cache = None
+        listing_cache_ttl = float_value(conf.get('listing_cache_ttl'), 0.0)
+        if listing_cache_ttl > 0.0:
+            self.listing_cache = LruCache(
+                int_value(conf.get('listing_cache_size'), 1000),
+                ttl=listing_cache_ttl)
+        # Redis instances the accounts are spread on, by address
+        self.shards = dict()
+        # Redis instances being removed, to be emptied by a rebalance
+        self.old_shards = dict()
+        self.ring = None
+        # Ring the accounts were spread with before shards were added
+        # or removed, until oio-account-rebalance has moved them
+        self.previous_ring = None
+        if conf.get('redis_shards') and not connection:
+            vnodes = int_value(conf.get('redis_shard_vnodes'),
+                               DEFAULT_VNODES)
+            self.shards = self._load_shards(conf['redis_shards'])
+            self.ring = HashRing(self.shards, vnodes=vnodes)
+            previous = [addr.strip() for addr in
+                        conf.get('redis_previous_shards', '').split(',')
+                        if addr.strip()]
+            if previous:
+                self.old_shards = self._load_shards(','.join(
+                    addr for addr in previous if addr not in self.shards))
+                self.previous_ring = HashRing(previous, vnodes=vnodes)
+
+    def _load_shards(self, addresses):
+        shards = dict()
+        for addr in addresses.split(','):
+            addr = addr.strip()
+            if not addr:
+                continue
+            host, port = addr.rsplit(':', 1)
+            shard = RedisConn(dict(self.conf, redis_host=host,
+                                   redis_port=port, sentinel_hosts=None))
+            # All shards feed the same latency histograms
+            shard.redis_latencies = self.redis_latencies
+            shards[addr] = shard
+        return shards
+
+    def _conn_for(self, account_id):
+        """Get the Redis client holding the keys of an account."""
+        if self.ring is None:
+            return self.conn
+        addr = self.ring.get_node(account_id)
+        if self.previous_ring is not None:
+            previous = self.previous_ring.get_node(account_id)
+            # The account stays on its previous shard (and is created
+            # there) until move_account() registers it on the new one.
+            if previous != addr and not self.shards[addr].conn.hexists(
+                    'accounts:', account_id):
+                return (self.shards.get(previous) or
+                        self.old_shards[previous]).conn
+        return self.shards[addr].conn
+
+    def _all_conns(self):
+        """Get the Redis clients of all shards (including old ones)."""
+        if self.ring is None:
+            return [self.conn]
+        return ([self.shards[addr].conn for addr in self.ring.nodes] +
+                [self.old_shards[addr].conn
+                 for addr in sorted(self.old_shards)])
 
     @staticmethod
     def ckey(account, name):
@@ -188,13 +291,14 @@ class AccountBackend(RedisConn):
         return 'container:%s:%s' % (account, text_type(name))
 
     def create_account(self, account_id):
-        conn = self.conn
         if not account_id:
             return None
+        conn = self._conn_for(account_id)
         if conn.hget('accounts:', account_id):
             return None
 
-        lock = self.acquire_lock_with_timeout('account:%s' % account_id, 1)
+        lock = self.acquire_lock_with_timeout('account:%s' % account_id, 1,
+                                              conn=conn)
         if not lock:
             return None
 
@@ -207,19 +311,20 @@ class AccountBackend(RedisConn):
             'ctime': Timestamp(time()).normal
         })
         pipeline.execute()
-        self.release_lock('account:%s' % account_id, lock)
+        self.release_lock('account:%s' % account_id, lock, conn=conn)
         return account_id
 
     def delete_account(self, account_id):
-        conn = self.conn
         if not account_id:
             return None
+        conn = self._conn_for(account_id)
         account_id = conn.hget('account:%s' % account_id, 'id')
 
         if not account_id:
             return None
 
-        lock = self.acquire_lock_with_timeout('account:%s' % account_id, 1)
+        lock = self.acquire_lock_with_timeout('account:%s' % account_id, 1,
+                                              conn=conn)
         if not lock:
             return None
 
@@ -234,13 +339,13 @@ class AccountBackend(RedisConn):
         pipeline.delete('account:%s' % account_id)
         pipeline.hdel('accounts:', account_id)
         pipeline.execute()
-        self.release_lock('account:%s' % account_id, lock)
+        self.release_lock('account:%s' % account_id, lock, conn=conn)
         return True
 
     def get_account_metadata(self, account_id):
-        conn = self.conn
         if not account_id:
             return None
+        conn = self._conn_for(account_id)
         account_id = conn.hget('account:%s' % account_id, 'id')
 
         if not account_id:
@@ -250,9 +355,9 @@ class AccountBackend(RedisConn):
         return meta
 
     def update_account_metadata(self, account_id, metadata, to_delete=None):
-        conn = self.conn
         if not account_id:
             return None
+        conn = self._conn_for(account_id)
         _account_id = conn.hget('account:%s' % account_id, 'id')
 
         if not _account_id:
@@ -272,9 +377,9 @@ class AccountBackend(RedisConn):
         return account_id
 
     def info_account(self, account_id):
-        conn = self.conn
         if not account_id:
             return None
+        conn = self._conn_for(account_id)
         account_id = conn.hget('account:%s' % account_id, 'id')
 
         if not account_id:
@@ -293,14 +398,18 @@ class AccountBackend(RedisConn):
         return info
 
     def list_account(self):
-        conn = self.conn
-        accounts = conn.hkeys('accounts:')
-        return accounts
-
-    def update_container(self, account_id, name, mtime, dtime, object_count,
-                         bytes_used, autocreate_account=None,
-                         autocreate_container=True):
-        conn = self.conn
+        if self.ring is None:
+            return self.conn.hkeys('accounts:')
+        # An account being moved may be listed by two shards
+        accounts = set()
+        for conn in self._all_conns():
+            accounts.update(conn.hkeys('accounts:'))
+        return sorted(accounts)
+
+    def _update_container_args(self, account_id, name, mtime, dtime,
+                               object_count, bytes_used, autocreate_account,
+                               autocreate_container):
+        """Build the keys and arguments of the container update script."""
         if not account_id or not name:
             raise BadRequest("Missing account or container")
 
@@ -326,21 +435,98 @@ class AccountBackend(RedisConn):
         args = [name, mtime, dtime, object_count, bytes_used,
                 autocreate_account, Timestamp(time()).normal, EXPIRE_TIME,
                 autocreate_container]
+        return keys, args
+
+    @staticmethod
+    def _update_container_error(exc, account_id, name):
+        """Convert an error of the container update script."""
+        if str(exc) == "no_account":
+            return NotFound("Account %s not found" % account_id)
+        if str(exc) == "no_container":
+            return NotFound("Container %s not found" % name)
+        elif str(exc) == "no_update_needed":
+            return Conflict("No update needed, "
+                            "event older than last container update")
+        return exc
+
+    def update_container(self, account_id, name, mtime, dtime, object_count,
+                         bytes_used, autocreate_account=None,
+                         autocreate_container=True):
+        keys, args = self._update_container_args(
+            account_id, name, mtime, dtime, object_count, bytes_used,
+            autocreate_account, autocreate_container)
+        conn = self._conn_for(account_id)
         try:
             self.script_update_container(keys=keys, args=args, client=conn)
         except redis.exceptions.ResponseError as exc:
-            if str(exc) == "no_account":
-                raise NotFound("Account %s not found" % account_id)
-            if str(exc) == "no_container":
-                raise NotFound("Container %s not found" % name)
-            elif str(exc) == "no_update_needed":
-                raise Conflict("No update needed, "
-                               "event older than last container update")
-            else:
-                raise
+            raise self._update_container_error(exc, account_id, name)
+        finally:
+            self._invalidate_listing(account_id)
 
         return name
 
+    def update_containers(self, account_id, containers,
+                          autocreate_account=None, autocreate_container=True):
+        """
+        Update several containers of an account with a single execution
+        of the update script, hence a single round trip to Redis.
+
+        :param containers: list of `dict` with the 'name' of each
+            container, and its 'mtime', 'dtime', 'objects' and 'bytes'
+        :returns: a list of `dict` with the 'name' and the 'status' of
+            each update (like the HTTP status of `update_container`),
+            and a 'message' when the update failed
+        """
+        if not account_id:
+            raise BadRequest("Missing account")
+        if autocreate_account is None:
+            autocreate_account = self.autocreate
+        results = list()
+        scripted = list()
+        args = [autocreate_account, Timestamp(time()).normal, EXPIRE_TIME,
+                autocreate_container]
+        for container in containers:
+            name = container.get('name')
+            result = {'name': name, 'status': 200}
+            results.append(result)
+            try:
+                _keys, cargs = self._update_container_args(
+                    account_id, name, container.get('mtime'),
+                    container.get('dtime'), container.get('objects'),
+                    container.get('bytes'), autocreate_account,
+                    autocreate_container)
+            except (BadRequest, ValueError) as exc:
+                result['status'] = 400
+                result['message'] = getattr(exc, 'description', str(exc))
+                continue
+            args.extend(cargs[:5])
+            scripted.append(result)
+        if not scripted:
+            return results
+
+        keys = [account_id, "account:%s" % account_id,
+                "containers:%s" % account_id,
+                AccountBackend.ckey(account_id, '')]
+        try:
+            outcomes = self.script_update_containers(
+                keys=keys, args=args, client=self._conn_for(account_id))
+        except redis.exceptions.ResponseError as exc:
+            if str(exc) != "no_account":
+                raise
+            outcomes = [exc] * len(scripted)
+        finally:
+            self._invalidate_listing(account_id)
+        for result, outcome in zip(scripted, outcomes):
+            if isinstance(outcome, bytes):
+                outcome = outcome.decode('utf-8')
+            if outcome == 'ok':
+                continue
+            err = self._update_container_error(outcome, account_id,
+                                               result['name'])
+            result['status'] = getattr(err, 'code', 500)
+            result['message'] = getattr(err, 'description', str(err))
+        return results
+
     def _raw_listing(self, account_id, limit, marker, end_marker, delimiter,
                      prefix):
         """Fetch tuple list of containers matching options.
@@ -348,26 +534,24 @@ class AccountBackend(RedisConn):
                      0 *reserved for objects*,
                      0 *reserved for size*,
                      0 for container, 1 for prefix]"""
-        conn = self.conn
+        conn = self._conn_for(account_id)
         if delimiter and not prefix:
             prefix = ''
         orig_marker = marker
 
+        min_ = '-'
+        max_ = '+'
+        if end_marker:
+            max_ = '(' + end_marker
+        if marker and marker >= prefix:
+            min_ = '(' + marker
+        elif prefix:
+            min_ = '[' + prefix
+
         results = []
         while len(results) < limit:
-            min = '-'
-            max = '+'
-            if end_marker:
-                max = '(' + end_marker
-            if marker and marker >= prefix:
-                min = '(' + marker
-            elif prefix:
-                min = '[' + prefix
-
-            offset = 0
-
-            container_ids = conn.zrangebylex('containers:%s' % account_id, min,
-                                             max, offset, limit - len(results))
+            container_ids = conn.zrangebylex('containers:%s' % account_id,
+                                             min_, max_, 0, limit)
             container_ids = [cid.decode('utf8', errors='ignore')
                              for cid in container_ids]
 
@@ -382,32 +566,46 @@ class AccountBackend(RedisConn):
                     containers = [[c_id, 0, 0, 0, 0] for c_id in container_ids
                                   if c_id.startswith(prefix)]
                     return containers
+            if not container_ids:
+                break
 
-            count = 0
+            # Skip the containers of the common prefixes found in the page,
+            # and jump after the last one if the page ends inside it.
+            dir_name = None
             for container_id in container_ids:
-                count += 1
-                marker = container_id
-                if len(results) >= limit\
-                        or not container_id.startswith(prefix):
+                if dir_name is not None and container_id.startswith(dir_name):
+                    continue
+                dir_name = None
+                if not container_id.startswith(prefix):
                     return results
                 end = container_id.find(delimiter, len(prefix))
                 if end > 0:
-                    marker = container_id[:end] + chr(ord(delimiter) + 1)
                     dir_name = container_id[:end + 1]
                     if dir_name != orig_marker:
                         results.append([dir_name, 0, 0, 1, 0])
-                    break
-                results.append([container_id, 0, 0, 0, 0])
-            if not count:
-                break
+                else:
+                    results.append([container_id, 0, 0, 0, 0])
+                if len(results) >= limit:
+                    return results
+            if dir_name is not None:
+                min_ = '[' + dir_name[:-1] + chr(ord(delimiter) + 1)
+            else:
+                min_ = '(' + container_ids[-1]
         return results
 
     def list_containers(self, account_id, limit=1000, marker=None,
                         end_marker=None, prefix=None, delimiter=None):
+        cache_key = (prefix, marker, end_marker, delimiter, limit)
+        pages = None
+        if self.listing_cache is not None:
+            pages = self.listing_cache.get(account_id)
+            if pages is not None and cache_key in pages:
+                return [list(entry) for entry in pages[cache_key]]
+
         raw_list = self._raw_listing(account_id, limit=limit, marker=marker,
                                      end_marker=end_marker, prefix=prefix,
                                      delimiter=delimiter)
-        pipeline = self.conn.pipeline(True)
+        pipeline = self._conn_for(account_id).pipeline(True)
         # skip prefix
         for container in [entry for entry in raw_list if not entry[3]]:
             pipeline.hmget(AccountBackend.ckey(account_id, container[0]),
@@ -422,42 +620,117 @@ class AccountBackend(RedisConn):
                 container[4] = float_value(res[i][2], 0.0)
                 i += 1
 
+        if self.listing_cache is not None:
+            if pages is None:
+                pages = dict()
+                self.listing_cache.put(account_id, pages)
+            pages[cache_key] = [list(entry) for entry in raw_list]
         return raw_list
 
+    def _invalidate_listing(self, account_id):
+        if self.listing_cache is not None:
+            self.listing_cache.pop(account_id)
+
     def status(self):
-        conn = self.conn
-        account_count = conn.hlen('accounts:')
-        status = {'account_count': account_count}
+        if self.ring is None:
+            status = {'account_count': self.conn.hlen('accounts:')}
+        else:
+            # Like list_account, count accounts being moved only once
+            status = {'account_count': len(self.list_account()),
+                      'shards': self.ring.nodes}
         return status
 
-    def refresh_account(self, account_id):
-        if not account_id:
-            raise BadRequest("Missing account")
-
-        keys = ["account:%s" % account_id,
-                "containers:%s" % account_id,
-                "container:%s:" % account_id]
-
+    def _set_account_counters(self, account_id, bytes_used, object_count):
+        keys = ["account:%s" % account_id]
         try:
-            self.script_refresh_account(keys=keys, client=self.conn)
+            self.script_set_account_counters(
+                keys=keys, args=[bytes_used, object_count],
+                client=self._conn_for(account_id))
         except redis.exceptions.ResponseError as exc:
             if str(exc) == "no_account":
                 raise NotFound(account_id)
             else:
                 raise
 
-    def flush_account(self, account_id):
+    def _check_account(self, account_id):
         if not account_id:
             raise BadRequest("Missing account")
+        conn = self._conn_for(account_id)
+        if not conn.hget('account:%s' % account_id, 'id'):
+            raise NotFound(account_id)
 
-        keys = ["account:%s" % account_id,
-                "containers:%s" % account_id,
-                "container:%s:" % account_id]
+    def refresh_account(self, account_id, limiter=None):
+        """
+        Recompute the counters of an account from the counters of its
+        containers. The containers are loaded by slices of
+        `refresh_batch_size`, so Redis is never blocked for long, and
+        the counters are saved at the end. Containers updated while the
+        account is being refreshed may be counted with their previous
+        counters.
+
+        :param limiter: a `RateLimiter`, limiting the number
+            of containers loaded per second
+        """
+        self._check_account(account_id)
+        conn = self._conn_for(account_id)
+        bytes_sum = 0
+        objects_sum = 0
+        min_ = '-'
+        while True:
+            names = conn.zrangebylex('containers:%s' % account_id, min_, '+',
+                                     0, self.refresh_batch_size)
+            if not names:
+                break
+            names = [name.decode('utf8', errors='ignore') for name in names]
+            pipeline = conn.pipeline(False)
+            for name in names:
+                pipeline.hmget(AccountBackend.ckey(account_id, name),
+                               'bytes', 'objects')
+            for bytes_used, object_count in pipeline.execute():
+                bytes_sum += int_value(bytes_used, 0)
+                objects_sum += int_value(object_count, 0)
+            min_ = '(' + names[-1]
+            if limiter is not None:
+                limiter.wait(len(names))
+        self._set_account_counters(account_id, bytes_sum, objects_sum)
+
+    def refresh_all_accounts(self, containers_per_second=0):
+        """
+        Refresh all accounts, one after the other.
 
-        try:
-            self.script_flush_account(keys=keys, client=self.conn)
-        except redis.exceptions.ResponseError as exc:
-            if str(exc) == "no_account":
-                raise NotFound(account_id)
-            else:
-                raise
+        :param containers_per_second: maximum number of containers
+            loaded per second (0 means unlimited)
+        :returns: the number of accounts refreshed
+        """
+        limiter = RateLimiter(containers_per_second)
+        refreshed = 0
+        for account_id in self.list_account():
+            try:
+                self.refresh_account(account_id, limiter=limiter)
+                refreshed += 1
+            except NotFound:
+                # Deleted in the meantime
+                pass
+        return refreshed
+
+    def flush_account(self, account_id):
+        """
+        Delete all containers of an account, by slices of
+        `refresh_batch_size`, then reset the counters of the account.
+        """
+        self._check_account(account_id)
+        conn = self._conn_for(account_id)
+        containers_key = 'containers:%s' % account_id
+        while True:
+            names = conn.zrangebylex(containers_key, '-', '+',
+                                     0, self.refresh_batch_size)
+            if not names:
+                break
+            pipeline = conn.pipeline(True)
+            pipeline.zrem(containers_key, *names)
+            pipeline.delete(*[AccountBackend.ckey(
+                account_id, name.decode('utf8', errors='ignore'))
+                for name in names])
+            pipeline.execute()
+            self._invalidate_listing(account_id)
+        self._set_account_counters(account_id, 0, 0)
@@ -192,6 +192,25 @@ class AccountClient(HttpApi):
                                            data=json.dumps(metadata), **kwargs)
         return body
 
+    def container_update_many(self, account, containers, **kwargs):
+        """
+        Update account with metadata of several containers,
+        in a single request.
+
+        :param account: name of the account to update
+        :type account: `str`
+        :param containers: metadata of each container ("name", "bytes",
+            "objects", "mtime", "dtime")
+        :type containers: `list` of `dict`
+        :returns: the outcome of each update, in the same order
+        :rtype: `list` of `dict` with 'name', 'status' (`int`, like the
+            HTTP status of `container_update`) and 'message' on failure
+        """
+        data = json.dumps({'containers': containers})
+        _resp, body = self.account_request(
+            account, 'POST', 'container/update-many', data=data, **kwargs)
+        return body['containers']
+
     def container_reset(self, account, container, mtime, **kwargs):
         """
         Reset container of an account
@@ -217,6 +236,13 @@ class AccountClient(HttpApi):
         """
         self.account_request(account, 'POST', 'refresh', **kwargs)
 
+    def account_refresh_all(self, **kwargs):
+        """
+        Make the account service refresh the counters of all accounts,
+        in background. The refresh rate is limited by the service.
+        """
+        self.account_request(None, 'POST', 'refresh-all', **kwargs)
+
     def account_flush(self, account, **kwargs):
         """
         Flush all containers of an account
@@ -14,14 +14,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import eventlet
 from werkzeug.wrappers import Response
 from werkzeug.routing import Map, Rule
 from werkzeug.exceptions import NotFound, BadRequest, Conflict
 from functools import wraps
 
 from oio.account.backend import AccountBackend
+from oio.common.easy_value import int_value
 from oio.common.json import json
 from oio.common.logger import get_logger
+from oio.common.metrics import LatencyHistograms
+from oio.common.utils import monotonic_time
 from oio.common.wsgi import WerkzeugApp
 
 
@@ -44,6 +48,15 @@ class Account(WerkzeugApp):
         self.conf = conf
         self.backend = backend
         self.logger = logger or get_logger(conf)
+        # Background refresh of all accounts
+        self.refresh_all = None
+        self.refresh_containers_per_second = int_value(
+            conf.get('refresh_containers_per_second'), 10000)
+        # Expiration of the lock shared by all account services
+        self.refresh_lock_timeout = int_value(
+            conf.get('refresh_lock_timeout'), 3600)
+        # Duration of the requests, by endpoint
+        self.latencies = LatencyHistograms()
 
         self.url_map = Map([
             Rule('/status', endpoint='status'),
@@ -54,14 +67,30 @@ class Account(WerkzeugApp):
             Rule('/v1.0/account/show', endpoint='account_show'),
             Rule('/v1.0/account/containers', endpoint='account_containers'),
             Rule('/v1.0/account/refresh', endpoint='account_refresh'),
+            Rule('/v1.0/account/refresh-all',
+                 endpoint='account_refresh_all'),
             Rule('/v1.0/account/flush', endpoint='account_flush'),
             Rule('/v1.0/account/container/update',
                  endpoint='account_container_update'),
+            Rule('/v1.0/account/container/update-many',
+                 endpoint='account_container_update_many'),
             Rule('/v1.0/account/container/reset',
                  endpoint='account_container_reset')
         ])
         super(Account, self).__init__(self.url_map, self.logger)
 
+    def dispatch_request(self, req):
+        start = monotonic_time()
+        try:
+            return super(Account, self).dispatch_request(req)
+        finally:
+            try:
+                endpoint, _ = self.url_map.bind_to_environ(
+                    req.environ).match()
+            except Exception:
+                endpoint = 'unknown'
+            self.latencies.observe(endpoint, monotonic_time() - start)
+
     def _get_account_id(self, req):
         account_id = req.args.get('id')
         if not account_id:
@@ -91,11 +120,19 @@ class Account(WerkzeugApp):
     #    Content-Type: text/json; charset=utf-8
     #    Content-Length: 20
     #
-    #    {"account_count": 0}
+    #    {"account_count": 0, "requests": {...}, "redis": {...}}
+    #
+    # "requests" and "redis" give histograms of the duration of the
+    # requests (by endpoint) and of the Redis commands (by name), since
+    # the start of the worker which answered: the number of durations,
+    # their sum, their maximum, and the number of durations below each
+    # bound (in seconds).
     #
     # }}ACCT
     def on_status(self, req):
         status = self.backend.status()
+        status['requests'] = self.latencies.to_dict()
+        status['redis'] = self.backend.redis_latencies.to_dict()
         return Response(json.dumps(status), mimetype='text/json')
 
     def on_account_create(self, req):
@@ -178,6 +215,16 @@ class Account(WerkzeugApp):
         result = json.dumps(info)
         return Response(result)
 
+    def on_account_container_update_many(self, req):
+        account_id = self._get_account_id(req)
+        d = json.loads(req.get_data())
+        containers = d.get('containers')
+        if not isinstance(containers, list):
+            raise BadRequest('Missing list of containers')
+        results = self.backend.update_containers(account_id, containers)
+        return Response(json.dumps({'containers': results}),
+                        mimetype='text/json')
+
     def on_account_container_reset(self, req):
         account_id = self._get_account_id(req)
         data = json.loads(req.get_data())
@@ -197,6 +244,30 @@ class Account(WerkzeugApp):
         self.backend.refresh_account(account_id)
         return Response(status=204)
 
+    def _refresh_all_accounts(self):
+        # The other workers (and services) share the same database
+        lock = self.backend.acquire_lock_with_timeout(
+            'refresh_all_accounts', acquire_timeout=1,
+            lock_timeout=self.refresh_lock_timeout)
+        if not lock:
+            self.logger.info("Accounts are already being refreshed")
+            return
+        try:
+            refreshed = self.backend.refresh_all_accounts(
+                containers_per_second=self.refresh_containers_per_second)
+            self.logger.info("%d accounts refreshed", refreshed)
+        except Exception:
+            self.logger.exception("Failed to refresh all accounts")
+        finally:
+            self.backend.release_lock('refresh_all_accounts', lock)
+
+    def on_account_refresh_all(self, req):
+        # Refresh in background, at most one refresh at a time
+        # (in this worker, then a Redis lock is taken)
+        if self.refresh_all is None or self.refresh_all.dead:
+            self.refresh_all = eventlet.spawn(self._refresh_all_accounts)
+        return Response(status=202)
+
     def on_account_flush(self, req):
         account_id = self._get_account_id(req)
         self.backend.flush_account(account_id)
@@ -0,0 +1,164 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+from bisect import bisect
+from hashlib import md5
+
+from six import text_type
+
+
+# Number of points of each shard on the ring
+DEFAULT_VNODES = 100
+# Expiration of the locks of an account being moved,
+# extended after each slice of containers
+MOVE_LOCK_TIMEOUT = 60
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys on a set of nodes. Each node is placed
+    at `vnodes` points of the ring, so adding (or removing) a node
+    only moves the keys of this node.
+    """
+
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        self.nodes = sorted(nodes)
+        if not self.nodes:
+            raise ValueError('No node in the ring')
+        points = sorted((self._hash('%s-%d' % (node, i)), node)
+                        for node in self.nodes
+                        for i in range(vnodes))
+        self._hashes = [point[0] for point in points]
+        self._nodes = [point[1] for point in points]
+
+    @staticmethod
+    def _hash(key):
+        if isinstance(key, text_type):
+            key = key.encode('utf-8')
+        return int(md5(key).hexdigest()[:16], 16)
+
+    def get_node(self, key):
+        """Get the node in charge of `key`."""
+        index = bisect(self._hashes, self._hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+def account_keys(account_id):
+    """Keys of an account, except the ones of its containers."""
+    return ['account:%s' % account_id,
+            'metadata:%s' % account_id,
+            'containers:%s' % account_id]
+
+
+def _copy_keys(src, dst, keys):
+    """Copy `keys` (and their time-to-live) from `src` to `dst`."""
+    pipeline = src.pipeline(False)
+    for key in keys:
+        pipeline.pttl(key)
+        pipeline.dump(key)
+    res = pipeline.execute()
+    pipeline = dst.pipeline(True)
+    for key, ttl, value in zip(keys, res[0::2], res[1::2]):
+        if value is None:
+            # Expired or deleted in the meantime
+            continue
+        pipeline.restore(key, max(ttl, 0), value, replace=True)
+    pipeline.execute()
+
+
+def move_account(backend, account_id, src, dst,
+                 lock_timeout=MOVE_LOCK_TIMEOUT):
+    """
+    Move all keys of an account from the `src` Redis client
+    to the `dst` Redis client, by slices of containers.
+
+    The account is locked on both clients (it cannot be created or
+    deleted) while being moved, but container updates received in the
+    meantime may be lost: stop the services updating the account first.
+
+    :param lock_timeout: expiration of the locks, extended after
+        each slice of containers
+    """
+    if dst.hexists('accounts:', account_id):
+        # Do not overwrite an account created on the destination
+        raise Exception('Account %s already exists on the destination' %
+                        account_id)
+    lockname = 'account:%s' % account_id
+    locks = list()
+    try:
+        for conn in (src, dst):
+            lock = backend.acquire_lock_with_timeout(
+                lockname, 1, lock_timeout=lock_timeout, conn=conn)
+            if not lock:
+                raise Exception('Failed to lock account %s' % account_id)
+            locks.append((conn, lock))
+        keys = account_keys(account_id)
+        containers_key = 'containers:%s' % account_id
+        min_ = '-'
+        while True:
+            names = src.zrangebylex(containers_key, min_, '+',
+                                    0, backend.refresh_batch_size)
+            if not names:
+                break
+            names = [name.decode('utf8', errors='ignore') for name in names]
+            container_keys = [backend.ckey(account_id, name)
+                              for name in names]
+            _copy_keys(src, dst, container_keys)
+            keys.extend(container_keys)
+            min_ = '(' + names[-1]
+            for conn, _ in locks:
+                conn.expire('lock:' + lockname, lock_timeout)
+        _copy_keys(src, dst, keys[:3])
+        dst.hset('accounts:', account_id, 1)
+
+        # The account is now served by the destination
+        src.hdel('accounts:', account_id)
+        for i in range(0, len(keys), backend.refresh_batch_size):
+            src.delete(*keys[i:i + backend.refresh_batch_size])
+    finally:
+        for conn, lock in locks:
+            backend.release_lock(lockname, lock, conn=conn)
+    backend._invalidate_listing(account_id)
+
+
+def rebalance_accounts(backend, dry_run=False, logger=None):
+    """
+    Move each account of a sharded backend to the shard it is
+    hashed to, after shards have been added or removed.
+    The shards of the previous configuration must be passed in
+    `redis_previous_shards`, so that the removed ones are emptied.
+
+    :returns: the list of (account, source shard, destination shard)
+        of the accounts moved (or to be moved, when `dry_run` is set)
+    """
+    moves = list()
+    shards = dict(backend.old_shards)
+    shards.update(backend.shards)
+    for name in sorted(shards):
+        src = shards[name].conn
+        for account_id in src.hkeys('accounts:'):
+            if isinstance(account_id, bytes):
+                account_id = account_id.decode('utf-8')
+            target = backend.ring.get_node(account_id)
+            if target == name:
+                continue
+            moves.append((account_id, name, target))
+            if logger:
+                logger.info('Moving account %s from %s to %s',
+                            account_id, name, target)
+            if not dry_run:
+                move_account(backend, account_id, src,
+                             backend.shards[target].conn)
+    return moves
@@ -14,14 +14,18 @@
 # License along with this library.
 
 import collections
+from six import string_types
+import ctypes
 import math
 import hashlib
 import logging
+import multiprocessing
+import sys
 try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
-from eventlet import Queue, Timeout, GreenPile
+from eventlet import Queue, Timeout, GreenPile, patcher, tpool
 from greenlet import GreenletExit
 from oio.common import exceptions
 from oio.common.exceptions import SourceReadError
@@ -35,6 +39,261 @@ from oio.common import green
 
 logger = logging.getLogger(__name__)
 
+# Number of EC segments encoded at once by ECSegmentEncoder
+EC_ENCODE_BATCH = 4
+# Size of the buffers shared with each worker of ECProcessExecutor:
+# enough for a batch of segments and their fragments
+EC_PROCESS_BUFFER_SIZE = 2 * EC_ENCODE_BATCH * 1048576
+
+
+def _run_ec_operation(driver, operation, args):
+    """Run an operation of the EC driver."""
+    if operation == 'encode_segments':
+        return [driver.encode(segment) for segment in args[0]]
+    return getattr(driver, operation)(*args)
+
+
+_EC_DRIVERS = dict()
+
+
+def _load_ec_driver(ec_type, k, m):
+    """Load an EC driver, once per process."""
+    key = (ec_type, k, m)
+    driver = _EC_DRIVERS.get(key)
+    if driver is None:
+        from pyeclib.ec_iface import ECDriver
+        driver = ECDriver(k=k, m=m, ec_type=ec_type)
+        _EC_DRIVERS[key] = driver
+    return driver
+
+
+class _BufferFull(Exception):
+    pass
+
+
+def _buffer_write(buf, offset, value):
+    """
+    Copy the byte strings of `value` (a byte string, or a possibly
+    nested list) to the shared buffer `buf`, starting at `offset`.
+
+    :returns: a description of `value` for `_buffer_read`,
+        and the offset following the data written
+    :raises _BufferFull: if the byte strings do not fit in `buf`
+    """
+    if isinstance(value, bytes):
+        end = offset + len(value)
+        if end > len(buf):
+            raise _BufferFull()
+        ctypes.memmove(ctypes.addressof(buf) + offset, value, len(value))
+        return ('b', offset, len(value)), end
+    if isinstance(value, list):
+        items = list()
+        for item in value:
+            desc, offset = _buffer_write(buf, offset, item)
+            items.append(desc)
+        return ('l', items), offset
+    return ('v', value), offset
+
+
+def _buffer_read(buf, desc):
+    """Build a value from its description made by `_buffer_write`."""
+    if desc[0] == 'b':
+        return ctypes.string_at(ctypes.addressof(buf) + desc[1], desc[2])
+    if desc[0] == 'l':
+        return [_buffer_read(buf, item) for item in desc[1]]
+    return desc[1]
+
+
+# Buffers shared with the parent, in a worker of ECProcessExecutor
+_WORKER_BUFFERS = None
+
+
+def _init_ec_worker(buffers):
+    global _WORKER_BUFFERS
+    _WORKER_BUFFERS = buffers
+
+
+def _run_ec_operation_in_process(ec_params, operation, slot, args):
+    """
+    Run an operation of the EC driver, from a worker process.
+    The arguments are read from the shared buffer `slot`, and the
+    result is written to it, unless it does not fit.
+
+    :returns: a boolean telling if the result is in the shared buffer,
+        and the result or its description
+    """
+    buf = _WORKER_BUFFERS[slot]
+    args = _buffer_read(buf, args)
+    result = _run_ec_operation(_load_ec_driver(*ec_params), operation, args)
+    try:
+        return True, _buffer_write(buf, 0, result)[0]
+    except _BufferFull:
+        return False, result
+
+
+def _unpatched_pool_class():
+    """
+    Get the `Pool` class of multiprocessing, imported with the original
+    threading, Queue and time modules. The pool feeds its workers and
+    collects their results from threads: once eventlet has monkey
+    patched these modules, they would be green threads, never scheduled
+    while a native thread waits for a result.
+    """
+    import multiprocessing.pool
+    pool_module = patcher.inject(
+        'multiprocessing.pool', None,
+        ('threading', patcher.original('threading')),
+        ('Queue', patcher.original('Queue')),
+        ('time', patcher.original('time')))
+    # The import replaced the submodule attribute of the package
+    multiprocessing.pool = sys.modules['multiprocessing.pool']
+    return pool_module.Pool
+
+
+class ECInlineExecutor(object):
+    """
+    Run EC operations in the calling green thread.
+    This blocks the eventlet hub while the operation runs.
+    """
+
+    def run(self, storage_method, operation, *args):
+        """
+        Run `operation` (the name of a method of the EC driver,
+        or 'encode_segments') with `args`, and return its result.
+        """
+        return _run_ec_operation(storage_method.driver, operation, args)
+
+    def encode_segments(self, storage_method, segments):
+        """Encode a list of segments, return a list of fragment lists."""
+        return self.run(storage_method, 'encode_segments', segments)
+
+    def decode(self, storage_method, fragments):
+        return self.run(storage_method, 'decode', fragments)
+
+    def reconstruct(self, storage_method, fragments, missing):
+        return self.run(storage_method, 'reconstruct', fragments, missing)
+
+
+class ECThreadExecutor(ECInlineExecutor):
+    """
+    Run EC operations in the eventlet pool of native threads.
+    Useful with EC drivers that release the GIL.
+    The size of the pool is a process-wide setting,
+    see `set_ec_thread_workers()`.
+    """
+
+    def run(self, storage_method, operation, *args):
+        return tpool.execute(_run_ec_operation, storage_method.driver,
+                             operation, args)
+
+
+def set_ec_thread_workers(workers):
+    """
+    Set the number of native threads running EC operations with the
+    'thread' executor. These threads are eventlet's thread pool, which
+    is shared by the whole process (its default size comes from the
+    EVENTLET_THREADPOOL_SIZE environment variable). A running pool
+    is stopped once its threads have finished their current operation,
+    and restarted with the new size by the next operation.
+    """
+    tpool.killall()
+    tpool.set_num_threads(workers)
+
+
+class ECProcessExecutor(ECInlineExecutor):
+    """
+    Run EC operations in a pool of worker processes.
+    Each worker loads its own EC driver. Segments and fragments are
+    copied to a buffer shared with the worker instead of being pickled.
+    """
+
+    def __init__(self, workers=None, buffer_size=EC_PROCESS_BUFFER_SIZE):
+        """
+        :param workers: number of worker processes,
+            defaults to the number of CPUs
+        :param buffer_size: size of the buffer shared with each worker.
+            Operations whose data does not fit are pickled.
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.buffer_size = buffer_size
+        self._pool = None
+        self._buffers = None
+        self._free_slots = None
+
+    def _start(self):
+        # The buffers must exist before the workers are forked
+        self._buffers = [
+            multiprocessing.RawArray(ctypes.c_char, self.buffer_size)
+            for _ in range(self.workers)]
+        self._free_slots = Queue()
+        for slot in range(self.workers):
+            self._free_slots.put(slot)
+        self._pool = _unpatched_pool_class()(
+            self.workers, _init_ec_worker, (self._buffers, ))
+
+    def run(self, storage_method, operation, *args):
+        if self._pool is None:
+            self._start()
+        ec_params = (storage_method.ec_type, storage_method.ec_nb_data,
+                     storage_method.ec_nb_parity)
+        slot = self._free_slots.get()
+        try:
+            buf = self._buffers[slot]
+            try:
+                desc = _buffer_write(buf, 0, list(args))[0]
+            except _BufferFull:
+                desc = ('v', list(args))
+            # Wait for the result from a native thread,
+            # not to block the eventlet hub.
+            shared, result = tpool.execute(
+                self._pool.apply, _run_ec_operation_in_process,
+                (ec_params, operation, slot, desc))
+            if shared:
+                result = _buffer_read(buf, result)
+            return result
+        finally:
+            self._free_slots.put(slot)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._buffers = None
+
+
+EC_EXECUTORS = {
+    'inline': ECInlineExecutor,
+    'thread': ECThreadExecutor,
+    'process': ECProcessExecutor,
+}
+
+_EC_EXECUTOR_INSTANCES = dict()
+
+
+def load_ec_executor(storage_method, ec_executor=None, **_kwargs):
+    """
+    Get the executor which will run the EC operations.
+
+    :param ec_executor: name of the executor ('inline', 'thread'
+        or 'process'), or an executor instance. Defaults to the
+        executor configured in the storage method, or 'inline'.
+    :raises ValueError: if the executor name is unknown
+    """
+    if ec_executor is None:
+        ec_executor = getattr(storage_method, 'ec_executor', None) or 'inline'
+    if not isinstance(ec_executor, string_types):
+        return ec_executor
+    executor = _EC_EXECUTOR_INSTANCES.get(ec_executor)
+    if executor is None:
+        try:
+            executor_cls = EC_EXECUTORS[ec_executor]
+        except KeyError:
+            raise ValueError('Unknown EC executor: %s' % ec_executor)
+        executor = executor_cls()
+        _EC_EXECUTOR_INSTANCES[ec_executor] = executor
+    return executor
+
 
 def segment_range_to_fragment_range(segment_start, segment_end, segment_size,
                                     fragment_size):
@@ -95,11 +354,15 @@ class ECChunkDownloadHandler(object):
     """
 
     def __init__(self, storage_method, chunks, meta_start, meta_end, headers,
-                 connection_timeout=None, read_timeout=None,
-                 **_kwargs):
+                 connection_timeout=None, read_timeout=None, rawx_pool=None,
+                 **kwargs):
         """
         :param connection_timeout: timeout to establish the connections
         :param read_timeout: timeout to read a buffer of data
+        :param rawx_pool: optional `HttpConnectionPool` providing
+            keep-alive connections to rawx services
+
+        See `load_ec_executor` for executor related keyword arguments.
         """
         self.storage_method = storage_method
         self.chunks = chunks
@@ -111,6 +374,8 @@ class ECChunkDownloadHandler(object):
         self.headers = headers
         self.connection_timeout = connection_timeout
         self.read_timeout = read_timeout
+        self.rawx_pool = rawx_pool
+        self.executor = load_ec_executor(storage_method, **kwargs)
 
     def _get_range_infos(self):
         """
@@ -156,7 +421,7 @@ class ECChunkDownloadHandler(object):
         reader = io.ChunkReader(chunk_iter, storage_method.ec_fragment_size,
                                 headers, self.connection_timeout,
                                 self.read_timeout,
-                                align=True)
+                                align=True, rawx_pool=self.rawx_pool)
         return (reader, reader.get_iter())
 
     def get_stream(self):
@@ -185,7 +450,8 @@ class ECChunkDownloadHandler(object):
             fragment_length = int(resp_headers.get('Content-Length'))
             read_iterators = [it for _, it in readers]
             stream = ECStream(self.storage_method, read_iterators, range_infos,
-                              self.meta_length, fragment_length)
+                              self.meta_length, fragment_length,
+                              executor=self.executor)
             # start the stream
             stream.start()
             return stream
@@ -200,8 +466,9 @@ class ECStream(object):
     Handles the different readers.
     """
     def __init__(self, storage_method, readers, range_infos, meta_length,
-                 fragment_length):
+                 fragment_length, executor=None):
         self.storage_method = storage_method
+        self.executor = executor or load_ec_executor(storage_method)
         self.readers = readers
         self.range_infos = range_infos
         self.meta_length = meta_length
@@ -318,7 +585,7 @@ class ECStream(object):
                     break
                 # actually decode the fragments into a segment
                 try:
-                    segment = self.storage_method.driver.decode(data)
+                    segment = self.executor.decode(self.storage_method, data)
                 except exceptions.ECError:
                     # something terrible happened
                     logger.exception("ERROR decoding fragments")
@@ -522,6 +789,100 @@ def ec_encode(storage_method, n):
     yield last_fragments
 
 
+class ECSegmentEncoder(object):
+    """
+    Encode a stream of data into EC fragments, several segments at a time.
+
+    Input data is accumulated into a buffer allocated once, which is
+    reused between batches. The fragments of a batch are written into
+    one buffer per chunk, already framed for chunked transfer encoding,
+    so they can be sent to the rawx services without further copy.
+    """
+
+    def __init__(self, storage_method, nb_chunks,
+                 batch_segments=EC_ENCODE_BATCH, executor=None):
+        self.storage_method = storage_method
+        self.executor = executor or load_ec_executor(storage_method)
+        self.nb_chunks = nb_chunks
+        self.segment_size = storage_method.ec_segment_size
+        self._buf = bytearray(self.segment_size * max(1, batch_segments))
+        self._view = memoryview(self._buf)
+        self._len = 0
+
+    def feed(self, data):
+        """
+        Append `data` to the input buffer, and encode it if the buffer
+        gets full.
+
+        :returns: a list of batches of encoded fragments. Each batch is
+            a list with, for each chunk, a tuple with a `memoryview`
+            on the framed fragments and a `memoryview` on the fragments.
+        """
+        batches = list()
+        offset = 0
+        while offset < len(data):
+            amount = min(len(data) - offset, len(self._buf) - self._len)
+            self._view[self._len:self._len + amount] = \
+                data[offset:offset + amount]
+            self._len += amount
+            offset += amount
+            if self._len == len(self._buf):
+                batches.append(self._encode_batch())
+        return batches
+
+    def _encode_batch(self):
+        """Encode all the complete segments of the input buffer."""
+        nb_segments = self._len // self.segment_size
+        encoded = self.executor.encode_segments(
+            self.storage_method,
+            [self._view[i * self.segment_size:
+                        (i + 1) * self.segment_size].tobytes()
+             for i in range(nb_segments)])
+
+        # Move the incomplete segment at the beginning of the buffer
+        encoded_len = nb_segments * self.segment_size
+        left = self._len - encoded_len
+        if left:
+            self._view[:left] = self._view[encoded_len:self._len].tobytes()
+        self._len = left
+
+        # Write the fragments of each chunk in a single framed buffer
+        columns = list()
+        for index in range(self.nb_chunks):
+            fragments = [segment[index] for segment in encoded]
+            data_size = sum(len(fragment) for fragment in fragments)
+            header = ('%x\r\n' % data_size).encode()
+            frame = bytearray(len(header) + data_size + 2)
+            view = memoryview(frame)
+            view[:len(header)] = header
+            offset = len(header)
+            for fragment in fragments:
+                view[offset:offset + len(fragment)] = fragment
+                offset += len(fragment)
+            view[offset:] = b'\r\n'
+            columns.append((view, view[len(header):offset]))
+        return columns
+
+    def flush(self):
+        """
+        Encode what is left in the input buffer.
+
+        :returns: a tuple with the last batch of encoded fragments
+            (see `feed`), or None, and a list with the fragments of the
+            last incomplete segment (empty strings if there is none)
+        """
+        batch = None
+        if self._len >= self.segment_size:
+            batch = self._encode_batch()
+        if self._len:
+            last = self.executor.encode_segments(
+                self.storage_method, [self._view[:self._len].tobytes()])[0]
+            self._len = 0
+        else:
+            last = [b''] * self.nb_chunks
+        return batch, last
+
+
 class EcChunkWriter(object):
     """
     Writes an EC chunk
@@ -550,7 +911,15 @@ class EcChunkWriter(object):
 
     @classmethod
     def connect(cls, chunk, sysmeta, reqid=None,
-                connection_timeout=None, write_timeout=None, **kwargs):
+                connection_timeout=None, write_timeout=None, rawx_pool=None,
+                **kwargs):
+        """
+        Connect to the rawx service hosting `chunk`.
+
+        :param rawx_pool: optional `HttpConnectionPool` to take an idle
+            connection from. The connection is not given back to the pool:
+            the trailers sent by `finish()` do not leave it reusable.
+        """
         raw_url = chunk["url"]
         parsed = urlparse(raw_url)
         chunk_path = parsed.path.split('/')[-1]
@@ -569,7 +938,7 @@ class EcChunkWriter(object):
         with green.ConnectionTimeout(
                 connection_timeout or io.CONNECTION_TIMEOUT):
             conn = io.http_connect(
-                parsed.netloc, 'PUT', parsed.path, hdrs)
+                parsed.netloc, 'PUT', parsed.path, hdrs, pool=rawx_pool)
             conn.chunk = chunk
         return cls(chunk, conn, write_timeout=write_timeout, **kwargs)
 
@@ -580,17 +949,15 @@ class EcChunkWriter(object):
     def _send(self):
         """Send coroutine loop"""
         while True:
-            # fetch input data from the queue
-            data = self.queue.get()
-            # use HTTP transfer encoding chunked
-            # to write data to RAWX
+            # fetch input data (already formatted for HTTP
+            # transfer encoding chunked) from the queue
+            to_send, data_size = self.queue.get()
+            # write data to RAWX
             if not self.failed:
-                # format the chunk
-                to_send = b"%x\r\n%s\r\n" % (len(data), data)
                 try:
                     with green.ChunkWriteTimeout(self.write_timeout):
                         self.conn.send(to_send)
-                        self.bytes_transferred += len(data)
+                        self.bytes_transferred += data_size
                 except (Exception, green.ChunkWriteTimeout) as exc:
                     self.failed = True
                     msg = str(exc)
@@ -612,9 +979,21 @@ class EcChunkWriter(object):
         # this will end the chunked body
         if not data:
             return
-        # put the data to send into the queue
+        # format the chunk, put it into the queue
         # it will be processed by the send coroutine
-        self.queue.put(data)
+        to_send = b"%x\r\n%s\r\n" % (len(data), data)
+        self.queue.put((to_send, len(data)))
+
+    def send_frame(self, frame, data_size):
+        """
+        Send data already formatted for HTTP transfer encoding chunked.
+
+        :param frame: the formatted data (any bytes-like object)
+        :param data_size: size of the payload of the frame
+        """
+        if not data_size:
+            return
+        self.queue.put((frame, data_size))
 
     def finish(self, metachunk_size, metachunk_hash):
         """Send metachunk_size and metachunk_hash as trailers"""
@@ -645,7 +1024,7 @@ class EcChunkWriter(object):
 class EcMetachunkWriter(io.MetachunkWriter):
     def __init__(self, sysmeta, meta_chunk, global_checksum, storage_method,
                  reqid=None, connection_timeout=None, write_timeout=None,
-                 read_timeout=None, **kwargs):
+                 read_timeout=None, rawx_pool=None, **kwargs):
         super(EcMetachunkWriter, self).__init__(
             storage_method=storage_method, **kwargs)
         self.sysmeta = sysmeta
@@ -658,6 +1037,8 @@ class EcMetachunkWriter(io.MetachunkWriter):
         self.connection_timeout = connection_timeout or io.CONNECTION_TIMEOUT
         self.write_timeout = write_timeout or io.CHUNK_TIMEOUT
         self.read_timeout = read_timeout or io.CLIENT_TIMEOUT
+        self.rawx_pool = rawx_pool
+        self.executor = load_ec_executor(storage_method, **kwargs)
 
     def stream(self, source, size):
         writers = self._get_writers()
@@ -684,34 +1065,47 @@ class EcMetachunkWriter(io.MetachunkWriter):
     def _stream(self, source, size, writers):
         bytes_transferred = 0
 
-        # create EC encoding generator
-        ec_stream = ec_encode(self.storage_method, len(self.meta_chunk))
-        # init generator
-        ec_stream.send(None)
-
-        def send(data):
-            self.checksum.update(data)
-            self.global_checksum.update(data)
-            # get the encoded fragments
-            fragments = ec_stream.send(data)
-            if fragments is None:
-                # not enough data given
-                return
+        # create EC encoder
+        encoder = ECSegmentEncoder(self.storage_method, len(self.meta_chunk),
+                                   executor=self.executor)
 
+        def dispatch(columns, send_method):
             current_writers = list(writers)
             failed_chunks = list()
             for writer in current_writers:
-                fragment = fragments[chunk_index[writer]]
+                column = columns[chunk_index[writer]]
                 if not writer.failed:
-                    if writer.checksum:
-                        writer.checksum.update(fragment)
-                    writer.send(fragment)
+                    send_method(writer, column)
                 else:
                     current_writers.remove(writer)
                     failed_chunks.append(writer.chunk)
             self.quorum_or_fail([w.chunk for w in current_writers],
                                 failed_chunks)
 
+        def _send_frame(writer, column):
+            frame, fragments = column
+            if writer.checksum:
+                writer.checksum.update(fragments)
+            writer.send_frame(frame, len(fragments))
+
+        def _send_last(writer, fragment):
+            if writer.checksum:
+                writer.checksum.update(fragment)
+            writer.send(fragment)
+
+        def send(data):
+            self.checksum.update(data)
+            self.global_checksum.update(data)
+            # get the encoded fragments, if enough data was given
+            for columns in encoder.feed(data):
+                dispatch(columns, _send_frame)
+
+        def flush():
+            batch, last = encoder.flush()
+            if batch:
+                dispatch(batch, _send_frame)
+            dispatch(last, _send_last)
+
         try:
             # we use eventlet GreenPool to manage writers
             with green.ContextPool(len(writers)) as pool:
@@ -741,7 +1135,7 @@ class EcMetachunkWriter(io.MetachunkWriter):
                     send(data)
 
                 # flush out buffered data
-                send(b'')
+                flush()
 
                 # wait for all data to be processed
                 for writer in writers:
@@ -791,7 +1185,8 @@ class EcMetachunkWriter(io.MetachunkWriter):
                 chunk, self.sysmeta, self.reqid,
                 connection_timeout=self.connection_timeout,
                 write_timeout=self.write_timeout,
-                chunk_checksum_algo=self.chunk_checksum_algo)
+                chunk_checksum_algo=self.chunk_checksum_algo,
+                rawx_pool=self.rawx_pool)
             return writer, chunk
         except (Exception, Timeout) as exc:
             msg = str(exc)
@@ -867,9 +1262,16 @@ class EcMetachunkWriter(io.MetachunkWriter):
 class ECWriteHandler(io.WriteHandler):
     """
     Handles writes to an EC content.
-    For initialization parameters, see oio.api.io.WriteHandler.
+    For initialization parameters, see oio.api.io.WriteHandler,
+    and `load_ec_executor` for executor related keyword arguments.
     """
 
+    def __init__(self, source, sysmeta, chunk_preparer, storage_method,
+                 **kwargs):
+        super(ECWriteHandler, self).__init__(
+            source, sysmeta, chunk_preparer, storage_method, **kwargs)
+        self.executor = load_ec_executor(storage_method, **kwargs)
+
     def stream(self):
         # the checksum context for the content
         global_checksum = hashlib.md5()
@@ -901,7 +1303,9 @@ class ECWriteHandler(io.WriteHandler):
                 connection_timeout=self.connection_timeout,
                 write_timeout=self.write_timeout,
                 read_timeout=self.read_timeout,
-                chunk_checksum_algo=self.chunk_checksum_algo)
+                chunk_checksum_algo=self.chunk_checksum_algo,
+                ec_executor=self.executor,
+                rawx_pool=self.rawx_pool)
             bytes_transferred, checksum, chunks = handler.stream(self.source,
                                                                  max_size)
 
@@ -930,12 +1334,13 @@ class ECWriteHandler(io.WriteHandler):
 class ECRebuildHandler(object):
     def __init__(self, meta_chunk, missing, storage_method,
                  connection_timeout=None, read_timeout=None,
-                 **_kwargs):
+                 **kwargs):
         self.meta_chunk = meta_chunk
         self.missing = missing
         self.storage_method = storage_method
         self.connection_timeout = connection_timeout or io.CONNECTION_TIMEOUT
         self.read_timeout = read_timeout or io.CHUNK_TIMEOUT
+        self.executor = load_ec_executor(storage_method, **kwargs)
 
     def _get_response(self, chunk, headers):
         resp = None
@@ -1011,4 +1416,5 @@ class ECRebuildHandler(object):
         return frag_iter()
 
     def _reconstruct(self, frag):
-        return self.storage_method.driver.reconstruct(frag, [self.missing])[0]
+        return self.executor.reconstruct(
+            self.storage_method, frag, [self.missing])[0]
@@ -21,13 +21,16 @@ try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
+from collections import deque
 from eventlet import sleep, Timeout
+from eventlet.queue import Empty, LightQueue
 from oio.common import exceptions as exc
 from oio.common.http import parse_content_type,\
     parse_content_range, ranges_from_http_header, http_header_from_ranges
-from oio.common.http_eventlet import http_connect
+from oio.common.http_eventlet import http_connect, release_connection
 from oio.common.utils import GeneratorIO, group_chunk_errors, \
-    deadline_to_timeout
+    deadline_to_timeout, monotonic_time
+from oio.common.easy_value import float_value
 from oio.common import green
 from oio.common.storage_method import STORAGE_METHODS
 
@@ -45,10 +48,39 @@ CLIENT_TIMEOUT = 60.0
 
 PUT_QUEUE_DEPTH = 10
 
+# Number of time-to-first-byte samples kept for each rawx service
+TTFB_SAMPLES = 128
+# Minimum number of samples required to compute a percentile
+TTFB_MIN_SAMPLES = 16
+
+_RAWX_TTFB = dict()
+
+
+def _record_ttfb(netloc, ttfb):
+    samples = _RAWX_TTFB.get(netloc)
+    if samples is None:
+        samples = _RAWX_TTFB[netloc] = deque(maxlen=TTFB_SAMPLES)
+    samples.append(ttfb)
+
+
+def _ttfb_percentile(netloc, percentile):
+    """
+    Get a percentile of the recent time-to-first-byte of a rawx service.
+
+    :returns: the percentile in seconds, or None if not enough samples
+        have been collected
+    """
+    samples = _RAWX_TTFB.get(netloc)
+    if not samples or len(samples) < TTFB_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    index = int(round((len(ordered) - 1) * min(percentile, 100.0) / 100.0))
+    return ordered[index]
+
 
 def close_source(source):
     try:
-        source.conn.close()
+        release_connection(source.conn, source)
     except Exception:
         pass
 
@@ -82,7 +114,7 @@ class WriteHandler(object):
                  storage_method, headers=None,
                  connection_timeout=None, write_timeout=None,
                  read_timeout=None, deadline=None, chunk_checksum_algo='md5',
-                 **_kwargs):
+                 rawx_pool=None, **_kwargs):
         """
         :param connection_timeout: timeout to establish the connection
         :param write_timeout: timeout to send a buffer of data
@@ -90,6 +122,8 @@ class WriteHandler(object):
         :param chunk_checksum_algo: algorithm to use to compute chunk
             checksums locally. Can be `None` to disable local checksum
             computation and let the rawx compute it (will be md5).
+        :param rawx_pool: optional `HttpConnectionPool` providing
+            keep-alive connections to rawx services
         """
         if isinstance(source, IOBase):
             self.source = BufferedReader(source)
@@ -110,6 +144,7 @@ class WriteHandler(object):
         self._read_timeout = read_timeout or CLIENT_TIMEOUT
         self._write_timeout = write_timeout or CHUNK_TIMEOUT
         self.chunk_checksum_algo = chunk_checksum_algo
+        self.rawx_pool = rawx_pool
 
     @property
     def read_timeout(self):
@@ -197,7 +232,8 @@ class ChunkReader(object):
 
     def __init__(self, chunk_iter, buf_size, headers,
                  connection_timeout=None, read_timeout=None,
-                 align=False, **_kwargs):
+                 align=False, hedge_delay=None, hedge_percentile=None,
+                 perfdata=None, rawx_pool=None, **_kwargs):
         """
         :param chunk_iter:
         :param buf_size: size of the read buffer
@@ -206,6 +242,18 @@ class ChunkReader(object):
         :param read_timeout: timeout to read a buffer of data
         :param align: if True, the reader will skip some bytes to align
                       on `buf_size`
+        :param hedge_delay: if set, send a request to another chunk when
+            the current one has not answered after this delay (seconds)
+        :param hedge_percentile: if set, use this percentile of the
+            time-to-first-byte recently observed on the rawx service
+            as hedge delay (falls back to `hedge_delay`
+            until enough samples are available)
+        :param perfdata: optional `dict` that will be filled with
+            the number of hedged requests (`hedged_reads`) and the
+            number of hedged requests which answered first
+            (`hedged_reads_won`)
+        :param rawx_pool: optional `HttpConnectionPool` providing
+            keep-alive connections to rawx services
         """
         self.chunk_iter = chunk_iter
         self.source = None
@@ -221,6 +269,10 @@ class ChunkReader(object):
         self.connection_timeout = connection_timeout or CONNECTION_TIMEOUT
         self.read_timeout = read_timeout or CHUNK_TIMEOUT
         self._resp_by_chunk = dict()
+        self.hedge_delay = float_value(hedge_delay, None)
+        self.hedge_percentile = float_value(hedge_percentile, None)
+        self.perfdata = perfdata
+        self.rawx_pool = rawx_pool
 
     @property
     def reqid(self):
@@ -272,17 +324,20 @@ class ChunkReader(object):
             # just add an offset to the request
             self.request_headers['Range'] = 'bytes=%d-' % nb_bytes
 
-    def _get_request(self, chunk):
+    def _connect_to_chunk(self, chunk):
         """
         Connect to a chunk, fetch headers but don't read data.
-        Save the response object in `self.sources` list.
+
+        :returns: the response object, or None if the request failed
         """
         try:
+            req_start = monotonic_time()
             with green.ConnectionTimeout(self.connection_timeout):
                 raw_url = chunk["url"]
                 parsed = urlparse(raw_url)
                 conn = http_connect(parsed.netloc, 'GET', parsed.path,
-                                    self.request_headers)
+                                    self.request_headers,
+                                    pool=self.rawx_pool)
             with green.OioTimeout(self.read_timeout):
                 source = conn.getresponse()
                 source.conn = conn
@@ -290,25 +345,117 @@ class ChunkReader(object):
             logger.exception('Connection failed to %s (reqid=%s)',
                              chunk, self.reqid)
             self._resp_by_chunk[chunk["url"]] = (0, str(error))
-            return False
+            return None
 
         if source.status in (200, 206):
-            self.status = source.status
-            self._headers = source.getheaders()
-            self.sources.append((source, chunk))
-            return True
+            if self.hedge_percentile is not None:
+                _record_ttfb(parsed.netloc, monotonic_time() - req_start)
+            return source
         else:
             logger.warn("Invalid response from %s (reqid=%s): %d %s",
                         chunk, self.reqid, source.status, source.reason)
             self._resp_by_chunk[chunk["url"]] = (source.status,
                                                  str(source.reason))
-        return False
+        close_source(source)
+        return None
+
+    def _use_source(self, source, chunk):
+        self.status = source.status
+        self._headers = source.getheaders()
+        self.sources.append((source, chunk))
+
+    def _get_request(self, chunk):
+        """
+        Connect to a chunk, fetch headers but don't read data.
+        Save the response object in `self.sources` list.
+        """
+        source = self._connect_to_chunk(chunk)
+        if source is None:
+            return False
+        self._use_source(source, chunk)
+        return True
+
+    def _hedge_delay_for(self, chunk):
+        """
+        Get the time to wait for an answer from `chunk`
+        before sending a request to another chunk.
+        """
+        if self.hedge_percentile is not None:
+            delay = _ttfb_percentile(urlparse(chunk['url']).netloc,
+                                     self.hedge_percentile)
+            if delay is not None:
+                return delay
+        return self.hedge_delay
+
+    def _count_hedge(self, key):
+        if self.perfdata is not None:
+            self.perfdata[key] = self.perfdata.get(key, 0) + 1
+
+    def _get_source_hedged(self):
+        """
+        Iterate on chunks until one answers, sending a request to the
+        next chunk each time the pending ones are too slow to answer.
+        Requests that lost the race are cancelled.
+        """
+        results = LightQueue()
+        in_flight = dict()
+
+        def _attempt(chunk_, hedged_):
+            results.put((chunk_, hedged_, self._connect_to_chunk(chunk_)))
+
+        def _launch(pool_, hedged_):
+            for chunk_ in self.chunk_iter:
+                in_flight[chunk_['url']] = pool_.spawn(
+                    _attempt, chunk_, hedged_)
+                return chunk_
+            return None
+
+        winner = None
+        with green.ContextPool() as pool:
+            last = None
+            while True:
+                if not in_flight:
+                    last = _launch(pool, False)
+                    if last is None:
+                        break
+                try:
+                    chunk, hedged, source = results.get(
+                        timeout=self._hedge_delay_for(last))
+                except Empty:
+                    hedge = _launch(pool, True)
+                    if hedge is not None:
+                        last = hedge
+                        self._count_hedge('hedged_reads')
+                        continue
+                    # No more chunk to try, wait for the pending requests
+                    chunk, hedged, source = results.get()
+                del in_flight[chunk['url']]
+                if source is not None:
+                    winner = (source, chunk)
+                    if hedged:
+                        self._count_hedge('hedged_reads_won')
+                    break
+            # Cancel the requests which lost the race
+            for thread in in_flight.values():
+                thread.kill()
+        while not results.empty():
+            _, _, source = results.get()
+            if source is not None:
+                close_source(source)
+
+        if winner:
+            self._use_source(*winner)
+            return self.sources.pop()
+        return None, None
 
     def _get_source(self):
         """
         Iterate on chunks until one answers,
         and return the response object.
         """
+        if self.hedge_delay is not None or self.hedge_percentile is not None:
+            return self._get_source_hedged()
+
         for chunk in self.chunk_iter:
             # continue to iterate until we find a valid source
             if self._get_request(chunk):
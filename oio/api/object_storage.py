@@ -36,10 +36,14 @@ from oio.api.replication import ReplicatedWriteHandler
 from oio.api.backblaze_http import BackblazeUtilsException, BackblazeUtils
 from oio.api.backblaze import BackblazeWriteHandler, \
     BackblazeChunkDownloadHandler
+from oio.common.cache import LruCache
 from oio.common.utils import cid_from_name, GeneratorIO, monotonic_time
-from oio.common.easy_value import float_value, true_value
+from oio.common.easy_value import float_value, int_value, true_value
 from oio.common.logger import get_logger
 from oio.common.decorators import ensure_headers, ensure_request_id
+from oio.common.green import pipelined_listing
+from oio.common.http_eventlet import DEFAULT_IDLE_TIMEOUT, \
+    HttpConnectionPool
 from oio.common.storage_method import STORAGE_METHODS
 from oio.common.constants import OIO_VERSION, CHUNK_HEADERS, HEADER_PREFIX
 from oio.common.decorators import handle_account_not_found, \
@@ -48,6 +52,21 @@ from oio.common.storage_functions import _sort_chunks, fetch_stream, \
     fetch_stream_ec
 
 
+# Default time-to-live of the object descriptions cached by object_locate
+LOCATE_CACHE_TTL = 5.0
+
+
+def _copy_locate_result(meta, chunks):
+    """
+    Copy an object description, so the cached one is not altered
+    by the caller.
+    """
+    meta = meta.copy()
+    if meta.get('properties'):
+        meta['properties'] = meta['properties'].copy()
+    return meta, [chunk.copy() for chunk in chunks]
+
+
 # TODO(FVE): decorate more methods
 def patch_kwargs(fnc):
     """
@@ -78,7 +97,9 @@ class ObjectStorageApi(object):
         - `write_timeout`: `float`
     """
     TIMEOUT_KEYS = ('connection_timeout', 'read_timeout', 'write_timeout')
-    EXTRA_KEYWORDS = ('chunk_checksum_algo')
+    EXTRA_KEYWORDS = ('chunk_checksum_algo', 'prefetch_metachunks',
+                      'prefetch_buffer_size', 'hedge_delay',
+                      'hedge_percentile', 'ec_executor')
 
     def __init__(self, namespace, logger=None, **kwargs):
         """
@@ -100,6 +121,45 @@ class ObjectStorageApi(object):
         :type pool_manager: `urllib3.PoolManager`
         :keyword chunk_checksum_algo: algorithm to use for chunk checksums.
             Only 'md5' and `None` are supported at the moment.
+        :keyword prefetch_metachunks: default number of upcoming metachunks
+            to start downloading while the current one is being read
+            (see `object_fetch`)
+        :type prefetch_metachunks: `int`
+        :keyword prefetch_buffer_size: default maximum number of bytes
+            buffered by prefetched metachunks, for each download
+        :type prefetch_buffer_size: `int`
+        :keyword hedge_delay: default delay after which a replicated chunk
+            download is also requested from another replica
+            (see `object_fetch`)
+        :type hedge_delay: `float` seconds
+        :keyword hedge_percentile: default percentile of the recent
+            time-to-first-byte of a rawx service to use as hedge delay
+        :type hedge_percentile: `float`
+        :keyword ec_executor: where to run erasure coding operations:
+            'inline' (in the calling green thread), 'thread' (native
+            threads, for EC drivers releasing the GIL, see
+            `oio.api.ec.set_ec_thread_workers`) or 'process' (one
+            worker process per CPU). Defaults to the executor set
+            in the storage method, or 'inline'.
+        :type ec_executor: `str`
+        :keyword locate_cache_size: number of object descriptions
+            (metadata and chunks) kept in memory by `object_locate`
+            (0, the default, disables the cache)
+        :type locate_cache_size: `int`
+        :keyword locate_cache_ttl: time-to-live of the cached object
+            descriptions
+        :type locate_cache_ttl: `float` seconds
+        :keyword locate_cache_negative_ttl: time-to-live of the cached
+            "object not found" answers (defaults to `locate_cache_ttl`)
+        :type locate_cache_negative_ttl: `float` seconds
+        :keyword rawx_pool_max_idle: maximum number of idle keep-alive
+            connections kept for each rawx service, shared by chunk
+            downloads and uploads (0, the default, disables
+            connection reuse)
+        :type rawx_pool_max_idle: `int`
+        :keyword rawx_pool_idle_timeout: delay after which idle rawx
+            connections are closed
+        :type rawx_pool_idle_timeout: `float` seconds
         """
         self.namespace = namespace
         conf = {"namespace": self.namespace}
@@ -124,6 +184,26 @@ class ObjectStorageApi(object):
         self._blob_client = None
         self._proxy_client = None
 
+        self._locate_cache = None
+        locate_cache_size = int_value(kwargs.get('locate_cache_size'), 0)
+        if locate_cache_size > 0:
+            locate_cache_ttl = float_value(kwargs.get('locate_cache_ttl'),
+                                           LOCATE_CACHE_TTL)
+            self._locate_cache = LruCache(locate_cache_size,
+                                          ttl=locate_cache_ttl)
+            self._locate_cache_negative_ttl = float_value(
+                kwargs.get('locate_cache_negative_ttl'), locate_cache_ttl)
+
+        self.rawx_pool = None
+        rawx_pool_max_idle = int_value(kwargs.get('rawx_pool_max_idle'), 0)
+        if rawx_pool_max_idle > 0:
+            self.rawx_pool = HttpConnectionPool(
+                max_idle_per_host=rawx_pool_max_idle,
+                idle_timeout=float_value(
+                    kwargs.get('rawx_pool_idle_timeout'),
+                    DEFAULT_IDLE_TIMEOUT))
+            self._global_kwargs['rawx_pool'] = self.rawx_pool
+
     @property
     def blob_client(self):
         """
@@ -463,28 +543,21 @@ class ObjectStorageApi(object):
         elif maxvers == 0:
             maxvers = 1
 
-        truncated = True
-        marker = None
         last_object_name = None
         versions = None
-        while truncated:
-            resp = self.object_list(account, container, versions=True,
-                                    marker=marker, **kwargs)
+        for obj in self.object_list_iter(account, container, versions=True,
+                                         **kwargs):
+            if obj['name'] != last_object_name:
+                self._delete_exceeding_versions(
+                    account, container, last_object_name, versions,
+                    maxvers, **kwargs)
+                last_object_name = obj['name']
+                versions = list()
             # FIXME `next_marker` is an object name.
             # `object_list` can send twice the same version
             # if there weren't all versions for the last object.
-            last_object_name = None
-            truncated = resp['truncated']
-            marker = resp.get('next_marker', None)
-            for obj in resp['objects']:
-                if obj['name'] != last_object_name:
-                    self._delete_exceeding_versions(
-                        account, container, last_object_name, versions,
-                        maxvers, **kwargs)
-                    last_object_name = obj['name']
-                    versions = list()
-                if not obj['deleted']:
-                    versions.append(obj['version'])
+            if not obj['deleted'] and obj['version'] not in versions:
+                versions.append(obj['version'])
         self._delete_exceeding_versions(
             account, container, last_object_name, versions, maxvers, **kwargs)
 
@@ -637,8 +710,11 @@ class ObjectStorageApi(object):
         :type container: `str`
         :param obj: name of the object to drain
         """
-        self.container.content_drain(account, container, obj,
-                                     version=version, **kwargs)
+        try:
+            self.container.content_drain(account, container, obj,
+                                         version=version, **kwargs)
+        finally:
+            self._locate_cache_invalidate(account, container, obj, version)
 
     @handle_object_not_found
     @ensure_headers
@@ -658,22 +734,33 @@ class ObjectStorageApi(object):
         :param version: version of the object to delete
         :returns: True on success
         """
-        return self.container.content_delete(account, container, obj,
-                                             version=version, **kwargs)
+        try:
+            return self.container.content_delete(account, container, obj,
+                                                 version=version, **kwargs)
+        finally:
+            self._locate_cache_invalidate(account, container, obj, version)
 
     @ensure_headers
     @ensure_request_id
-    def object_delete_many(self, account, container, objs, **kwargs):
+    def object_delete_many(self, account, container, objs, versions=None,
+                           **kwargs):
         """
         Delete several objects.
 
         :param objs: an iterable of object names (should not be a generator)
+        :param versions: a list of object versions, one for each name,
+            `None` to delete the latest versions
         :returns: a list of tuples with the name of the object and
             a boolean telling if the object has been successfully deleted
         :rtype: `list` of `tuple`
         """
-        return self.container.content_delete_many(
-            account, container, objs, **kwargs)
+        try:
+            return self.container.content_delete_many(
+                account, container, objs, versions=versions, **kwargs)
+        finally:
+            for obj, version in zip(objs, versions or [None] * len(objs)):
+                self._locate_cache_invalidate(account, container, obj,
+                                              version)
 
     @handle_object_not_found
     @ensure_headers
@@ -718,9 +805,12 @@ class ObjectStorageApi(object):
                                data=ret[1], meta_pos=pos,
                                content_id=meta['id'])
 
-        return self.container.content_truncate(account, container, obj,
-                                               version=version, size=size,
-                                               **kwargs)
+        try:
+            return self.container.content_truncate(
+                account, container, obj, version=version, size=size,
+                **kwargs)
+        finally:
+            self._locate_cache_invalidate(account, container, obj, version)
 
     @handle_container_not_found
     @ensure_headers
@@ -768,6 +858,36 @@ class ObjectStorageApi(object):
             resp_body['next_marker'] = unquote_plus(hdrs.get(marker_header))
         return resp_body
 
+    def object_list_iter(self, account, container, page_size=None,
+                         prefetch=1, **kwargs):
+        """
+        Iterate over the objects of a container. The next page of the
+        listing is requested in the background as soon as the current
+        one has been received.
+
+        Accepts the same keyword arguments as `object_list`
+        (`marker` being where the listing starts).
+
+        :param page_size: maximum number of objects requested
+            with each listing request
+        :type page_size: `int`
+        :param prefetch: maximum number of pages requested in advance
+            (0 disables the background requests)
+        :type prefetch: `int`
+        :returns: a generator of object description `dict`
+        """
+        kwargs.pop('limit', None)
+        pages = pipelined_listing(
+            self.object_list,
+            marker_key=lambda resp: resp.get('next_marker'),
+            truncated_key=lambda resp: resp['truncated'],
+            prefetch=int_value(prefetch, 1),
+            account=account, container=container, limit=page_size,
+            **kwargs)
+        for page in pages:
+            for obj in page['objects']:
+                yield obj
+
     @handle_object_not_found
     @ensure_headers
     @ensure_request_id
@@ -790,10 +910,14 @@ class ObjectStorageApi(object):
 
         :returns: a tuple with object metadata `dict` as first element
             and chunk `list` as second element
+
+        When the API has been configured with a `locate_cache_size`,
+        the answer may come from a local cache (the `perfdata` keys
+        `locate_cache_hits` and `locate_cache_misses` count how often).
         """
-        obj_meta, chunks = self.container.content_locate(
-            account, container, obj, properties=properties,
-            version=version, **kwargs)
+        obj_meta, chunks, _cached = self._object_locate(
+            account, container, obj, version=version,
+            properties=properties, **kwargs)
 
         # FIXME(FVE): converting to float does not sort properly
         # the chunks of the same metachunk
@@ -811,6 +935,68 @@ class ObjectStorageApi(object):
             return obj_meta, chunks
         return obj_meta, _fetch_ext_info(chunks)
 
+    @staticmethod
+    def _locate_cache_key(account, container, obj, version=None):
+        if version is not None:
+            version = str(version)
+        return account, container, obj, version
+
+    def _locate_cache_invalidate(self, account, container, obj,
+                                 version=None):
+        """
+        Drop the cached descriptions of an object. The description
+        of the latest version is always dropped. Descriptions of other
+        explicit versions expire with their time-to-live.
+        """
+        if self._locate_cache is None:
+            return
+        self._locate_cache.pop(
+            self._locate_cache_key(account, container, obj))
+        if version is not None:
+            self._locate_cache.pop(
+                self._locate_cache_key(account, container, obj, version))
+
+    @handle_object_not_found
+    def _object_locate(self, account, container, obj, version=None,
+                       properties=True, use_cache=True, **kwargs):
+        """
+        Locate an object, using the cache when it is enabled.
+
+        :returns: a tuple with object metadata, chunk list,
+            and a boolean telling if they come from the cache
+        """
+        cache = self._locate_cache
+        if cache is None:
+            obj_meta, chunks = self.container.content_locate(
+                account, container, obj, properties=properties,
+                version=version, **kwargs)
+            return obj_meta, chunks, False
+
+        key = self._locate_cache_key(account, container, obj, version)
+        perfdata = kwargs.get('perfdata', self.container.perfdata)
+        # Cached entries always include properties,
+        # thus they can also be used when properties are not wanted.
+        entry = cache.get(key) if use_cache else None
+        if perfdata is not None and use_cache:
+            pkey = 'locate_cache_hits' if entry else 'locate_cache_misses'
+            perfdata[pkey] = perfdata.get(pkey, 0) + 1
+        if entry is not None:
+            if isinstance(entry, exc.NotFound):
+                raise entry
+            obj_meta, chunks = _copy_locate_result(*entry)
+            return obj_meta, chunks, True
+
+        try:
+            obj_meta, chunks = self.container.content_locate(
+                account, container, obj, properties=properties,
+                version=version, **kwargs)
+        except exc.NotFound as err:
+            cache.put(key, err, ttl=self._locate_cache_negative_ttl)
+            raise
+        if properties:
+            cache.put(key, _copy_locate_result(obj_meta, chunks))
+        return obj_meta, chunks, False
+
     def object_analyze(self, *args, **kwargs):
         """
         :deprecated: use `object_locate`
@@ -888,6 +1074,52 @@ class ObjectStorageApi(object):
             yield dat
         perfdata['ttlb'] = monotonic_time() - req_start
 
+    def _fetch_stream_from_cache(self, stream, account, container, obj,
+                                 version=None, ranges=None, key_file=None,
+                                 **kwargs):
+        """
+        Read a stream built from a cached object description.
+        On read errors, drop the description from the cache, and if no
+        data has been returned yet, locate the object again and retry.
+        """
+        data_sent = False
+        try:
+            for dat in stream:
+                data_sent = True
+                yield dat
+        except exc.OioException as err:
+            self._locate_cache_invalidate(account, container, obj, version)
+            if data_sent:
+                raise
+            self.logger.info(
+                'Failed to read %s/%s/%s from cached location (%s), '
+                'locating it again', account, container, obj, err)
+            meta, raw_chunks, _ = self._object_locate(
+                account, container, obj, version=version, use_cache=False,
+                **kwargs)
+            _meta, stream = self._object_fetch_stream(
+                account, container, meta, raw_chunks, ranges=ranges,
+                key_file=key_file, **kwargs)
+            for dat in stream:
+                yield dat
+
+    def _object_fetch_stream(self, account, container, meta, raw_chunks,
+                             ranges=None, key_file=None, **kwargs):
+        chunk_method = meta['chunk_method']
+        storage_method = STORAGE_METHODS.load(chunk_method)
+        chunks = _sort_chunks(raw_chunks, storage_method.ec)
+        meta['container_id'] = cid_from_name(account, container).upper()
+        meta['ns'] = self.namespace
+        if storage_method.ec:
+            stream = fetch_stream_ec(chunks, ranges, storage_method, **kwargs)
+        elif storage_method.backblaze:
+            stream = self._fetch_stream_backblaze(meta, chunks, ranges,
+                                                  storage_method, key_file,
+                                                  **kwargs)
+        else:
+            stream = fetch_stream(chunks, ranges, storage_method, **kwargs)
+        return meta, stream
+
     @patch_kwargs
     @ensure_headers
     @ensure_request_id
@@ -911,6 +1143,26 @@ class ObjectStorageApi(object):
         :keyword perfdata: optional `dict` that will be filled with metrics
             of time spent to resolve the meta2 address, to do the meta2
             request, and the time-to-first-byte, as seen by this API.
+            When hedging is enabled, will also be filled with the number
+            of hedged chunk requests (`hedged_reads`) and the number of
+            hedged requests which answered first (`hedged_reads_won`).
+            When the locate cache is enabled, will also count cache hits
+            (`locate_cache_hits`) and misses (`locate_cache_misses`).
+        :keyword prefetch_metachunks: number of upcoming metachunks to
+            open and start reading, in the background, while the current
+            one is being consumed (0, the default, disables prefetching)
+        :type prefetch_metachunks: `int`
+        :keyword prefetch_buffer_size: maximum number of bytes buffered
+            by the metachunks being read in the background
+        :type prefetch_buffer_size: `int`
+        :keyword hedge_delay: when reading replicated chunks, send the
+            request to another replica if the current one has not answered
+            after this delay, and use the first answer (disabled by default)
+        :type hedge_delay: `float` seconds
+        :keyword hedge_percentile: use this percentile of the
+            time-to-first-byte recently observed for each rawx service
+            as hedge delay, instead of a fixed delay
+        :type hedge_percentile: `float`
 
         :returns: a dictionary of object metadata and
             a stream of object data
@@ -919,22 +1171,17 @@ class ObjectStorageApi(object):
         perfdata = kwargs.get('perfdata', self.container.perfdata)
         if perfdata is not None:
             req_start = monotonic_time()
+            kwargs['perfdata'] = perfdata
 
-        meta, raw_chunks = self.object_locate(
+        meta, raw_chunks, cached = self._object_locate(
             account, container, obj, version=version, **kwargs)
-        chunk_method = meta['chunk_method']
-        storage_method = STORAGE_METHODS.load(chunk_method)
-        chunks = _sort_chunks(raw_chunks, storage_method.ec)
-        meta['container_id'] = cid_from_name(account, container).upper()
-        meta['ns'] = self.namespace
-        if storage_method.ec:
-            stream = fetch_stream_ec(chunks, ranges, storage_method, **kwargs)
-        elif storage_method.backblaze:
-            stream = self._fetch_stream_backblaze(meta, chunks, ranges,
-                                                  storage_method, key_file,
-                                                  **kwargs)
-        else:
-            stream = fetch_stream(chunks, ranges, storage_method, **kwargs)
+        meta, stream = self._object_fetch_stream(
+            account, container, meta, raw_chunks, ranges=ranges,
+            key_file=key_file, **kwargs)
+        if cached:
+            stream = self._fetch_stream_from_cache(
+                stream, account, container, obj, version=version,
+                ranges=ranges, key_file=key_file, **kwargs)
 
         if perfdata is not None:
             return meta, self._ttfb_wrapper(stream, req_start, perfdata)
@@ -1015,9 +1262,13 @@ class ObjectStorageApi(object):
         :param obj: name of the object to query
         :param properties: dictionary of properties
         """
-        return self.container.content_set_properties(
-            account, container, obj, properties={'properties': properties},
-            version=version, **kwargs)
+        try:
+            return self.container.content_set_properties(
+                account, container, obj,
+                properties={'properties': properties},
+                version=version, **kwargs)
+        finally:
+            self._locate_cache_invalidate(account, container, obj, version)
 
     @handle_object_not_found
     @ensure_headers
@@ -1031,9 +1282,12 @@ class ObjectStorageApi(object):
         :type properties: `list`
         :returns: True if the property has been deleted (or was missing)
         """
-        return self.container.content_del_properties(
-            account, container, obj, properties=properties,
-            version=version, **kwargs)
+        try:
+            return self.container.content_del_properties(
+                account, container, obj, properties=properties,
+                version=version, **kwargs)
+        finally:
+            self._locate_cache_invalidate(account, container, obj, version)
 
     def _generate_fullpath(self, account, container_name, path, version):
         return ['{0}/{1}/{2}/{3}'.format(quote_plus(account),
@@ -1129,6 +1383,7 @@ class ObjectStorageApi(object):
             self._delete_orphan_chunks(ul_chunks, obj_meta['container_id'],
                                        **kwargs)
             raise
+        self._locate_cache_invalidate(account, container, obj_name)
         return ul_chunks, ul_bytes, obj_checksum
 
     def _delete_orphan_chunks(self, chunks, cid, **kwargs):
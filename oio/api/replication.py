@@ -47,10 +47,38 @@ class FakeChecksum(object):
         pass
 
 
+def read_chunked_frame(source, read_size):
+    """
+    Read at most `read_size` bytes from `source`, directly into a buffer
+    framed for chunked transfer encoding (chunk size line, data, CRLF).
+
+    :returns: a tuple with a `memoryview` on the whole frame,
+        and a `memoryview` on the data only
+    """
+    header_size = len('%x\r\n' % read_size)
+    buf = bytearray(header_size + read_size + 2)
+    view = memoryview(buf)
+    try:
+        data_size = source.readinto(
+            view[header_size:header_size + read_size]) or 0
+    except (AttributeError, NotImplementedError):
+        # Not a file-like object, or an io.RawIOBase
+        # which only implements read()
+        data = source.read(read_size)
+        data_size = len(data)
+        view[header_size:header_size + data_size] = data
+    header = ('%x\r\n' % data_size).encode()
+    start = header_size - len(header)
+    end = header_size + data_size
+    view[start:header_size] = header
+    view[end:end + 2] = b'\r\n'
+    return view[start:end + 2], view[header_size:end]
+
+
 class ReplicatedMetachunkWriter(io.MetachunkWriter):
     def __init__(self, sysmeta, meta_chunk, checksum, storage_method,
                  quorum=None, connection_timeout=None, write_timeout=None,
-                 read_timeout=None, headers=None, **kwargs):
+                 read_timeout=None, headers=None, rawx_pool=None, **kwargs):
         super(ReplicatedMetachunkWriter, self).__init__(
             storage_method=storage_method, quorum=quorum, **kwargs)
         self.sysmeta = sysmeta
@@ -60,6 +88,7 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
         self.write_timeout = write_timeout or io.CHUNK_TIMEOUT
         self.read_timeout = read_timeout or io.CLIENT_TIMEOUT
         self.headers = headers or {}
+        self.rawx_pool = rawx_pool
 
     def stream(self, source, size=None):
         bytes_transferred = 0
@@ -102,7 +131,8 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
                         read_size = io.WRITE_CHUNK_SIZE
                     with green.SourceReadTimeout(self.read_timeout):
                         try:
-                            data = source.read(read_size)
+                            frame, data = read_chunked_frame(source,
+                                                             read_size)
                         except (ValueError, IOError) as e:
                             raise SourceReadError(str(e))
                         if len(data) == 0:
@@ -117,9 +147,8 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
                     # copy current_conns to be able to remove a failed conn
                     for conn in current_conns[:]:
                         if not conn.failed:
-                            data_put = ('%x\r\n' % len(data)).encode()
-                            data_put += data + b'\r\n'
-                            conn.queue.put(data_put)
+                            # The same frame is shared by all connections
+                            conn.queue.put(frame)
                         else:
                             current_conns.remove(conn)
                             failed_chunks.append(conn.chunk)
@@ -183,7 +212,8 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
 
             with green.ConnectionTimeout(self.connection_timeout):
                 conn = io.http_connect(
-                    parsed.netloc, 'PUT', parsed.path, hdrs)
+                    parsed.netloc, 'PUT', parsed.path, hdrs,
+                    pool=self.rawx_pool)
                 conn.chunk = chunk
             return conn, chunk
         except (Exception, Timeout) as err:
@@ -230,7 +260,8 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
         `failures` list.
         Otherwise put `conn.chunk` in `successes` list.
 
-        And then close `conn`.
+        And then give `conn` back to its pool if it can be reused,
+        or close it.
         """
         if resp:
             if isinstance(resp, (Exception, Timeout)):
@@ -257,7 +288,17 @@ class ReplicatedMetachunkWriter(io.MetachunkWriter):
                 else:
                     conn.chunk['hash'] = checksum or rawx_checksum
                     successes.append(conn.chunk)
-        conn.close()
+        if resp and not isinstance(resp, (Exception, Timeout)) \
+                and not conn.failed:
+            try:
+                # Consume the body, so the connection can be reused
+                with green.ChunkReadTimeout(self.read_timeout):
+                    resp.read()
+            except (Exception, Timeout):
+                resp = None
+            io.release_connection(conn, resp)
+        else:
+            conn.close()
 
 
 class ReplicatedWriteHandler(io.WriteHandler):
@@ -279,7 +320,8 @@ class ReplicatedWriteHandler(io.WriteHandler):
                 write_timeout=self.write_timeout,
                 read_timeout=self.read_timeout,
                 headers=self.headers,
-                chunk_checksum_algo=self.chunk_checksum_algo)
+                chunk_checksum_algo=self.chunk_checksum_algo,
+                rawx_pool=self.rawx_pool)
             bytes_transferred, _h, chunks = handler.stream(self.source, size)
             content_chunks += chunks
 
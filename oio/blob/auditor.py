@@ -19,13 +19,13 @@ import hashlib
 import time
 
 from oio.blob.utils import check_volume, read_chunk_metadata
+from oio.blob.walker import VolumeWalker
 from oio.container.client import ContainerClient
 from oio.common.daemon import Daemon
 from oio.common import exceptions as exc
-from oio.common.utils import paths_gen
 from oio.common.easy_value import int_value
 from oio.common.logger import get_logger
-from oio.common.green import ratelimit
+from oio.common.green import RateLimiter
 
 
 SLEEP_TIME = 30
@@ -43,8 +43,6 @@ class BlobAuditorWorker(object):
         self.faulty_chunks = 0
         self.corrupted_chunks = 0
         self.last_reported = 0
-        self.chunks_run_time = 0
-        self.bytes_running_time = 0
         self.bytes_processed = 0
         self.total_bytes_processed = 0
         self.total_chunks_processed = 0
@@ -54,32 +52,30 @@ class BlobAuditorWorker(object):
             conf.get('chunks_per_second'), 30)
         self.max_bytes_per_second = int_value(
             conf.get('bytes_per_second'), 10000000)
+        # Shared by all the green threads auditing chunks
+        self.bytes_limiter = RateLimiter(self.max_bytes_per_second)
         self.container_client = ContainerClient(conf, logger=self.logger)
 
     def audit_pass(self):
         self.namespace, self.address = check_volume(self.volume)
 
-        start_time = report_time = time.time()
+        start_time = time.time()
 
-        total_errors = 0
-        total_corrupted = 0
-        total_orphans = 0
-        total_faulty = 0
-        audit_time = 0
+        # Shared by the green threads auditing chunks
+        stats = {'report_time': start_time,
+                 'errors': 0,
+                 'corrupted': 0,
+                 'orphans': 0,
+                 'faulty': 0,
+                 'audit_time': 0}
 
-        paths = paths_gen(self.volume)
-
-        for path in paths:
+        def audit(path):
             loop_time = time.time()
             self.safe_chunk_audit(path)
-            self.chunks_run_time = ratelimit(
-                self.chunks_run_time,
-                self.max_chunks_per_second
-            )
             self.total_chunks_processed += 1
             now = time.time()
-
             if now - self.last_reported >= self.report_interval:
+                report_time = stats['report_time']
                 self.logger.info(
                     '%(start_time)s '
                     '%(passes)d '
@@ -101,15 +97,15 @@ class BlobAuditorWorker(object):
                         'c_rate': self.passes / (now - report_time),
                         'b_rate': self.bytes_processed / (now - report_time),
                         'total': (now - start_time),
-                        'audit_time': audit_time,
-                        'audit_rate': audit_time / (now - start_time)
+                        'audit_time': stats['audit_time'],
+                        'audit_rate': stats['audit_time'] / (now - start_time)
                     }
                 )
-                report_time = now
-                total_corrupted += self.corrupted_chunks
-                total_orphans += self.orphan_chunks
-                total_faulty += self.faulty_chunks
-                total_errors += self.errors
+                stats['report_time'] = now
+                stats['corrupted'] += self.corrupted_chunks
+                stats['orphans'] += self.orphan_chunks
+                stats['faulty'] += self.faulty_chunks
+                stats['errors'] += self.errors
                 self.passes = 0
                 self.corrupted_chunks = 0
                 self.orphan_chunks = 0
@@ -117,7 +113,13 @@ class BlobAuditorWorker(object):
                 self.errors = 0
                 self.bytes_processed = 0
                 self.last_reported = now
-            audit_time += (now - loop_time)
+            stats['audit_time'] += (now - loop_time)
+
+        walker = VolumeWalker.from_conf(
+            self.volume, self.conf, logger=self.logger,
+            chunks_per_second=self.max_chunks_per_second)
+        walker.run(audit)
+
         elapsed = (time.time() - start_time) or 0.000001
         self.logger.info(
             '%(elapsed).02f '
@@ -130,14 +132,14 @@ class BlobAuditorWorker(object):
             '%(audit_time).2f '
             '%(audit_rate).2f' % {
                 'elapsed': elapsed,
-                'corrupted': total_corrupted + self.corrupted_chunks,
-                'faulty': total_faulty + self.faulty_chunks,
-                'orphans': total_orphans + self.orphan_chunks,
-                'errors': total_errors + self.errors,
+                'corrupted': stats['corrupted'] + self.corrupted_chunks,
+                'faulty': stats['faulty'] + self.faulty_chunks,
+                'orphans': stats['orphans'] + self.orphan_chunks,
+                'errors': stats['errors'] + self.errors,
                 'chunk_rate': self.total_chunks_processed / elapsed,
                 'bytes_rate': self.total_bytes_processed / elapsed,
-                'audit_time': audit_time,
-                'audit_rate': audit_time / elapsed
+                'audit_time': stats['audit_time'],
+                'audit_rate': stats['audit_time'] / elapsed
             }
         )
 
@@ -172,10 +174,7 @@ class BlobAuditorWorker(object):
             with closing(reader):
                 for buf in reader:
                     buf_len = len(buf)
-                    self.bytes_running_time = ratelimit(
-                        self.bytes_running_time,
-                        self.max_bytes_per_second,
-                        increment=buf_len)
+                    self.bytes_limiter.wait(buf_len)
                     self.bytes_processed += buf_len
                     self.total_bytes_processed += buf_len
 
@@ -20,13 +20,12 @@ from random import random
 from string import hexdigits
 
 from oio.blob.utils import check_volume, read_chunk_metadata
+from oio.blob.walker import VolumeWalker
 from oio.rdir.client import RdirClient
 from oio.common.daemon import Daemon
 from oio.common import exceptions as exc
-from oio.common.utils import paths_gen
-from oio.common.easy_value import int_value
+from oio.common.easy_value import float_value, int_value
 from oio.common.logger import get_logger
-from oio.common.green import ratelimit
 from oio.common.exceptions import OioNetworkException
 from oio.common.constants import STRLEN_CHUNKID
 
@@ -44,17 +43,42 @@ class BlobIndexer(Daemon):
         self.successes = 0
         self.last_reported = 0
         self.total_since_last_reported = 0
-        self.chunks_run_time = 0
         self.interval = int_value(
             conf.get('interval'), 300)
         self.report_interval = int_value(
             conf.get('report_interval'), 3600)
         self.max_chunks_per_second = int_value(
             conf.get('chunks_per_second'), 30)
+        # Number of chunks to index with one rdir request
+        self.batch_size = int_value(conf.get('batch_size'), 100)
+        # Maximum time to wait before sending an incomplete batch
+        self.batch_delay = float_value(conf.get('batch_delay'), 1.0)
         self.index_client = RdirClient(conf, logger=self.logger)
         self.namespace, self.volume_id = check_volume(self.volume)
 
     def index_pass(self):
+        # Chunks waiting to be indexed: (path, record) tuples
+        batch = list()
+        batch_start = [0]
+
+        def flush_batch():
+            if not batch:
+                return
+            # Other green threads may fill the next batch meanwhile
+            pending = batch[:]
+            del batch[:]
+            paths = dict((record['chunk_id'], path)
+                         for path, record in pending)
+            try:
+                failed = self.index_client.chunk_push_many(
+                    self.volume_id, [record for _, record in pending])
+            except Exception as exc:
+                failed = [(record, str(exc)) for _, record in pending]
+            for record, err in failed:
+                self.logger.warn('ERROR while updating %s: %s',
+                                 paths[record['chunk_id']], err)
+            self.errors += len(failed)
+            self.successes += len(pending) - len(failed)
 
         def safe_update_index(path):
             chunk_id = path.rsplit('/', 1)[-1]
@@ -64,9 +88,17 @@ class BlobIndexer(Daemon):
                 if c not in hexdigits:
                     return
             try:
-                self.update_index(path)
-                self.successes += 1
-                self.logger.debug('Updated %s', path)
+                if self.batch_size > 1:
+                    record = self.chunk_record(path)
+                    if not batch:
+                        batch_start[0] = time.time()
+                    batch.append((path, record))
+                    if len(batch) >= self.batch_size:
+                        flush_batch()
+                else:
+                    self.update_index(path)
+                    self.successes += 1
+                    self.logger.debug('Updated %s', path)
             except OioNetworkException as exc:
                 self.errors += 1
                 self.logger.warn('ERROR while updating %s: %s', path, exc)
@@ -75,6 +107,14 @@ class BlobIndexer(Daemon):
                 self.logger.exception('ERROR while updating %s', path)
             self.total_since_last_reported += 1
 
+        def index(path):
+            safe_update_index(path)
+            now = time.time()
+            if now - batch_start[0] >= self.batch_delay:
+                flush_batch()
+            if now - self.last_reported >= self.report_interval:
+                report('running')
+
         def report(tag):
             total = self.errors + self.successes
             now = time.time()
@@ -104,32 +144,30 @@ class BlobIndexer(Daemon):
         self.errors = 0
         self.successes = 0
 
-        paths = paths_gen(self.volume)
+        walker = VolumeWalker.from_conf(
+            self.volume, self.conf, logger=self.logger,
+            chunks_per_second=self.max_chunks_per_second)
         report('started')
-        for path in paths:
-            safe_update_index(path)
-            self.chunks_run_time = ratelimit(
-                self.chunks_run_time,
-                self.max_chunks_per_second
-            )
-            now = time.time()
-            if now - self.last_reported >= self.report_interval:
-                report('running')
+        walker.run(index)
+        flush_batch()
         report('ended')
 
-    def update_index(self, path):
+    def chunk_record(self, path):
+        """Read the metadata of a chunk, build its rdir record."""
         with open(path) as f:
             try:
                 meta = read_chunk_metadata(f)
             except exc.MissingAttribute as e:
                 raise exc.FaultyChunk(
                     'Missing extended attribute %s' % e)
-            data = {'mtime': int(time.time())}
-            self.index_client.chunk_push(self.volume_id,
-                                         meta['container_id'],
-                                         meta['content_id'],
-                                         meta['chunk_id'],
-                                         **data)
+        return {'container_id': meta['container_id'],
+                'content_id': meta['content_id'],
+                'chunk_id': meta['chunk_id'],
+                'mtime': int(time.time())}
+
+    def update_index(self, path):
+        record = self.chunk_record(path)
+        self.index_client.chunk_push(self.volume_id, **record)
 
     def run(self, *args, **kwargs):
         time.sleep(random() * self.interval)
@@ -17,14 +17,16 @@ import time
 
 from oio.blob.client import BlobClient
 from oio.blob.utils import check_volume, read_chunk_metadata
+from oio.blob.walker import VolumeWalker
 from oio.common.exceptions import ContentNotFound
 from oio.container.client import ContainerClient
 from oio.common.daemon import Daemon
 from oio.common import exceptions as exc
-from oio.common.utils import paths_gen, statfs
+from oio.common.utils import statfs
 from oio.common.easy_value import int_value
 from oio.common.logger import get_logger
-from oio.common.green import ratelimit
+from oio.common.green import RateLimiter
+from oio.content.content import safe_update_spare_chunks
 from oio.content.factory import ContentFactory
 
 SLEEP_TIME = 30
@@ -41,8 +43,6 @@ class BlobMoverWorker(object):
         self.errors = 0
         self.last_reported = 0
         self.last_usage_check = 0
-        self.chunks_run_time = 0
-        self.bytes_running_time = 0
         self.bytes_processed = 0
         self.total_bytes_processed = 0
         self.total_chunks_processed = 0
@@ -56,25 +56,44 @@ class BlobMoverWorker(object):
             conf.get('chunks_per_second'), 30)
         self.max_bytes_per_second = int_value(
             conf.get('bytes_per_second'), 10000000)
+        # Shared by all the green threads moving chunks
+        self.bytes_limiter = RateLimiter(self.max_bytes_per_second)
         self.blob_client = BlobClient()
         self.container_client = ContainerClient(conf, logger=self.logger)
         self.content_factory = ContentFactory(conf)
+        # Chunks copied but not referenced yet, by container,
+        # to update each container with as few requests as possible
+        self.update_batch_size = max(1, int_value(
+            conf.get('update_batch_size'), 100))
+        self.max_pending_chunks = max(1, int_value(
+            conf.get('max_pending_chunks'), 1000))
+        # The original chunks are still on the volume until then
+        self.max_pending_bytes = max(1, int_value(
+            conf.get('max_pending_bytes'), 1073741824))
+        self.pending = dict()
+        self.pending_count = 0
+        self.pending_bytes = 0
 
     def mover_pass(self):
         self.namespace, self.address = check_volume(self.volume)
 
-        start_time = report_time = time.time()
+        start_time = time.time()
 
-        total_errors = 0
-        mover_time = 0
+        # Shared by the green threads moving chunks
+        stats = {'report_time': start_time,
+                 'errors': 0,
+                 'mover_time': 0}
+        walker = VolumeWalker.from_conf(
+            self.volume, self.conf, logger=self.logger,
+            chunks_per_second=self.max_chunks_per_second)
 
-        paths = paths_gen(self.volume)
-
-        for path in paths:
+        def move(path):
             loop_time = time.time()
 
             now = time.time()
             if now - self.last_usage_check >= self.usage_check_interval:
+                # Delete the chunks already moved before measuring
+                self.flush_all()
                 used, total = statfs(self.volume)
                 usage = (float(used) / total) * 100
                 if usage <= self.usage_target:
@@ -82,17 +101,15 @@ class BlobMoverWorker(object):
                         'current usage %.2f%%: target reached (%.2f%%)', usage,
                         self.usage_target)
                     self.last_usage_check = now
-                    break
+                    walker.stop()
+                    return
 
             self.safe_chunk_move(path)
-            self.chunks_run_time = ratelimit(
-                self.chunks_run_time,
-                self.max_chunks_per_second
-            )
             self.total_chunks_processed += 1
             now = time.time()
 
             if now - self.last_reported >= self.report_interval:
+                report_time = stats['report_time']
                 self.logger.info(
                     '%(start_time)s '
                     '%(passes)d '
@@ -108,16 +125,23 @@ class BlobMoverWorker(object):
                         'c_rate': self.passes / (now - report_time),
                         'b_rate': self.bytes_processed / (now - report_time),
                         'total': (now - start_time),
-                        'mover_time': mover_time,
-                        'mover_rate': mover_time / (now - start_time)
+                        'mover_time': stats['mover_time'],
+                        'mover_rate': stats['mover_time'] / (now - start_time)
                     }
                 )
-                report_time = now
-                total_errors += self.errors
+                stats['report_time'] = now
+                stats['errors'] += self.errors
                 self.passes = 0
                 self.bytes_processed = 0
                 self.last_reported = now
-            mover_time += (now - loop_time)
+            stats['mover_time'] += (now - loop_time)
+
+        try:
+            walker.run(move)
+        finally:
+            # Do not leave unreferenced copies behind
+            self.flush_all()
+
         elapsed = (time.time() - start_time) or 0.000001
         self.logger.info(
             '%(elapsed).02f '
@@ -127,11 +151,11 @@ class BlobMoverWorker(object):
             '%(mover_time).2f '
             '%(mover_rate).2f' % {
                 'elapsed': elapsed,
-                'errors': total_errors + self.errors,
+                'errors': stats['errors'] + self.errors,
                 'chunk_rate': self.total_chunks_processed / elapsed,
                 'bytes_rate': self.total_bytes_processed / elapsed,
-                'mover_time': mover_time,
-                'mover_rate': mover_time / elapsed
+                'mover_time': stats['mover_time'],
+                'mover_rate': stats['mover_time'] / elapsed
             }
         )
 
@@ -159,10 +183,58 @@ class BlobMoverWorker(object):
         except ContentNotFound:
             raise exc.OrphanChunk('Content not found')
 
-        new_chunk = content.move_chunk(chunk_id)
+        current_chunk, spare_url = content._copy_chunk_to_spare(chunk_id)
+        self.bytes_limiter.wait(int(meta['chunk_size']))
+        self.logger.debug('copied chunk %s to %s', chunk_url, spare_url)
 
-        self.logger.info(
-            'moved chunk %s to %s', chunk_url, new_chunk['url'])
+        batch = self.pending.setdefault(container_id, list())
+        batch.append((content, current_chunk, spare_url))
+        self.pending_count += 1
+        self.pending_bytes += current_chunk.size
+        if len(batch) >= self.update_batch_size:
+            self.flush(container_id)
+        elif (self.pending_count >= self.max_pending_chunks or
+              self.pending_bytes >= self.max_pending_bytes):
+            self.flush_all()
+
+    def flush(self, container_id):
+        """
+        Reference the copies of the chunks of a container, with one
+        request, then delete the original chunks (or the copies which
+        could not be referenced).
+        """
+        batch = self.pending.pop(container_id, None)
+        if not batch:
+            return
+        self.pending_count -= len(batch)
+        self.pending_bytes -= sum(chunk.size for _, chunk, _ in batch)
+        try:
+            failed = safe_update_spare_chunks(
+                batch[0][0].container_client, container_id, batch)
+        except Exception as err:
+            failed = [(sub, err) for sub in batch]
+        errors = dict((id(sub[1]), err) for sub, err in failed)
+        for content, chunk, spare_url in batch:
+            err = errors.get(id(chunk))
+            if err is not None:
+                self.errors += 1
+                self.logger.error('ERROR while moving chunk %s: %s',
+                                  chunk.url, err)
+                to_delete = spare_url
+            else:
+                to_delete = chunk.url
+            try:
+                content.blob_client.chunk_delete(to_delete)
+            except Exception:
+                self.logger.warn("Failed to delete chunk %s" % to_delete)
+            if err is None:
+                self.bytes_processed += chunk.size
+                self.total_bytes_processed += chunk.size
+                self.logger.info('moved chunk %s to %s', chunk.url, spare_url)
+
+    def flush_all(self):
+        for container_id in list(self.pending):
+            self.flush(container_id)
 
 
 class BlobMover(Daemon):
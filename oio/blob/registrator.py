@@ -18,8 +18,8 @@ from contextlib import contextmanager
 from os.path import basename
 from time import clock as now
 
-from oio.common.utils import paths_gen
 from oio.blob.utils import check_volume, read_chunk_metadata
+from oio.blob.walker import VolumeWalker
 from oio.container.client import ContainerClient
 from oio.common.exceptions import Conflict, NotFound
 
@@ -68,52 +68,62 @@ class BlobRegistratorWorker(object):
             return self.pass_without_lock()
 
     def pass_without_lock(self):
-        last_report = now()
-        count, success, fail = 0, 0, 0
+        # Shared by the green threads registering chunks
+        stats = {'last_report': now(),
+                 'count': 0, 'success': 0, 'fail': 0}
         if self.namespace != self.volume_ns:
             self.logger.warn("Forcing the NS to [%s] (previously [%s])",
                              self.namespace, self.volume_ns)
 
         self.logger.info("START %s", self.volume)
 
-        paths = paths_gen(self.volume)
-        for path in paths:
+        def register(path):
             # Action
+            meta = None
             try:
                 with open(path) as f:
                     meta = read_chunk_metadata(f)
                     self.action(self, path, f, meta)
-                    success = success + 1
+                    stats['success'] += 1
             except NotFound as e:
-                fail = fail + 1
+                stats['fail'] += 1
                 self.logger.info("ORPHAN %s/%s in %s/%s %s",
                                  meta['content_id'], meta['chunk_id'],
                                  meta['container_id'], meta['content_path'],
                                  str(e))
             except Conflict as e:
-                fail = fail + 1
+                stats['fail'] += 1
                 self.logger.info("ALREADY %s/%s in %s/%s %s",
                                  meta['content_id'], meta['chunk_id'],
                                  meta['container_id'], meta['content_path'],
                                  str(e))
             except Exception as e:
-                fail = fail + 1
-                self.logger.warn("ERROR %s/%s in %s/%s %s",
-                                 meta['content_id'], meta['chunk_id'],
-                                 meta['container_id'], meta['content_path'],
-                                 str(e))
-            count = count + 1
-
-            # TODO(jfs): do the throttling
+                stats['fail'] += 1
+                if meta is None:
+                    self.logger.warn("ERROR %s %s", path, str(e))
+                else:
+                    self.logger.warn("ERROR %s/%s in %s/%s %s",
+                                     meta['content_id'], meta['chunk_id'],
+                                     meta['container_id'],
+                                     meta['content_path'], str(e))
+            stats['count'] += 1
 
             # periodical reporting
             t = now()
-            if t - last_report > self.report_interval:
+            if t - stats['last_report'] > self.report_interval:
+                stats['last_report'] = t
                 self.logger.info("STEP %d ok %d ko %d",
-                                 count, success, fail)
+                                 stats['count'], stats['success'],
+                                 stats['fail'])
+
+        # Throttling is done by the walker (chunks_per_second)
+        walker = VolumeWalker.from_conf(self.volume, self.conf,
+                                        logger=self.logger)
+        walker.run(register)
 
         self.logger.info("FINAL %s %d ok %d ko %d",
-                         self.volume, count, success, fail)
+                         self.volume, stats['count'], stats['success'],
+                         stats['fail'])
 
     def _check_chunk(self, path, f, meta):
         raise Exception("CHECK not yet implemented")
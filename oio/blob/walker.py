@@ -0,0 +1,184 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import eventlet
+from eventlet import tpool
+from eventlet.queue import LightQueue, Queue
+
+from oio.common.easy_value import int_value
+from oio.common.green import ContextPool, RateLimiter
+from oio.common.logger import get_logger
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+DEFAULT_CONCURRENCY = 1
+DEFAULT_WALKERS = 1
+
+
+def list_dir(path):
+    """
+    List the sub-directories and the files of a directory.
+    Like `os.walk()`, symbolic links to directories are ignored.
+
+    :returns: a tuple with the list of sub-directories
+        and the list of files (full paths)
+    """
+    dirs = list()
+    files = list()
+    if scandir is not None:
+        for entry in scandir(path):
+            if not entry.is_dir():
+                files.append(entry.path)
+            elif not entry.is_symlink():
+                dirs.append(entry.path)
+    else:
+        for name in os.listdir(path):
+            full_path = os.path.join(path, name)
+            if not os.path.isdir(full_path):
+                files.append(full_path)
+            elif not os.path.islink(full_path):
+                dirs.append(full_path)
+    return dirs, files
+
+
+class VolumeWalker(object):
+    """
+    Walk a volume and process each of its files.
+
+    The (hashed) sub-directories of the volume are listed concurrently
+    by `walkers` green threads, which feed a bounded queue of paths.
+    The paths are processed by `concurrency` green threads.
+    With the default values, the volume is walked sequentially.
+    """
+
+    def __init__(self, volume, concurrency=DEFAULT_CONCURRENCY,
+                 walkers=DEFAULT_WALKERS, queue_size=None,
+                 chunks_per_second=0, logger=None):
+        """
+        :param concurrency: number of green threads processing paths
+        :param walkers: number of green threads listing directories.
+            When greater than 1, the listings are done by native threads,
+            to actually read several directories at once.
+        :param queue_size: maximum number of paths waiting
+            to be processed (defaults to 2 * `concurrency`)
+        :param chunks_per_second: maximum number of paths processed
+            per second, by all green threads (0 means unlimited)
+        """
+        self.volume = volume
+        self.concurrency = max(1, concurrency)
+        self.walkers = max(1, walkers)
+        self.queue_size = queue_size or 2 * self.concurrency
+        self.chunk_limiter = RateLimiter(chunks_per_second)
+        self.logger = logger or get_logger(None, name=str(self.__class__))
+        self.running = False
+
+    @classmethod
+    def from_conf(cls, volume, conf, logger=None, chunks_per_second=None):
+        """
+        Build a walker from the `concurrency`, `walkers` and
+        `chunks_per_second` parameters of a daemon configuration.
+        """
+        if chunks_per_second is None:
+            chunks_per_second = int_value(conf.get('chunks_per_second'), 0)
+        return cls(volume,
+                   concurrency=int_value(conf.get('concurrency'),
+                                         DEFAULT_CONCURRENCY),
+                   walkers=int_value(conf.get('walkers'), DEFAULT_WALKERS),
+                   chunks_per_second=chunks_per_second,
+                   logger=logger)
+
+    def _list_dir(self, path):
+        try:
+            if self.walkers > 1:
+                return tpool.execute(list_dir, path)
+            return list_dir(path)
+        except Exception as err:
+            self.logger.warn('Failed to list %s: %s', path, err)
+            return (), ()
+
+    def _walk(self, paths):
+        """Put the path of each file of the volume in `paths`."""
+        dirs = LightQueue()
+        dirs.put(self.volume)
+        # Number of directories listed or waiting to be listed
+        pending = [1]
+
+        def _walker():
+            while True:
+                path = dirs.get()
+                if path is None:
+                    break
+                subdirs, files = self._list_dir(path)
+                pending[0] += len(subdirs)
+                for subdir in subdirs:
+                    dirs.put(subdir)
+                for file_path in files:
+                    if not self.running:
+                        break
+                    paths.put(file_path)
+                pending[0] -= 1
+                if pending[0] <= 0 or not self.running:
+                    for _ in range(self.walkers):
+                        dirs.put(None)
+
+        with ContextPool(self.walkers) as pool:
+            for _ in range(self.walkers):
+                pool.spawn(_walker)
+            pool.waitall()
+        # Tell the workers there is nothing left
+        for _ in range(self.concurrency):
+            paths.put(None)
+
+    def _work(self, paths, process):
+        while self.running:
+            path = paths.get()
+            if path is None:
+                break
+            self.chunk_limiter.wait()
+            try:
+                process(path)
+            except Exception:
+                self.logger.exception('ERROR while processing %s', path)
+
+    def run(self, process):
+        """
+        Call `process(path)` on each file of the volume,
+        until all files have been processed or `stop()` is called.
+        """
+        self.running = True
+        paths = Queue(self.queue_size)
+        walker = eventlet.spawn(self._walk, paths)
+        try:
+            with ContextPool(self.concurrency) as pool:
+                for _ in range(self.concurrency):
+                    pool.spawn(self._work, paths, process)
+                pool.waitall()
+        finally:
+            self.running = False
+            walker.kill()
+
+    def stop(self):
+        """Stop processing paths (the current ones are finished)."""
+        self.running = False
@@ -15,9 +15,12 @@
 
 """Lifecycle-related commands"""
 
+import json
+import os
 from logging import getLogger
 from cliff import command, lister
-from oio.container.lifecycle import ContainerLifecycle, LIFECYCLE_PROPERTY_KEY
+from oio.container.lifecycle import ContainerLifecycle, LifecycleExecutor, \
+    LIFECYCLE_PROPERTY_KEY, DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY
 
 
 class LifecycleApply(lister.Lister):
@@ -32,8 +35,64 @@ class LifecycleApply(lister.Lister):
             metavar='<container>',
             help='Container on which to apply lifecycle rules'
         )
+        parser.add_argument(
+            '--concurrency',
+            metavar='<concurrency>',
+            type=int,
+            help=('List only the objects concerned by the rules, delete '
+                  'expired objects by batches, and apply the other actions '
+                  'concurrently, with this number of green threads '
+                  '(default when --batch-size, --checkpoint or --stats '
+                  'is set: %d)' % DEFAULT_CONCURRENCY)
+        )
+        parser.add_argument(
+            '--batch-size',
+            metavar='<size>',
+            type=int,
+            help=('Number of expired objects deleted with one request '
+                  '(default: %d)' % DEFAULT_BATCH_SIZE)
+        )
+        parser.add_argument(
+            '--checkpoint',
+            metavar='<file>',
+            help=('Save the position in the listing of the objects in this '
+                  'file, and resume from the position it contains')
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the number of objects processed per second at the end'
+        )
         return parser
 
+    @staticmethod
+    def _load_position(path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as file_:
+            return json.load(file_)
+
+    @staticmethod
+    def _save_position(path, position):
+        if position is None:
+            # Execution finished, next one will start from the beginning
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file_:
+            json.dump(position, file_)
+        os.rename(tmp_path, path)
+
+    def _print_stats(self, raw_res, executor):
+        for res in raw_res:
+            yield res
+        stats = executor.stats()
+        self.app.stderr.write(
+            "%(objects)d objects in %(elapsed).1fs "
+            "(%(objects_per_second).1f/s): %(deleted)d deleted, "
+            "%(transitioned)d transitioned, %(errors)d errors\n" % stats)
+
     def take_action(self, parsed_args):
         self.log.debug('take_action(%s)', parsed_args)
         lc = ContainerLifecycle(self.app.client_manager.storage,
@@ -44,7 +103,28 @@ class LifecycleApply(lister.Lister):
             raise Exception(
                 "No lifecycle configuration for container %s in account %s" %
                 (parsed_args.container, self.app.client_manager.account))
-        raw_res = lc.execute()
+        if (parsed_args.concurrency is None and
+                parsed_args.batch_size is None and
+                parsed_args.checkpoint is None and
+                not parsed_args.stats):
+            raw_res = lc.execute()
+        else:
+            executor = LifecycleExecutor(
+                lc,
+                concurrency=parsed_args.concurrency or DEFAULT_CONCURRENCY,
+                batch_size=parsed_args.batch_size or DEFAULT_BATCH_SIZE,
+                logger=self.log)
+            position = checkpoint = None
+            if parsed_args.checkpoint:
+                path = parsed_args.checkpoint
+                position = self._load_position(path)
+
+                def checkpoint(pos):
+                    self._save_position(path, pos)
+            raw_res = executor.execute(position=position,
+                                       checkpoint=checkpoint)
+            if parsed_args.stats:
+                raw_res = self._print_stats(raw_res, executor)
         columns = ('Name', 'Version', 'Rule', 'Action', 'Result')
         res = ((x[0]['name'], x[0]['version'], x[1], x[2], x[3])
                for x in raw_res)
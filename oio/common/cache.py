@@ -0,0 +1,133 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+
+from collections import OrderedDict
+
+from oio.common.utils import monotonic_time
+
+
+class LruCache(object):
+    """
+    Size-bounded cache, evicting the least recently used entries first.
+    Entries can also be given a time-to-live.
+
+    By default, the size of the cache is its number of entries.
+    A `weigher` function can be provided to give entries another weight
+    (e.g. the number of elements of a listing).
+
+    Not thread-safe, but safe to use from several green threads
+    (no operation yields).
+    """
+
+    def __init__(self, max_size, ttl=None, clock=monotonic_time,
+                 weigher=None):
+        """
+        :param max_size: maximum total weight of the entries kept
+            in the cache (their number, by default)
+        :type max_size: `int`
+        :param ttl: default time-to-live of the entries
+            (`None` means they never expire)
+        :type ttl: `float` seconds
+        :param clock: function returning the current time
+        :param weigher: function returning the weight of a value
+        """
+        if max_size <= 0:
+            raise ValueError('max_size must be positive')
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.weigher = weigher
+        self.weight = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.weight -= entry[2]
+        return entry
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expiry = entry[0]
+        if expiry is not None and expiry <= self.clock():
+            self._remove(key)
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        """
+        Get the value associated with `key`, and mark the entry
+        as the most recently used one.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        # Move the entry at the end (OrderedDict of Python 2
+        # lacks move_to_end)
+        del self._entries[key]
+        self._entries[key] = entry
+        return entry[1]
+
+    def put(self, key, value, ttl=None):
+        """
+        Associate `value` with `key`, evicting the least recently used
+        entries if the cache is full.
+
+        :param ttl: time-to-live of this entry, overriding the default one
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expiry = self.clock() + ttl if ttl is not None else None
+        weight = self.weigher(value) if self.weigher else 1
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expiry, value, weight)
+        self.weight += weight
+        # Always keep the newest entry, even if it is too heavy
+        while self.weight > self.max_size and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove the entry associated with `key` and return its value."""
+        entry = self._lookup(key)
+        if entry is None:
+            return default
+        self._remove(key)
+        return entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.weight = 0
+
+    def stats(self):
+        """Get a `dict` of counters describing the usage of the cache."""
+        return {'size': len(self._entries),
+                'weight': self.weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
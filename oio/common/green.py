@@ -20,6 +20,7 @@ import eventlet
 
 import eventlet.semaphore
 from eventlet.green import threading
+from eventlet.queue import Queue
 from eventlet import Timeout
 
 logging.thread = eventlet.green.thread
@@ -70,6 +71,35 @@ def ratelimit(run_time, max_rate, increment=1, rate_buffer=5):
     return run_time + time_per_request
 
 
+class RateLimiter(object):
+    """
+    Rate limit shared by several green threads.
+
+    Works like `ratelimit()`, but each caller reserves its time slot
+    before sleeping, so that the limit is honored globally, whatever
+    the number of green threads calling `wait()`.
+    """
+
+    def __init__(self, max_rate, rate_buffer=5):
+        self.max_rate = max_rate
+        self.rate_buffer = rate_buffer
+        self.run_time = 0
+
+    def wait(self, increment=1):
+        """Sleep until `increment` units can be consumed."""
+        if self.max_rate <= 0 or increment <= 0:
+            return
+        clock_accuracy = 1000.0
+        now = time.time() * clock_accuracy
+        time_per_request = clock_accuracy * (float(increment) / self.max_rate)
+        if now - self.run_time > self.rate_buffer * clock_accuracy:
+            self.run_time = now
+        run_time = self.run_time
+        self.run_time += time_per_request
+        if run_time - now > time_per_request:
+            eventlet.sleep((run_time - now) / clock_accuracy)
+
+
 class ContextPool(eventlet.GreenPool):
     def __enter__(self):
         return self
@@ -77,3 +107,58 @@ class ContextPool(eventlet.GreenPool):
     def __exit__(self, type, value, traceback):
         for coroutine in list(self.coroutines_running):
             coroutine.kill()
+
+
+def pipelined_listing(func, marker_key, truncated_key, prefetch=1,
+                      **kwargs):
+    """
+    Yield the results of repetitive calls to `func(**kwargs)`, like
+    the pages of a listing. For each call (except the first), the marker
+    is taken from the previous result. The next call is made in a green
+    thread as soon as its marker is known, while the caller is still
+    processing the previous result.
+
+    :param marker_key: an accessor to the next marker,
+        applied on each result of `func(**kwargs)`
+    :param truncated_key: an accessor telling if the listing is
+        truncated, applied on each result of `func(**kwargs)`
+    :param prefetch: maximum number of results fetched in advance
+        (0 disables pipelining)
+    """
+    if prefetch <= 0:
+        while True:
+            result = func(**kwargs)
+            yield result
+            if not truncated_key(result):
+                return
+            kwargs['marker'] = marker_key(result)
+
+    # A queue with a maxsize of 0 is a channel: the fetcher waits
+    # for its result to be consumed before fetching the next one.
+    queue = Queue(prefetch - 1)
+
+    def _fetch():
+        try:
+            while True:
+                result = func(**kwargs)
+                truncated = truncated_key(result)
+                if truncated:
+                    kwargs['marker'] = marker_key(result)
+                queue.put((result, truncated, None))
+                if not truncated:
+                    break
+        except (Exception, Timeout) as err:
+            queue.put((None, False, err))
+
+    fetcher = eventlet.spawn(_fetch)
+    try:
+        while True:
+            result, truncated, err = queue.get()
+            if err is not None:
+                raise err
+            yield result
+            if not truncated:
+                break
+    finally:
+        # The caller may stop early: stop fetching
+        fetcher.kill()
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library.
 
+import errno
 import logging
 import socket
 
@@ -24,6 +25,15 @@ from eventlet.green.httplib import HTTPConnection, HTTPResponse, _UNKNOWN, \
         CONTINUE, HTTPMessage
 from six import text_type
 
+from oio.common.utils import monotonic_time
+
+
+# Maximum number of idle connections kept for each service
+DEFAULT_MAX_IDLE_PER_HOST = 8
+# Idle connections are closed after this delay (in seconds),
+# which must be lower than the keep-alive timeout of the services
+DEFAULT_IDLE_TIMEOUT = 2.0
+
 
 class CustomHTTPResponse(HTTPResponse):
     def __init__(self, sock, debuglevel=0, strict=0,
@@ -100,17 +110,117 @@ class CustomHttpConnection(HTTPConnection):
         return response
 
 
-def http_connect(host, method, path, headers=None, query_string=None):
-    if isinstance(path, text_type):
+def connection_is_alive(conn):
+    """
+    Tell if an idle connection can be used to send a new request:
+    the server must not have closed it, nor sent unexpected data.
+    """
+    sock = getattr(conn.sock, 'fd', conn.sock)
+    if sock is None:
+        return False
+    flags = socket.MSG_PEEK | getattr(socket, 'MSG_DONTWAIT', 0)
+    try:
+        sock.recv(1, flags)
+    except socket.error as err:
+        return err.errno in (errno.EAGAIN, errno.EWOULDBLOCK)
+    # Either the connection has been closed (no data),
+    # or there is unexpected data waiting to be read.
+    return False
+
+
+class HttpConnectionPool(object):
+    """
+    Keep-alive connections to rawx services, indexed by service address.
+
+    Connections are taken with `get()`, and given back with `put()`
+    once their response has been entirely read
+    (see `release_connection()`).
+    """
+
+    def __init__(self, max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, clock=monotonic_time):
+        """
+        :param max_idle_per_host: maximum number of idle connections
+            kept for each service
+        :param idle_timeout: delay after which idle connections are closed
+        :type idle_timeout: `float` seconds
+        """
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        # Lists of (release time, connection), oldest first
+        self._idle = dict()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _discard(self, conn):
+        self.discarded += 1
         try:
-            path = path.encode('utf-8')
-        except UnicodeError as e:
-            logging.exception('ERROR encoding to UTF-8: %s', str(e))
-    path = quote(b'/' + path)
-    conn = CustomHttpConnection(host)
-    if query_string:
-        path += b'?' + query_string
-    conn.path = path
+            conn.close()
+        except Exception:
+            pass
+
+    def get(self, host):
+        """
+        Get an idle connection to `host`.
+
+        :returns: a connection, or `None` if there is no usable one
+        """
+        conns = self._idle.get(host)
+        while conns:
+            released, conn = conns.pop()
+            if self.clock() - released > self.idle_timeout \
+                    or not connection_is_alive(conn):
+                self._discard(conn)
+                continue
+            self.hits += 1
+            return conn
+        self.misses += 1
+        return None
+
+    def put(self, conn):
+        """Keep an idle connection for later use."""
+        now = self.clock()
+        conns = self._idle.setdefault(conn.netloc, list())
+        while conns and now - conns[0][0] > self.idle_timeout:
+            self._discard(conns.pop(0)[1])
+        conns.append((now, conn))
+        if len(conns) > self.max_idle_per_host:
+            self._discard(conns.pop(0)[1])
+
+    def clear(self):
+        """Close all idle connections."""
+        for conns in self._idle.values():
+            for _, conn in conns:
+                self._discard(conn)
+        self._idle.clear()
+
+    def stats(self):
+        """Get a `dict` of counters describing the usage of the pool."""
+        return {'idle': sum(len(conns) for conns in self._idle.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded}
+
+
+def release_connection(conn, response=None):
+    """
+    Give a connection back to its pool if it can be reused,
+    close it otherwise. A connection can be reused once its
+    response has been entirely read, if the server did not ask
+    to close it.
+    """
+    pool = getattr(conn, 'pool', None)
+    if (pool is not None and response is not None and
+            response.fp is None and not response.will_close and
+            conn.sock is not None):
+        pool.put(conn)
+    else:
+        conn.close()
+
+
+def _send_request(conn, method, path, headers):
     conn.putrequest(method, path)
     if headers:
         for header, value in headers.items():
@@ -120,4 +230,37 @@ def http_connect(host, method, path, headers=None, query_string=None):
             else:
                 conn.putheader(header, value)
     conn.endheaders()
+
+
+def http_connect(host, method, path, headers=None, query_string=None,
+                 pool=None):
+    """
+    Send the headers of a request to `host`.
+
+    :param pool: if set, reuse an idle connection from this
+        `HttpConnectionPool`, and remember it so the connection
+        can be released to it (see `release_connection()`)
+    """
+    if isinstance(path, text_type):
+        try:
+            path = path.encode('utf-8')
+        except UnicodeError as e:
+            logging.exception('ERROR encoding to UTF-8: %s', str(e))
+    path = quote(b'/' + path)
+    if query_string:
+        path += b'?' + query_string
+    conn = pool.get(host) if pool is not None else None
+    if conn is not None:
+        try:
+            conn.path = path
+            _send_request(conn, method, path, headers)
+            return conn
+        except socket.error:
+            # The server closed the connection meanwhile
+            conn.close()
+    conn = CustomHttpConnection(host)
+    conn.netloc = host
+    conn.pool = pool
+    conn.path = path
+    _send_request(conn, method, path, headers)
     return conn
@@ -0,0 +1,78 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+from bisect import bisect_left
+
+
+# Upper bounds of the buckets of the latency histograms, in seconds
+DEFAULT_LATENCY_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                          0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram(object):
+    """
+    Count durations in buckets, and keep their number, sum and maximum.
+    """
+
+    def __init__(self, bounds=DEFAULT_LATENCY_BOUNDS):
+        self.bounds = bounds
+        # The last bucket counts the durations above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, duration):
+        self.counts[bisect_left(self.bounds, duration)] += 1
+        self.count += 1
+        self.sum += duration
+        if duration > self.max:
+            self.max = duration
+
+    def to_dict(self):
+        """
+        :returns: a `dict` with the 'count', 'sum' and 'max' of the
+            durations, and the list of 'buckets', each one being
+            a list with the upper bound of the bucket ('+Inf' for the
+            last one) and the number of durations below this bound
+        """
+        buckets = list()
+        cumulated = 0
+        for bound, count in zip(self.bounds + ('+Inf', ), self.counts):
+            cumulated += count
+            buckets.append([bound, cumulated])
+        return {'count': self.count,
+                'sum': self.sum,
+                'max': self.max,
+                'buckets': buckets}
+
+
+class LatencyHistograms(object):
+    """A set of latency histograms, by name (route, command...)."""
+
+    def __init__(self, bounds=DEFAULT_LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.histograms = dict()
+
+    def observe(self, name, duration):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = LatencyHistogram(self.bounds)
+            self.histograms[name] = histogram
+        histogram.observe(duration)
+
+    def to_dict(self):
+        return dict((name, histogram.to_dict())
+                    for name, histogram in self.histograms.items())
@@ -20,6 +20,78 @@ import math
 import redis
 import redis.sentinel
 
+from oio.common.easy_value import float_value, int_value, true_value
+from oio.common.metrics import LatencyHistograms
+from oio.common.utils import monotonic_time
+
+
+# Commands which can be sent again when the first attempt failed
+# while reading the reply (the command may have been executed).
+RETRYABLE_COMMANDS = frozenset((
+    'EXISTS', 'GET', 'HEXISTS', 'HGET', 'HGETALL', 'HKEYS', 'HLEN',
+    'HMGET', 'HSCAN', 'KEYS', 'MGET', 'PING', 'SCAN', 'SCRIPT LOAD',
+    'SISMEMBER', 'SMEMBERS', 'TTL', 'TYPE', 'ZCARD', 'ZLEXCOUNT', 'ZRANGE',
+    'ZRANGEBYLEX', 'ZRANGEBYSCORE', 'ZSCAN', 'ZSCORE'))
+
+
+class BlockingSentinelConnectionPool(redis.sentinel.SentinelConnectionPool,
+                                     redis.BlockingConnectionPool):
+    """
+    Sentinel managed connection pool, waiting for a connection
+    when `max_connections` is reached, instead of failing.
+    """
+
+
+class TimedRedis(redis.StrictRedis):
+    """
+    Redis client measuring the duration of each command (and pipeline),
+    and retrying read commands failing with connection errors, to survive
+    the failover of a master managed by Sentinel.
+    """
+
+    latencies = None
+    reconnect_attempts = 1
+    reconnect_delay = 0.0
+
+    def execute_command(self, *args, **options):
+        attempt = 1
+        while True:
+            start = monotonic_time()
+            try:
+                return super(TimedRedis, self).execute_command(
+                    *args, **options)
+            except redis.exceptions.ConnectionError:
+                # Other commands may have been executed
+                # before the connection was lost.
+                if (attempt >= self.reconnect_attempts or
+                        args[0].upper() not in RETRYABLE_COMMANDS):
+                    raise
+            finally:
+                if self.latencies is not None:
+                    self.latencies.observe(args[0],
+                                           monotonic_time() - start)
+            # The master may be being replaced: wait for a new one
+            sleep(self.reconnect_delay * attempt)
+            attempt += 1
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super(TimedRedis, self).pipeline(transaction, shard_hint)
+        if self.latencies is None:
+            return pipe
+        name = 'MULTI' if transaction else 'PIPELINE'
+        latencies = self.latencies
+        execute = pipe.execute
+
+        def _timed_execute(*args, **kwargs):
+            start = monotonic_time()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                latencies.observe(name, monotonic_time() - start)
+        # Pipelines are not retried: they are emptied by failures
+        pipe.execute = _timed_execute
+        return pipe
+
 
 class RedisConn(object):
 
@@ -27,14 +99,46 @@ class RedisConn(object):
         self.conf = conf
         self._conn = connection
         self._sentinel = None
+        self._sentinel_conn = None
         self._sentinel_hosts = conf.get('sentinel_hosts', None)
         self._sentinel_name = conf.get('sentinel_master_name', 'oio')
+        # Duration of the Redis commands, by command name
+        self.redis_latencies = LatencyHistograms()
+
+        self._max_connections = int_value(
+            conf.get('redis_max_connections'), None)
+        self._pool_timeout = float_value(conf.get('redis_pool_timeout'), 20.0)
+        self._connection_kwargs = {
+            'socket_timeout': float_value(
+                conf.get('redis_socket_timeout'), None),
+            'socket_connect_timeout': float_value(
+                conf.get('redis_socket_connect_timeout'), None),
+            'socket_keepalive': true_value(
+                conf.get('redis_socket_keepalive', False)),
+        }
+        health_check_interval = int_value(
+            conf.get('redis_health_check_interval'), 0)
+        if health_check_interval > 0:
+            # Only known by recent versions of redis-py
+            self._connection_kwargs['health_check_interval'] = \
+                health_check_interval
+        self._reconnect_attempts = int_value(
+            conf.get('redis_reconnect_attempts'), 3)
+        self._reconnect_delay = float_value(
+            conf.get('redis_reconnect_delay'), 0.5)
 
         # Do not use Sentinel if a connection object is provided
         if self._sentinel_hosts and not self._conn:
             self._sentinel = redis.sentinel.Sentinel(
                     [(h, int(p)) for h, p, in (hp.split(':', 2)
-                     for hp in self._sentinel_hosts.split(','))])
+                     for hp in self._sentinel_hosts.split(','))],
+                    **self._connection_kwargs)
+
+    def _configure(self, client):
+        client.latencies = self.redis_latencies
+        client.reconnect_attempts = self._reconnect_attempts
+        client.reconnect_delay = self._reconnect_delay
+        return client
 
     def register_script(self, script):
         """Register a LUA script and return Script object."""
@@ -44,17 +148,42 @@ class RedisConn(object):
     def conn(self):
         """Retrieve Redis connection (normal or sentinel)"""
         if self._sentinel:
-            return self._sentinel.master_for(self._sentinel_name)
+            # The pool of the client asks the sentinels for the address
+            # of the master each time it opens a connection.
+            if not self._sentinel_conn:
+                kwargs = dict()
+                if self._max_connections:
+                    # Wait for a connection instead of failing
+                    kwargs['connection_pool_class'] = \
+                        BlockingSentinelConnectionPool
+                    kwargs['max_connections'] = self._max_connections
+                    kwargs['timeout'] = self._pool_timeout
+                self._sentinel_conn = self._configure(
+                    self._sentinel.master_for(self._sentinel_name,
+                                              redis_class=TimedRedis,
+                                              **kwargs))
+            return self._sentinel_conn
         if not self._conn:
             redis_host = self.conf.get('redis_host', '127.0.0.1')
             redis_port = int(self.conf.get('redis_port', '6379'))
-            self._conn = redis.StrictRedis(host=redis_host, port=redis_port)
+            if self._max_connections:
+                # Wait for a connection instead of failing
+                pool = redis.BlockingConnectionPool(
+                    max_connections=self._max_connections,
+                    timeout=self._pool_timeout,
+                    host=redis_host, port=redis_port,
+                    **self._connection_kwargs)
+            else:
+                pool = redis.ConnectionPool(
+                    host=redis_host, port=redis_port,
+                    **self._connection_kwargs)
+            self._conn = self._configure(TimedRedis(connection_pool=pool))
         return self._conn
 
     def acquire_lock_with_timeout(self, lockname, acquire_timeout=10,
-                                  lock_timeout=10):
-        """Acquire a lock :lockname:"""
-        conn = self.conn
+                                  lock_timeout=10, conn=None):
+        """Acquire a lock :lockname: (on `conn`, if provided)"""
+        conn = conn or self.conn
         identifier = str(uuid.uuid4())
         lockname = 'lock:' + lockname
         lock_timeout = int(math.ceil(lock_timeout))
@@ -70,9 +199,9 @@ class RedisConn(object):
             sleep(.001)
         return False
 
-    def release_lock(self, lockname, identifier):
+    def release_lock(self, lockname, identifier, conn=None):
         """Release a previously acquired Lock"""
-        conn = self.conn
+        conn = conn or self.conn
         pipe = conn.pipeline(True)
         lockname = 'lock:' + lockname
 
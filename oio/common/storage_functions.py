@@ -15,14 +15,23 @@
 
 
 import random
+from collections import deque
+from functools import partial
 from six import iteritems
+from eventlet import Queue, Timeout
 
 from oio.api.io import ChunkReader, READ_CHUNK_SIZE
 from oio.api.ec import ECChunkDownloadHandler
 from oio.common import exceptions as exc
+from oio.common import green
 from oio.common.constants import OBJECT_METADATA_PREFIX
 from oio.common.http import http_header_from_ranges
 from oio.common.decorators import ensure_headers
+from oio.common.easy_value import int_value
+
+
+# Maximum number of bytes buffered by metachunk prefetching
+PREFETCH_BUFFER_SIZE = 16 * 1024 * 1024
 
 
 def obj_range_to_meta_chunk_range(obj_start, obj_end, meta_sizes):
@@ -189,48 +198,175 @@ def _make_object_metadata(headers):
     return meta
 
 
+class _PrefetchedStream(object):
+    """
+    Consume a metachunk stream from a green thread,
+    into a bounded queue of data buffers.
+    """
+
+    _END = object()
+
+    def __init__(self, pool, stream_factory, max_buffers):
+        self.queue = Queue(max_buffers)
+        self.thread = pool.spawn(self._fill, stream_factory)
+
+    def _fill(self, stream_factory):
+        stream = None
+        try:
+            stream = stream_factory()
+            for dat in stream:
+                self.queue.put(dat)
+            self.queue.put(self._END)
+        except (Exception, Timeout) as err:
+            self.queue.put(err)
+        finally:
+            close_method = getattr(stream, 'close', None)
+            if close_method:
+                close_method()
+
+    def __iter__(self):
+        while True:
+            dat = self.queue.get()
+            if dat is self._END:
+                break
+            if isinstance(dat, (Exception, Timeout)):
+                raise dat
+            yield dat
+
+    def kill(self):
+        self.thread.kill()
+
+
+def _chain_metachunk_streams(stream_factories, prefetch_metachunks=0,
+                             prefetch_buffer_size=PREFETCH_BUFFER_SIZE,
+                             buf_size=READ_CHUNK_SIZE):
+    """
+    Chain the data of several metachunks.
+
+    :param stream_factories: iterable of callables, each one returning
+        an iterator over the data of a metachunk
+    :param prefetch_metachunks: number of metachunks to open and start
+        buffering while the current one is being consumed
+    :param prefetch_buffer_size: maximum number of bytes buffered
+        for all metachunks being read
+    :param buf_size: expected size of the buffers yielded
+        by the metachunk streams
+    """
+    prefetch_metachunks = int_value(prefetch_metachunks, 0)
+    prefetch_buffer_size = int_value(prefetch_buffer_size,
+                                     PREFETCH_BUFFER_SIZE)
+    if prefetch_metachunks <= 0:
+        for stream_factory in stream_factories:
+            for dat in stream_factory():
+                yield dat
+        return
+
+    window = prefetch_metachunks + 1
+    max_buffers = max(1, prefetch_buffer_size // (window * max(1, buf_size)))
+    stream_factories = iter(stream_factories)
+    pending = deque()
+    with green.ContextPool(window) as pool:
+        try:
+            while True:
+                while len(pending) < window:
+                    try:
+                        stream_factory = next(stream_factories)
+                    except StopIteration:
+                        break
+                    pending.append(_PrefetchedStream(pool, stream_factory,
+                                                     max_buffers))
+                if not pending:
+                    break
+                for dat in pending.popleft():
+                    yield dat
+        finally:
+            # The consumer may stop early: stop prefetching
+            for stream in pending:
+                stream.kill()
+
+
+def _fetch_metachunk(pos, chunks, meta_range, headers, **kwargs):
+    meta_start, meta_end = meta_range
+    headers = headers.copy()
+    if meta_start is not None and meta_end is not None:
+        headers['Range'] = http_header_from_ranges((meta_range, ))
+    reader = ChunkReader(
+        iter(chunks), READ_CHUNK_SIZE, headers=headers, **kwargs)
+    try:
+        it = reader.get_iter()
+    except exc.NotFound as err:
+        raise exc.UnrecoverableContent(
+            "Cannot download position %d: %s" %
+            (pos, err))
+    except Exception as err:
+        raise exc.OioException(
+            "Error while downloading position %d: %s" %
+            (pos, err))
+    for part in it:
+        for dat in part['iter']:
+            yield dat
+
+
 @ensure_headers
 def fetch_stream(chunks, ranges, storage_method, headers=None,
+                 prefetch_metachunks=0,
+                 prefetch_buffer_size=PREFETCH_BUFFER_SIZE,
                  **kwargs):
+    """
+    Download the data of a replicated object.
+
+    :param prefetch_metachunks: number of upcoming metachunks to open
+        and start reading while the current one is being consumed
+    :type prefetch_metachunks: `int`
+    :param prefetch_buffer_size: maximum number of bytes kept in memory
+        by the prefetched metachunks
+    :type prefetch_buffer_size: `int`
+    """
     ranges = ranges or [(None, None)]
     meta_range_list = get_meta_ranges(ranges, chunks)
 
-    for meta_range_dict in meta_range_list:
-        for pos in sorted(meta_range_dict.keys()):
-            meta_start, meta_end = meta_range_dict[pos]
-            if meta_start is not None and meta_end is not None:
-                headers['Range'] = http_header_from_ranges(
-                    (meta_range_dict[pos], ))
-            reader = ChunkReader(
-                iter(chunks[pos]), READ_CHUNK_SIZE, headers=headers,
-                **kwargs)
-            try:
-                it = reader.get_iter()
-            except exc.NotFound as err:
-                raise exc.UnrecoverableContent(
-                    "Cannot download position %d: %s" %
-                    (pos, err))
-            except Exception as err:
-                raise exc.OioException(
-                    "Error while downloading position %d: %s" %
-                    (pos, err))
-            for part in it:
-                for dat in part['iter']:
-                    yield dat
+    def _stream_factories():
+        for meta_range_dict in meta_range_list:
+            for pos in sorted(meta_range_dict.keys()):
+                yield partial(_fetch_metachunk, pos, chunks[pos],
+                              meta_range_dict[pos], headers, **kwargs)
+
+    return _chain_metachunk_streams(
+        _stream_factories(), prefetch_metachunks=prefetch_metachunks,
+        prefetch_buffer_size=prefetch_buffer_size, buf_size=READ_CHUNK_SIZE)
+
+
+def _fetch_metachunk_ec(storage_method, chunks, meta_range, **kwargs):
+    meta_start, meta_end = meta_range
+    handler = ECChunkDownloadHandler(
+        storage_method, chunks, meta_start, meta_end, **kwargs)
+    stream = handler.get_stream()
+    try:
+        for part_info in stream:
+            for dat in part_info['iter']:
+                yield dat
+    finally:
+        stream.close()
 
 
 @ensure_headers
-def fetch_stream_ec(chunks, ranges, storage_method, **kwargs):
+def fetch_stream_ec(chunks, ranges, storage_method, prefetch_metachunks=0,
+                    prefetch_buffer_size=PREFETCH_BUFFER_SIZE, **kwargs):
+    """
+    Download the data of an erasure coded object.
+
+    See `fetch_stream` for the description of the prefetch parameters.
+    """
     ranges = ranges or [(None, None)]
     meta_range_list = get_meta_ranges(ranges, chunks)
-    for meta_range_dict in meta_range_list:
-        for pos in sorted(meta_range_dict.keys()):
-            meta_start, meta_end = meta_range_dict[pos]
-            handler = ECChunkDownloadHandler(
-                storage_method, chunks[pos],
-                meta_start, meta_end, **kwargs)
-            stream = handler.get_stream()
-            for part_info in stream:
-                for dat in part_info['iter']:
-                    yield dat
-            stream.close()
+
+    def _stream_factories():
+        for meta_range_dict in meta_range_list:
+            for pos in sorted(meta_range_dict.keys()):
+                yield partial(_fetch_metachunk_ec, storage_method,
+                              chunks[pos], meta_range_dict[pos], **kwargs)
+
+    return _chain_metachunk_streams(
+        _stream_factories(), prefetch_metachunks=prefetch_metachunks,
+        prefetch_buffer_size=prefetch_buffer_size,
+        buf_size=storage_method.ec_segment_size)
@@ -114,7 +114,7 @@ class ReplicatedStorageMethod(StorageMethod):
 
 class ECStorageMethod(StorageMethod):
     def __init__(self, name, ec_segment_size, ec_type, ec_nb_data,
-                 ec_nb_parity):
+                 ec_nb_parity, ec_executor=None):
         super(ECStorageMethod, self).__init__(name=name, ec=True)
 
         try:
@@ -131,6 +131,9 @@ class ECStorageMethod(StorageMethod):
 
         self._ec_segment_size = ec_segment_size
         self._ec_type = ec_type
+        # Name of the executor running EC operations
+        # (see oio.api.ec.load_ec_executor)
+        self._ec_executor = ec_executor
 
         from pyeclib.ec_iface import ECDriver, ECDriverError
         try:
@@ -152,14 +155,19 @@ class ECStorageMethod(StorageMethod):
         ec_nb_data = params.pop('k')
         ec_nb_parity = params.pop('m')
         ec_type = params.pop('algo')
+        ec_executor = params.pop('executor', None)
         return cls('ec', ec_segment_size=EC_SEGMENT_SIZE,
                    ec_type=ec_type, ec_nb_data=ec_nb_data,
-                   ec_nb_parity=ec_nb_parity)
+                   ec_nb_parity=ec_nb_parity, ec_executor=ec_executor)
 
     @property
     def ec_type(self):
         return self._ec_type
 
+    @property
+    def ec_executor(self):
+        return self._ec_executor
+
     @property
     def ec_nb_data(self):
         return self._ec_nb_data
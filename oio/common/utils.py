@@ -97,12 +97,6 @@ def drop_privileges(user):
     os.umask(0o22)
 
 
-def paths_gen(volume_path):
-    for root, dirs, files in os.walk(volume_path):
-        for name in files:
-            yield os.path.join(root, name)
-
-
 def statfs(volume):
     st = os.statvfs(volume)
     total = st.f_blocks * st.f_frsize
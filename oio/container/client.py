@@ -474,20 +474,28 @@ class ContainerClient(ProxyClient):
         return resp.status == 204
 
     def content_delete_many(self, account=None, reference=None, paths=None,
-                            cid=None, **kwargs):
+                            cid=None, versions=None, **kwargs):
         """
         Delete several objects.
 
         :param paths: an iterable of object paths (should not be a generator)
+        :param versions: a list of object versions, one for each path,
+            `None` to delete the latest versions
         :returns: a list of tuples with the path of the content and
-            a boolean telling if the content has been deleted
+            a boolean telling if the content has been deleted,
+            in the same order as `paths`
         :rtype: `list` of `tuple`
         """
         uri = self._make_uri('content/delete_many')
         params = self._make_params(account, reference, cid=cid)
+        paths = list(paths)
+        versions = list(versions) if versions else [None] * len(paths)
         unformatted_data = list()
-        for obj in paths:
-            unformatted_data.append({'name': obj})
+        for obj, version in zip(paths, versions):
+            content = {'name': obj}
+            if version is not None:
+                content['version'] = str(version)
+            unformatted_data.append(content)
         data = json.dumps({"contents": unformatted_data})
         results = list()
         try:
@@ -497,9 +505,9 @@ class ContainerClient(ProxyClient):
                 results.append((obj["name"], obj["status"] == 204))
             return results
         except exceptions.NotFound:
-            for obj in paths:
+            for obj, version in zip(paths, versions):
                 rc = self.content_delete(account, reference, obj, cid=cid,
-                                         **kwargs)
+                                         version=version, **kwargs)
                 results.append((obj, rc))
             return results
         except exceptions.TooLarge:
@@ -509,11 +517,11 @@ class ContainerClient(ProxyClient):
             if head:
                 results += self.content_delete_many(
                         account, reference, head,
-                        cid=cid, **kwargs)
+                        cid=cid, versions=versions[:pivot], **kwargs)
             if tail:
                 results += self.content_delete_many(
                         account, reference, tail,
-                        cid=cid, **kwargs)
+                        cid=cid, versions=versions[pivot:], **kwargs)
             return results
         except Exception:
             raise
@@ -20,13 +20,21 @@ try:
 except ImportError:
     from xml.etree import cElementTree as etree
 
+from eventlet import GreenPile
+
 from oio.common.exceptions import OioException
+from oio.common.green import ContextPool, pipelined_listing
 from oio.common.logger import get_logger
-from oio.common.utils import cid_from_name, depaginate
+from oio.common.utils import cid_from_name
 
 
 LIFECYCLE_PROPERTY_KEY = "X-Container-Sysmeta-Swift3-Lifecycle"
 
+# Defaults of the `LifecycleExecutor`
+DEFAULT_CONCURRENCY = 10
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_PAGE_SIZE = 1000
+
 
 def iso8601_to_int(text):
     # FIXME: use dateutil.parser?
@@ -116,16 +124,9 @@ class ContainerLifecycle(object):
         :rtype: generator of 4-tuples
         :notice: you must consume the results or the rules won't be applied.
         """
-        for obj_meta in depaginate(
-                self.api.object_list,
-                listing_key=lambda x: x['objects'],
-                marker_key=lambda x: x.get('next_marker'),
-                truncated_key=lambda x: x['truncated'],
-                account=self.account,
-                container=self.container,
-                properties=True,
-                versions=True,
-                **kwargs):
+        for obj_meta in self.api.object_list_iter(
+                self.account, self.container,
+                properties=True, versions=True, **kwargs):
             try:
                 results = self.apply(obj_meta, **kwargs)
                 for res in results:
@@ -137,6 +138,216 @@ class ContainerLifecycle(object):
                 yield obj_meta, "n/a", "n/a", exc
 
 
+class LifecycleExecutor(object):
+    """
+    Apply the rules of a lifecycle configuration on the objects of its
+    container, like `ContainerLifecycle.execute()`, but:
+    - only the objects matching the prefix of a rule are listed
+      (all objects are listed if a rule has no prefix),
+    - expired objects are deleted by batches (unless versioning
+      is enabled, since batches cannot delete specific versions),
+    - the other actions (except `NoncurrentVersionExpiration`)
+      are applied concurrently,
+    - the position in the listing is saved after each page,
+      so an interrupted execution can be resumed.
+    """
+
+    def __init__(self, lifecycle, concurrency=DEFAULT_CONCURRENCY,
+                 batch_size=DEFAULT_BATCH_SIZE, page_size=DEFAULT_PAGE_SIZE,
+                 logger=None):
+        """
+        :param lifecycle: a loaded `ContainerLifecycle`
+        :param concurrency: number of actions applied at once
+        :param batch_size: number of objects deleted with one request
+        :param page_size: number of objects listed with one request
+        """
+        self.lifecycle = lifecycle
+        self.api = lifecycle.api
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.page_size = page_size
+        self.logger = logger or lifecycle.logger
+        self.start_time = None
+        self.counters = {'objects': 0, 'deleted': 0,
+                         'transitioned': 0, 'errors': 0}
+
+    def listing_prefixes(self):
+        """
+        Get the prefixes of the listings to do, sorted,
+        without the ones included in others.
+
+        :returns: a list of prefixes, `[None]` for a full listing
+        """
+        prefixes = set()
+        for rule in self.lifecycle._rules.values():
+            if not rule.filter.prefix:
+                return [None]
+            prefixes.add(rule.filter.prefix)
+        kept = list()
+        for prefix in sorted(prefixes):
+            if kept and prefix.startswith(kept[-1]):
+                continue
+            kept.append(prefix)
+        return kept
+
+    def stats(self):
+        """
+        :returns: the number of objects processed, deleted, transitioned
+            and of errors, the time elapsed and the number of objects
+            processed per second
+        """
+        stats = dict(self.counters)
+        elapsed = time.time() - (self.start_time or time.time())
+        stats['elapsed'] = elapsed
+        stats['objects_per_second'] = \
+            stats['objects'] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def _count(self, res):
+        status = res[3]
+        if isinstance(status, Exception):
+            self.counters['errors'] += 1
+        elif status == "Deleted":
+            self.counters['deleted'] += 1
+        elif status.startswith("Policy changed"):
+            self.counters['transitioned'] += 1
+        return res
+
+    @staticmethod
+    def _apply(action, obj_meta, rule_id, now):
+        name = action.__class__.__name__
+        try:
+            return obj_meta, rule_id, name, action.apply(obj_meta, now=now)
+        except Exception as exc:
+            return obj_meta, rule_id, name, exc
+
+    def _delete(self, expired):
+        """
+        Delete the objects of `expired`, a list of tuples of
+        object metadata, rule name and action, by batches.
+        Only the listed versions are deleted, a version written
+        since the listing is kept.
+        """
+        keys = list()
+        for obj_meta, _, _ in expired:
+            key = (obj_meta['name'], obj_meta['version'])
+            if key not in keys:
+                keys.append(key)
+        statuses = dict()
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            try:
+                results = self.api.object_delete_many(
+                    self.lifecycle.account, self.lifecycle.container,
+                    [name for name, _ in batch],
+                    versions=[version for _, version in batch])
+                # The results are in the same order as the request
+                for key, (_, deleted) in zip(batch, results):
+                    statuses[key] = "Deleted" if deleted else "Kept"
+            except OioException as exc:
+                self.logger.warn("Failed to delete %d objects from %s/%s: %s",
+                                 len(batch), self.lifecycle.account,
+                                 self.lifecycle.container, exc)
+                for key in batch:
+                    statuses[key] = exc
+        return [(obj_meta, rule_id, action,
+                 statuses.get((obj_meta['name'], obj_meta['version'])))
+                for obj_meta, rule_id, action in expired]
+
+    def _process_page(self, objects, pool, now, batch_deletes):
+        results = list()
+        expired = list()
+        pile = GreenPile(pool)
+        for obj_meta in objects:
+            self.counters['objects'] += 1
+            for rule in self.lifecycle._rules.values():
+                try:
+                    matched = rule.match(obj_meta)
+                except Exception as exc:
+                    results.append((obj_meta, "n/a", "n/a", exc))
+                    continue
+                if not matched:
+                    results.append((obj_meta, rule.id, "n/a", "n/a"))
+                    continue
+                for action in rule.actions.values():
+                    if isinstance(action, NoncurrentVersionExpiration):
+                        # Not thread safe, and lists the versions anyway
+                        results.append(
+                            self._apply(action, obj_meta, rule.id, now))
+                    elif batch_deletes and isinstance(action, Expiration):
+                        name = action.__class__.__name__
+                        try:
+                            if action.match(obj_meta, now=now):
+                                expired.append((obj_meta, rule.id, name))
+                            else:
+                                results.append(
+                                    (obj_meta, rule.id, name, "Kept"))
+                        except Exception as exc:
+                            results.append((obj_meta, rule.id, name, exc))
+                    else:
+                        pile.spawn(self._apply, action, obj_meta, rule.id,
+                                   now)
+        if expired:
+            results.extend(self._delete(expired))
+        if pile.used:
+            # An unused pile would wait forever
+            results.extend(pile)
+        return [self._count(res) for res in results]
+
+    def execute(self, position=None, checkpoint=None, now=None):
+        """
+        Match then apply the set of rules of the lifecycle configuration
+        on the objects of the container.
+
+        :param position: where to resume the execution,
+            as passed to `checkpoint` by a previous execution
+        :type position: `dict`
+        :param checkpoint: a function called with the current position
+            after each page of objects has been processed,
+            and with `None` once all objects have been processed
+        :returns: tuples of (object metadata, rule name, action, status)
+        :rtype: generator of 4-tuples
+        :notice: you must consume the results or the rules won't be applied.
+        """
+        self.start_time = time.time()
+        now = now or self.start_time
+        batch_deletes = not NoncurrentVersionActionFilter(
+            lifecycle=self.lifecycle)._match(None)
+        prefixes = self.listing_prefixes()
+        marker = None
+        if position:
+            if position.get('prefix') in prefixes:
+                prefixes = prefixes[prefixes.index(position['prefix']):]
+                marker = position.get('marker')
+            else:
+                self.logger.info("Rules of %s/%s changed, starting over",
+                                 self.lifecycle.account,
+                                 self.lifecycle.container)
+        with ContextPool(self.concurrency) as pool:
+            for prefix in prefixes:
+                if checkpoint:
+                    checkpoint({'prefix': prefix, 'marker': marker})
+                pages = pipelined_listing(
+                    self.api.object_list,
+                    marker_key=lambda resp: resp.get('next_marker'),
+                    truncated_key=lambda resp: resp['truncated'],
+                    account=self.lifecycle.account,
+                    container=self.lifecycle.container,
+                    limit=self.page_size, prefix=prefix, marker=marker,
+                    properties=True, versions=True)
+                for page in pages:
+                    results = self._process_page(page['objects'], pool,
+                                                 now, batch_deletes)
+                    if checkpoint and page['truncated']:
+                        checkpoint({'prefix': prefix,
+                                    'marker': page.get('next_marker')})
+                    for res in results:
+                        yield res
+                marker = None
+        if checkpoint:
+            checkpoint(None)
+
+
 class LifecycleRule(object):
     """Combination of a filter and a set of lifecycle actions."""
 
@@ -428,10 +639,12 @@ class Transition(LifecycleAction):
         if self.match(obj_meta, **kwargs):
             cid = cid_from_name(self.lifecycle.account,
                                 self.lifecycle.container)
-            if not self.factory:
+            if not self.factory or obj_meta.get('policy') == self.policy:
                 return "Kept"
-            # TODO: avoid loading content description a second time
-            self.factory.change_policy(cid, obj_meta['id'], self.policy)
+            self.factory.change_policy(
+                cid, obj_meta['id'], self.policy,
+                account=self.lifecycle.account,
+                container_name=self.lifecycle.container)
             return "Policy changed to %s" % self.policy
         return "Kept"
 
@@ -110,32 +110,53 @@ class Content(object):
 
         return url_list
 
-    def _add_raw_chunk(self, current_chunk, url):
-        data = {'type': 'chunk',
-                'id': url,
-                'hash': current_chunk.checksum,
-                'size': current_chunk.size,
-                'pos': current_chunk.pos,
-                'content': self.content_id}
+    def _get_spare_chunks(self, current_chunks, chunks_broken=None):
+        """
+        Select spare chunks to replace several chunks of this content,
+        with one request per metachunk instead of one per chunk.
+
+        :param current_chunks: the `Chunk` objects to replace
+        :param chunks_broken: the chunks whose services must be avoided
+            (all `current_chunks` by default)
+        :returns: the URLs of the spare chunks, in the order
+            of `current_chunks`
+        """
+        if chunks_broken is None:
+            chunks_broken = current_chunks
+        by_metapos = dict()
+        for index, chunk in enumerate(current_chunks):
+            by_metapos.setdefault(chunk.metapos, list()).append(index)
+        spare_urls = [None] * len(current_chunks)
+        for metapos, indexes in by_metapos.items():
+            replaced = set(current_chunks[i].url for i in indexes)
+            notin = [c for c in self.chunks.filter(metapos=metapos)
+                     if c.url not in replaced]
+            broken = [c for c in chunks_broken if c.metapos == metapos]
+            urls = self._get_spare_chunk(notin, broken)
+            if len(urls) < len(indexes):
+                raise exc.SpareChunkException(
+                    "Only %d spare chunks for %d chunks at position %s" %
+                    (len(urls), len(indexes), metapos))
+            for index, url in zip(indexes, urls):
+                spare_urls[index] = url
+        return spare_urls
 
+    def _add_raw_chunk(self, current_chunk, url):
+        data = self._chunk_bean(current_chunk, url)
         self.container_client.container_raw_insert(
             data, cid=self.container_id)
 
+    def _chunk_bean(self, chunk, url=None):
+        return {'type': 'chunk',
+                'id': url or chunk.url,
+                'hash': chunk.checksum,
+                'size': chunk.size,
+                'pos': chunk.pos,
+                'content': self.content_id}
+
     def _update_spare_chunk(self, current_chunk, new_url):
-        old = {'type': 'chunk',
-               'id': current_chunk.url,
-               'hash': current_chunk.checksum,
-               'size': current_chunk.size,
-               'pos': current_chunk.pos,
-               'content': self.content_id}
-        new = {'type': 'chunk',
-               'id': new_url,
-               'hash': current_chunk.checksum,
-               'size': current_chunk.size,
-               'pos': current_chunk.pos,
-               'content': self.content_id}
-        self.container_client.container_raw_update(
-            [old], [new], cid=self.container_id)
+        update_spare_chunks(self.container_client, self.container_id,
+                            [(self, current_chunk, new_url)])
 
     def _generate_sysmeta(self):
         sysmeta = dict()
@@ -161,45 +182,127 @@ class Content(object):
             mime_type=self.mime_type, data=data,
             **kwargs)
 
-    def rebuild_chunk(self, chunk_id, allow_same_rawx=False, chunk_pos=None):
+    def _prepare_rebuild(self, chunk_id, allow_same_rawx=False,
+                         chunk_pos=None):
+        """
+        Find out what is needed to rebuild a chunk, without doing it.
+
+        :returns: a tuple with the chunk to rebuild (a new `Chunk` if it
+            is not referenced anymore), its ID (None if it is not
+            referenced), the chunks to rebuild it from, and the chunks
+            to avoid when selecting a spare
+        """
+        raise NotImplementedError()
+
+    def _rebuild_data(self, current_chunk, sources, spare_url):
+        """Rebuild the data of `current_chunk` from `sources`."""
         raise NotImplementedError()
 
+    def _register_rebuilt_chunk(self, current_chunk, chunk_id, new_url):
+        if chunk_id is None:
+            self._add_raw_chunk(current_chunk, new_url)
+        else:
+            self._update_spare_chunk(current_chunk, new_url)
+
+    def rebuild_chunk(self, chunk_id, allow_same_rawx=False, chunk_pos=None):
+        current_chunk, chunk_id, sources, broken_list = \
+            self._prepare_rebuild(chunk_id, allow_same_rawx=allow_same_rawx,
+                                  chunk_pos=chunk_pos)
+        spare_urls = self._get_spare_chunk(sources, broken_list)
+        self._rebuild_data(current_chunk, sources, spare_urls[0])
+        self._register_rebuilt_chunk(current_chunk, chunk_id, spare_urls[0])
+        self.logger.info('Chunk %s repaired in %s',
+                         chunk_id or current_chunk.pos, spare_urls[0])
+
     def create(self, stream, **kwargs):
         raise NotImplementedError()
 
-    def fetch(self):
+    def fetch(self, **kwargs):
         raise NotImplementedError()
 
     def delete(self, **kwargs):
         self.container_client.content_delete(
             cid=self.container_id, path=self.path, **kwargs)
 
-    def move_chunk(self, chunk_id):
+    def _copy_chunk_to_spare(self, chunk_id):
+        """
+        Copy a chunk to a spare, without referencing the copy.
+
+        :returns: a tuple with the `Chunk` and the URL of its copy
+        """
         current_chunk = self.chunks.filter(id=chunk_id).one()
         if current_chunk is None:
             raise OrphanChunk("Chunk not found in content")
 
-        other_chunks = self.chunks.filter(
-            metapos=current_chunk.metapos).exclude(id=chunk_id).all()
-
-        spare_urls = self._get_spare_chunk(other_chunks, [current_chunk])
+        spare_url = self._get_spare_chunks([current_chunk])[0]
 
         self.logger.debug("copy chunk from %s to %s",
-                          current_chunk.url, spare_urls[0])
-        self.blob_client.chunk_copy(current_chunk.url, spare_urls[0])
+                          current_chunk.url, spare_url)
+        self.blob_client.chunk_copy(current_chunk.url, spare_url)
+        return current_chunk, spare_url
 
-        self._update_spare_chunk(current_chunk, spare_urls[0])
+    def move_chunk(self, chunk_id):
+        current_chunk, spare_url = self._copy_chunk_to_spare(chunk_id)
+
+        self._update_spare_chunk(current_chunk, spare_url)
 
         try:
             self.blob_client.chunk_delete(current_chunk.url)
         except Exception:
             self.logger.warn("Failed to delete chunk %s" % current_chunk.url)
 
-        current_chunk.url = spare_urls[0]
+        current_chunk.url = spare_url
 
         return current_chunk.raw()
 
 
+def update_spare_chunks(container_client, container_id, substitutions,
+                        **kwargs):
+    """
+    Replace chunks of one or several contents of a container by their
+    spares, in only one meta2 transaction.
+
+    :param substitutions: an iterable of tuples with the `Content`,
+        the `Chunk` to replace, and the URL of its spare
+    """
+    old = list()
+    new = list()
+    for content, chunk, new_url in substitutions:
+        old.append(content._chunk_bean(chunk))
+        new.append(content._chunk_bean(chunk, new_url))
+    if old:
+        container_client.container_raw_update(old, new, cid=container_id,
+                                              **kwargs)
+
+
+def safe_update_spare_chunks(container_client, container_id, substitutions,
+                             **kwargs):
+    """
+    Like `update_spare_chunks()`, but if the whole batch fails,
+    retry each substitution alone, so that one content deleted
+    in the meantime does not prevent the others from being updated.
+
+    :returns: a list of tuples with the substitutions which
+        could not be done and the exception raised
+    """
+    substitutions = list(substitutions)
+    try:
+        update_spare_chunks(container_client, container_id, substitutions,
+                            **kwargs)
+        return []
+    except Exception as err:
+        if len(substitutions) == 1:
+            return [(substitutions[0], err)]
+    failed = list()
+    for substitution in substitutions:
+        try:
+            update_spare_chunks(container_client, container_id,
+                                [substitution], **kwargs)
+        except Exception as err:
+            failed.append((substitution, err))
+    return failed
+
+
 class Chunk(object):
     def __init__(self, chunk):
         self._data = chunk
@@ -22,7 +22,8 @@ from oio.common.constants import OIO_VERSION
 
 
 class ECContent(Content):
-    def rebuild_chunk(self, chunk_id, allow_same_rawx=False, chunk_pos=None):
+    def _prepare_rebuild(self, chunk_id, allow_same_rawx=False,
+                         chunk_pos=None):
         current_chunk = self.chunks.filter(id=chunk_id).one()
 
         if current_chunk is None and chunk_pos is None:
@@ -47,12 +48,14 @@ class ECContent(Content):
         broken_list = list()
         if not allow_same_rawx and chunk_id is not None:
             broken_list.append(current_chunk)
-        spare_url = self._get_spare_chunk(chunks.all(), broken_list)
+        return current_chunk, chunk_id, chunks.all(), broken_list
 
+    def _rebuild_data(self, current_chunk, sources, spare_url):
         handler = ECRebuildHandler(
-            chunks.raw(), current_chunk.subpos, self.storage_method)
+            [chunk.raw() for chunk in sources], current_chunk.subpos,
+            self.storage_method)
 
-        new_chunk = Chunk({'pos': current_chunk.pos, 'url': spare_url[0]})
+        new_chunk = Chunk({'pos': current_chunk.pos, 'url': spare_url})
         stream = handler.rebuild()
 
         meta = {}
@@ -82,17 +85,11 @@ class ECContent(Content):
         meta['metachunk_size'] = current_chunk.size
         meta['full_path'] = self.full_path
         meta['oio_version'] = OIO_VERSION
-        self.blob_client.chunk_put(spare_url[0], meta, GeneratorIO(stream))
-        if chunk_id is None:
-            self._add_raw_chunk(current_chunk, spare_url[0])
-        else:
-            self._update_spare_chunk(current_chunk, spare_url[0])
-        self.logger.info('Chunk %s repaired in %s',
-                         chunk_id or chunk_pos, spare_url[0])
+        self.blob_client.chunk_put(spare_url, meta, GeneratorIO(stream))
 
-    def fetch(self):
+    def fetch(self, **kwargs):
         chunks = _sort_chunks(self.chunks.raw(), self.storage_method.ec)
-        stream = fetch_stream_ec(chunks, None, self.storage_method)
+        stream = fetch_stream_ec(chunks, None, self.storage_method, **kwargs)
         return stream
 
     def create(self, stream, **kwargs):
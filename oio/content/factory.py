@@ -13,7 +13,9 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library.
 
-from oio.common.exceptions import ContentNotFound
+from eventlet import GreenPile
+
+from oio.common.exceptions import ContentNotFound, OioException
 from oio.common.exceptions import NotFound
 from oio.common.utils import GeneratorIO
 from oio.common.logger import get_logger
@@ -24,11 +26,22 @@ from oio.content.ec import ECContent
 from oio.common.storage_method import STORAGE_METHODS
 
 
+# Number of chunks copied at once when changing the policy
+# of a content without re-encoding it
+COPY_CONCURRENCY = 4
+
+
 class ContentFactory(object):
     DEFAULT_DATASEC = "plain", {"nb_copy": "1", "distance": "0"}
 
     def __init__(self, conf, container_client=None, logger=None, **kwargs):
+        """
+        :keyword prefetch_metachunks: number of metachunks read in advance
+            while the current one is written, when changing the policy
+            of a content (1 by default)
+        """
         self.conf = conf
+        self.prefetch_metachunks = int(kwargs.pop('prefetch_metachunks', 1))
         self.logger = logger or get_logger(conf)
         self.container_client = container_client or \
             ContainerClient(conf, logger=self.logger, **kwargs)
@@ -102,17 +115,103 @@ class ContentFactory(object):
         cls = ECContent if storage_method.ec else PlainContent
         return cls(self.conf, origin.container_id,
                    metadata, chunks, storage_method,
-                   origin.account, origin.container_name)
+                   origin.account, origin.container_name,
+                   container_client=self.container_client,
+                   blob_client=self.blob_client,
+                   logger=self.logger)
+
+    @staticmethod
+    def _same_geometry(old_content, new_content):
+        """
+        Tell if the chunks of `new_content` can be copied from
+        the chunks of `old_content`: both contents are replicated,
+        and cut at the same positions, with the same sizes.
+        """
+        if old_content.storage_method.ec or new_content.storage_method.ec:
+            return False
+        chunk_size = int(new_content.metadata['chunk_size'])
+        if int(old_content.metadata['chunk_size']) != chunk_size:
+            return False
+        if (set(c.pos for c in old_content.chunks) !=
+                set(c.pos for c in new_content.chunks)):
+            return False
+        length = int(new_content.metadata['length'])
+        for chunk in old_content.chunks:
+            expected = min(chunk_size, length - int(chunk.pos) * chunk_size)
+            if chunk.size != expected:
+                return False
+        return True
+
+    def _copy_chunk(self, sources, chunk, sysmeta):
+        """
+        Copy one of the `sources` chunks to `chunk`,
+        with the attributes of the new content.
+
+        :returns: None, or the error of the last copy attempt
+        """
+        error = None
+        for source in sources:
+            stream = None
+            try:
+                _meta, stream = self.blob_client.chunk_get(source.url)
+                meta = dict(sysmeta, chunk_pos=chunk.pos,
+                            chunk_hash=source.checksum)
+                self.blob_client.chunk_put(chunk.url, meta, stream)
+                return None
+            except Exception as err:
+                self.logger.warn("Failed to copy chunk from %s to %s: %s",
+                                 source.url, chunk.url, err)
+                error = err
+            finally:
+                if stream:
+                    stream.close()
+        return error
+
+    def _copy_chunks(self, old_content, new_content):
+        """
+        Copy the chunks of `old_content` to the chunks of `new_content`,
+        several at once, without decoding them.
+        """
+        sysmeta = new_content._generate_sysmeta()
+        pile = GreenPile(COPY_CONCURRENCY)
+        for chunk in new_content.chunks:
+            sources = old_content.chunks.filter(pos=chunk.pos).all()
+            chunk.size = sources[0].size
+            chunk.checksum = sources[0].checksum
+            pile.spawn(self._copy_chunk, sources, chunk, sysmeta)
+        errors = [err for err in pile if err is not None]
+        if errors:
+            raise OioException("Failed to copy %d chunks of %s: %s" %
+                               (len(errors), old_content.path, errors[0]))
+
+    def change_policy(self, container_id, content_id, new_policy,
+                      account=None, container_name=None):
+        """
+        Change the storage policy of a content.
+
+        When both policies are replicated and cut the content at the same
+        positions, the chunks are copied as they are. Otherwise the data
+        is streamed from the old chunks to the new ones, the next
+        metachunks being read while the current one is written.
 
-    def change_policy(self, container_id, content_id, new_policy):
-        old_content = self.get(container_id, content_id)
+        :param account: account of the content, saves a request
+            when provided with `container_name`
+        :param container_name: name of the container of the content
+        """
+        old_content = self.get(container_id, content_id, account=account,
+                               container_name=container_name)
         if old_content.policy == new_policy:
             return old_content
 
         new_content = self.copy(old_content, policy=new_policy)
 
-        stream = old_content.fetch()
-        new_content.create(GeneratorIO(stream))
+        if self._same_geometry(old_content, new_content):
+            self._copy_chunks(old_content, new_content)
+            new_content._create_object()
+        else:
+            stream = old_content.fetch(
+                prefetch_metachunks=self.prefetch_metachunks)
+            new_content.create(GeneratorIO(stream))
         # the old content is automatically deleted because the new content has
         # the same name (but not the same id)
         return new_content
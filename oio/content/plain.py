@@ -23,10 +23,10 @@ from oio.common.exceptions import UnrecoverableContent
 
 
 class PlainContent(Content):
-    def fetch(self):
+    def fetch(self, **kwargs):
         storage_method = STORAGE_METHODS.load(self.chunk_method)
         chunks = _sort_chunks(self.chunks.raw(), storage_method.ec)
-        stream = fetch_stream(chunks, None, storage_method)
+        stream = fetch_stream(chunks, None, storage_method, **kwargs)
         return stream
 
     def create(self, stream, **kwargs):
@@ -46,7 +46,8 @@ class PlainContent(Content):
         self._create_object(**kwargs)
         return final_chunks, bytes_transferred, content_checksum
 
-    def rebuild_chunk(self, chunk_id, allow_same_rawx=False, chunk_pos=None):
+    def _prepare_rebuild(self, chunk_id, allow_same_rawx=False,
+                         chunk_pos=None):
         current_chunk = self.chunks.filter(id=chunk_id).one()
         if current_chunk is None and chunk_pos is None:
             raise exc.OrphanChunk("Chunk not found in content")
@@ -69,27 +70,17 @@ class PlainContent(Content):
         broken_list = list()
         if not allow_same_rawx and chunk_id is not None:
             broken_list.append(current_chunk)
-        spare_urls = self._get_spare_chunk(
-            duplicate_chunks, broken_list)
+        return current_chunk, chunk_id, duplicate_chunks, broken_list
 
-        uploaded = False
-        for src in duplicate_chunks:
+    def _rebuild_data(self, current_chunk, sources, spare_url):
+        for src in sources:
             try:
-                self.blob_client.chunk_copy(src.url, spare_urls[0])
+                self.blob_client.chunk_copy(src.url, spare_url)
                 self.logger.debug('Chunk copied from %s to %s, registering it',
-                                  src.url, spare_urls[0])
-                uploaded = True
-                break
+                                  src.url, spare_url)
+                return
             except Exception as err:
                 self.logger.warn(
                     "Failed to copy chunk from %s to %s: %s", src.url,
-                    spare_urls[0], str(err.message))
-        if not uploaded:
-            raise UnrecoverableContent("No copy available of missing chunk")
-
-        if chunk_id is None:
-            self._add_raw_chunk(current_chunk, spare_urls[0])
-        else:
-            self._update_spare_chunk(current_chunk, spare_urls[0])
-        self.logger.info('Chunk %s repaired in %s',
-                         chunk_id or chunk_pos, spare_urls[0])
+                    spare_url, str(err.message))
+        raise UnrecoverableContent("No copy available of missing chunk")
@@ -0,0 +1,99 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+from eventlet import GreenPool
+
+from oio.common.easy_value import int_value
+from oio.common.green import RateLimiter
+from oio.common.logger import get_logger
+
+
+DEFAULT_CONCURRENCY = 4
+
+
+class PolicyTransitioner(object):
+    """
+    Change the storage policy of several contents at once,
+    without transferring more than `bytes_per_second`.
+    """
+
+    def __init__(self, factory, concurrency=DEFAULT_CONCURRENCY,
+                 bytes_per_second=0, logger=None):
+        """
+        :param factory: the `ContentFactory` changing the policies
+        :param concurrency: number of contents transitioned at once
+        :param bytes_per_second: maximum number of bytes of contents
+            transitioned per second, by all green threads
+            (0 means unlimited)
+        """
+        self.factory = factory
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(bytes_per_second)
+        self.logger = logger or get_logger(None, name=str(self.__class__))
+
+    def change_policy(self, container_id, content_id, new_policy,
+                      account=None, container_name=None, metadata=None):
+        """
+        Change the storage policy of a content, after waiting for
+        its size to fit in the byte rate budget.
+
+        :param metadata: description of the content, as returned by
+            a listing. Its size is used to wait before loading the
+            content, and nothing is loaded if its policy is already
+            `new_policy`.
+        :returns: the new content, or None when nothing has been done
+        """
+        length = None
+        if metadata is not None:
+            if metadata.get('policy') == new_policy:
+                return None
+            length = int_value(metadata.get('length'), None)
+        if length is not None:
+            self.limiter.wait(length)
+        content = self.factory.change_policy(
+            container_id, content_id, new_policy,
+            account=account, container_name=container_name)
+        if length is None:
+            # Size unknown in advance, count it for the next ones
+            self.limiter.wait(content.length)
+        return content
+
+    def _safe_change_policy(self, item):
+        try:
+            return item, self.change_policy(
+                item['container_id'], item['content_id'], item['policy'],
+                account=item.get('account'),
+                container_name=item.get('container_name'),
+                metadata=item.get('metadata'))
+        except Exception as err:
+            self.logger.warn("Failed to change the policy of %s/%s: %s",
+                             item['container_id'], item['content_id'], err)
+            return item, err
+
+    def run(self, items):
+        """
+        Change the storage policy of contents, `concurrency` at once.
+
+        :param items: an iterable of `dict` with 'container_id',
+            'content_id' and 'policy' (the new one) keys, and optional
+            'account', 'container_name' and 'metadata' keys
+            (see `change_policy()`)
+        :returns: a generator of tuples with each item and the new
+            content (or None if nothing has been done, or the exception
+            raised), in the order of the items
+        """
+        pool = GreenPool(self.concurrency)
+        for res in pool.imap(self._safe_change_policy, items):
+            yield res
@@ -21,6 +21,8 @@ from __future__ import print_function
 import os
 import csv
 import sys
+import sqlite3
+import tempfile
 from io import StringIO
 import argparse
 
@@ -28,6 +30,9 @@ from eventlet.event import Event
 from eventlet.greenpool import GreenPool
 
 from oio.common import exceptions as exc
+from oio.common.cache import LruCache
+from oio.common.green import pipelined_listing
+from oio.common.json import json
 from oio.common.storage_method import STORAGE_METHODS
 from oio.account.client import AccountClient
 from oio.container.client import ContainerClient
@@ -35,6 +40,11 @@ from oio.blob.client import BlobClient
 from oio.api.object_storage import _sort_chunks
 
 
+# Maximum number of listed elements (containers, objects, chunks)
+# kept in memory by the checker
+DEFAULT_CACHE_SIZE = 1000000
+
+
 class Target(object):
     def __init__(self, account, container=None, obj=None, chunk=None):
         self.account = account
@@ -60,10 +70,109 @@ class Target(object):
         return s
 
 
+class SpilledListing(object):
+    """
+    Listing of a container, stored in a `ListingSpill` database.
+    Behaves like the `dict` of objects (indexed by name) it replaces.
+    """
+
+    def __init__(self, spill, account, container):
+        self.spill = spill
+        self.key = (account, container)
+
+    def __contains__(self, name):
+        return self.spill.get(self.key, name) is not None
+
+    def __getitem__(self, name):
+        obj = self.spill.get(self.key, name)
+        if obj is None:
+            raise KeyError(name)
+        return obj
+
+    def __iter__(self):
+        return self.spill.names(self.key)
+
+    def update(self, objects):
+        self.spill.store(self.key, objects)
+
+
+class ListingSpill(object):
+    """
+    Store container listings in a temporary SQLite database,
+    to keep them out of memory.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, spill_dir=None):
+        fd, self.path = tempfile.mkstemp(
+            prefix='oio-integrity-', suffix='.sqlite', dir=spill_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode = OFF')
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute(
+            'CREATE TABLE listing (account TEXT, container TEXT, '
+            'name TEXT, obj TEXT, PRIMARY KEY (account, container, name))')
+        self.listings = 0
+
+    def listing(self, account, container):
+        """Get a new (empty) listing for the specified container."""
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM listing WHERE account = ? AND container = ?',
+                (account, container))
+        self.listings += 1
+        return SpilledListing(self, account, container)
+
+    def store(self, key, objects):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO listing VALUES (?, ?, ?, ?)',
+                ((key[0], key[1], name, json.dumps(obj))
+                 for name, obj in objects))
+
+    def get(self, key, name):
+        row = self.conn.execute(
+            'SELECT obj FROM listing '
+            'WHERE account = ? AND container = ? AND name = ?',
+            (key[0], key[1], name)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def names(self, key):
+        # Fetch names by batches, so no cursor stays open
+        # while the caller is using the results.
+        marker = ''
+        while True:
+            rows = self.conn.execute(
+                'SELECT name FROM listing '
+                'WHERE account = ? AND container = ? AND name > ? '
+                'ORDER BY name LIMIT ?',
+                (key[0], key[1], marker, self.BATCH_SIZE)).fetchall()
+            for row in rows:
+                yield row[0]
+            if len(rows) < self.BATCH_SIZE:
+                break
+            marker = rows[-1][0]
+
+    def close(self):
+        self.conn.close()
+        os.remove(self.path)
+
+
+def _listing_weight(value):
+    """Weight of a cached listing: its number of elements."""
+    listing = value[0] if isinstance(value, tuple) else value
+    if isinstance(listing, SpilledListing):
+        return 1
+    return len(listing) + 1
+
+
 class Checker(object):
     def __init__(self, namespace, concurrency=50,
                  error_file=None, rebuild_file=None, full=True,
-                 limit_listings=0, request_attempts=1):
+                 limit_listings=0, request_attempts=1, listing_prefetch=1,
+                 cache_size=DEFAULT_CACHE_SIZE, spill_dir=None):
         self.pool = GreenPool(concurrency)
         self.error_file = error_file
         self.full = bool(full)
@@ -73,6 +182,8 @@ class Checker(object):
         # 1 -> limit account listings (list of containers)
         # 2 -> limit container listings (list of objects)
         self.limit_listings = limit_listings
+        # Number of container listing pages to request in advance
+        self.listing_prefetch = listing_prefetch
         if self.error_file:
             f = open(self.error_file, 'a')
             self.error_writer = csv.writer(f, delimiter=' ')
@@ -105,9 +216,23 @@ class Checker(object):
         self.object_exceptions = 0
         self.chunk_exceptions = 0
 
-        self.list_cache = {}
+        # Listings, indexed by account, (account, container)
+        # or (account, container, obj)
+        self.list_cache = LruCache(cache_size, weigher=_listing_weight)
+        # Container listings can be stored on disk
+        self.spill = None
+        if spill_dir:
+            self.spill = ListingSpill(spill_dir)
+        # Events telling when a check is done, with the same keys
+        # as the cache. The result of the check is sent
+        # with the event, if it should have been cached.
         self.running = {}
 
+    def close(self):
+        if self.spill:
+            self.spill.close()
+            self.spill = None
+
     def write_error(self, target):
         error = [target.account]
         if target.container:
@@ -125,16 +250,14 @@ class Checker(object):
             cid = ct_meta['properties']['sys.name'].split('.', 1)[0]
         self.rebuild_writer.writerow((cid, obj_meta['id'], target.chunk))
 
-    def write_chunk_error(self, target, obj_meta, chunk=None):
+    def write_chunk_error(self, target, obj_meta, ct_meta, chunk=None):
         if chunk is not None:
             target = target.copy()
             target.chunk = chunk
         if self.error_file:
             self.write_error(target)
         if self.rebuild_file:
-            self.write_rebuilder_input(
-                target, obj_meta,
-                self.list_cache[(target.account, target.container)][1])
+            self.write_rebuilder_input(target, obj_meta, ct_meta)
 
     def _check_chunk_xattr(self, target, obj_meta, xattr_meta):
         error = False
@@ -161,7 +284,7 @@ class Checker(object):
     def check_chunk(self, target):
         chunk = target.chunk
 
-        obj_listing, obj_meta = self.check_obj(target)
+        obj_listing, obj_meta, ct_meta = self.check_obj(target)
         error = False
         if chunk not in obj_listing:
             print('  Chunk %s missing from object listing' % target)
@@ -185,11 +308,11 @@ class Checker(object):
                 error = self._check_chunk_xattr(target, db_meta, xattr_meta)
 
         if error:
-            self.write_chunk_error(target, obj_meta)
+            self.write_chunk_error(target, obj_meta, ct_meta)
 
         self.chunks_checked += 1
 
-    def check_obj_policy(self, target, obj_meta, chunks):
+    def check_obj_policy(self, target, obj_meta, chunks, ct_meta):
         """
         Check that the list of chunks of an object matches
         the object's storage policy.
@@ -208,21 +331,26 @@ class Checker(object):
                     subs = {x['num'] for x in clist}
                     for sub in range(required):
                         if sub not in subs:
-                            self.write_chunk_error(target, obj_meta,
+                            self.write_chunk_error(target, obj_meta, ct_meta,
                                                    '%d.%d' % (pos, sub))
                 else:
-                    self.write_chunk_error(target, obj_meta, str(pos))
+                    self.write_chunk_error(target, obj_meta, ct_meta,
+                                           str(pos))
 
     def check_obj(self, target, recurse=False):
         account = target.account
         container = target.container
         obj = target.obj
 
-        if (account, container, obj) in self.running:
-            self.running[(account, container, obj)].wait()
-        if (account, container, obj) in self.list_cache:
-            return self.list_cache[(account, container, obj)]
-        self.running[(account, container, obj)] = Event()
+        key = (account, container, obj)
+        if key in self.running:
+            result = self.running[key].wait()
+            if result is not None:
+                return result
+        result = self.list_cache.get(key)
+        if result is not None:
+            return result
+        self.running[key] = Event()
         print('Checking object "%s"' % target)
         container_listing, ct_meta = self.check_container(target)
         error = False
@@ -255,13 +383,14 @@ class Checker(object):
             chunk_listing[chunk['url']] = chunk
 
         # Skip the check if we could not locate the object
+        result = None
         if meta:
-            self.check_obj_policy(target.copy(), meta, results)
-            self.list_cache[(account, container, obj)] = (chunk_listing, meta)
+            self.check_obj_policy(target.copy(), meta, results, ct_meta)
+            result = (chunk_listing, meta, ct_meta)
+            self.list_cache.put(key, result)
 
         self.objects_checked += 1
-        self.running[(account, container, obj)].send(True)
-        del self.running[(account, container, obj)]
+        self.running.pop(key).send(result)
 
         if recurse:
             for chunk in chunk_listing:
@@ -270,17 +399,21 @@ class Checker(object):
                 self.pool.spawn_n(self.check_chunk, t)
         if error and self.error_file:
             self.write_error(target)
-        return chunk_listing, meta
+        return chunk_listing, meta, ct_meta
 
     def check_container(self, target, recurse=False):
         account = target.account
         container = target.container
 
-        if (account, container) in self.running:
-            self.running[(account, container)].wait()
-        if (account, container) in self.list_cache:
-            return self.list_cache[(account, container)]
-        self.running[(account, container)] = Event()
+        key = (account, container)
+        if key in self.running:
+            result = self.running[key].wait()
+            if result is not None:
+                return result
+        result = self.list_cache.get(key)
+        if result is not None:
+            return result
+        self.running[key] = Event()
         print('Checking container "%s"' % target)
         account_listing = self.check_account(target)
         error = False
@@ -288,8 +421,6 @@ class Checker(object):
             error = True
             print('  Container %s missing from account listing' % target)
 
-        marker = None
-        results = []
         ct_meta = dict()
         extra_args = dict()
         if self.limit_listings > 1 and target.obj:
@@ -297,42 +428,45 @@ class Checker(object):
             # where this object is supposed to be, and list only one object.
             extra_args['prefix'] = target.obj
             extra_args['limit'] = 1
-        while True:
-            try:
-                _, resp = self.container_client.content_list(
-                    account=account, reference=container, marker=marker,
-                    **extra_args)
-            except exc.NotFound as e:
-                self.container_not_found += 1
-                error = True
-                print('  Not found container "%s": %s' % (target, str(e)))
-                break
-            except Exception as e:
-                self.container_exceptions += 1
-                error = True
-                print('  Exception container "%s": %s' % (target, str(e)))
-                break
-
-            if resp['objects']:
-                marker = resp['objects'][-1]['name']
-                results.extend(resp['objects'])
-                if self.limit_listings > 1:
-                    break
-            else:
-                ct_meta = resp
-                ct_meta.pop('objects')
-                break
 
-        container_listing = dict()
-        for obj in results:
-            container_listing[obj['name']] = obj
+        def _truncated(listing):
+            # Stop after the first page when listings are limited,
+            # or when an empty page is returned.
+            return bool(listing[1]['objects']) and self.limit_listings <= 1
+
+        pages = pipelined_listing(
+            self.container_client.content_list,
+            marker_key=lambda listing: listing[1]['objects'][-1]['name'],
+            truncated_key=_truncated, prefetch=self.listing_prefetch,
+            account=account, reference=container, **extra_args)
+        if self.spill and self.limit_listings <= 1:
+            container_listing = self.spill.listing(account, container)
+        else:
+            container_listing = dict()
+        try:
+            for _, resp in pages:
+                if resp['objects']:
+                    container_listing.update(
+                        (obj['name'], obj) for obj in resp['objects'])
+                else:
+                    ct_meta = resp
+                    ct_meta.pop('objects')
+        except exc.NotFound as e:
+            self.container_not_found += 1
+            error = True
+            print('  Not found container "%s": %s' % (target, str(e)))
+        except Exception as e:
+            self.container_exceptions += 1
+            error = True
+            print('  Exception container "%s": %s' % (target, str(e)))
 
+        result = None
         if self.limit_listings <= 1:
             # We just listed the whole container, keep the result in a cache
             self.containers_checked += 1
-            self.list_cache[(account, container)] = container_listing, ct_meta
-        self.running[(account, container)].send(True)
-        del self.running[(account, container)]
+            result = (container_listing, ct_meta)
+            self.list_cache.put(key, result)
+        self.running.pop(key).send(result)
 
         if recurse:
             for obj in container_listing:
@@ -347,9 +481,12 @@ class Checker(object):
         account = target.account
 
         if account in self.running:
-            self.running[account].wait()
-        if account in self.list_cache:
-            return self.list_cache[account]
+            result = self.running[account].wait()
+            if result is not None:
+                return result
+        result = self.list_cache.get(account)
+        if result is not None:
+            return result
         self.running[account] = Event()
         print('Checking account "%s"' % target)
         error = False
@@ -383,12 +520,13 @@ class Checker(object):
         for e in results:
             containers[e[0]] = (e[1], e[2])
 
+        result = None
         if self.limit_listings <= 0:
             # We just listed the whole account, keep the result in a cache
             self.accounts_checked += 1
-            self.list_cache[account] = containers
-        self.running[account].send(True)
-        del self.running[account]
+            result = containers
+            self.list_cache.put(account, result)
+        self.running.pop(account).send(result)
 
         if recurse:
             for container in containers:
@@ -442,6 +580,12 @@ class Checker(object):
             _report_stat("Missing chunks", self.chunk_not_found)
         if self.chunk_exceptions:
             _report_stat("Exceptions", self.chunk_exceptions)
+        print()
+        _report_stat("Cached listings", len(self.list_cache))
+        _report_stat("Cached elements", self.list_cache.weight)
+        _report_stat("Cache evictions", self.list_cache.evictions)
+        if self.spill:
+            _report_stat("Spilled listings", self.spill.listings)
 
 
 def main():
@@ -476,6 +620,18 @@ def main():
     parser.add_argument('--attempts', type=int, default=1,
                         help=('Number of attempts for '
                               'listing requests (default: 1).'))
+    parser.add_argument('--listing-prefetch', type=int, default=1,
+                        help=('Number of container listing pages to '
+                              'request in advance (default: 1).'))
+    parser.add_argument('--cache-size', type=int,
+                        default=DEFAULT_CACHE_SIZE,
+                        help=('Maximum number of listed elements kept '
+                              'in memory (default: %d).' %
+                              DEFAULT_CACHE_SIZE))
+    parser.add_argument('--spill-dir',
+                        help=('Store container listings in a temporary '
+                              'database in this directory, instead of '
+                              'keeping them in memory.'))
 
     args = parser.parse_args()
 
@@ -498,9 +654,16 @@ def main():
         full=not args.presence,
         limit_listings=limit_listings,
         request_attempts=args.attempts,
+        listing_prefetch=args.listing_prefetch,
+        cache_size=args.cache_size,
+        spill_dir=args.spill_dir,
     )
     args = csv.reader(source, delimiter=' ')
-    for entry in args:
-        checker.check(Target(*entry))
-    checker.wait()
-    checker.report()
+    try:
+        for entry in args:
+            checker.check(Target(*entry))
+        checker.wait()
+        checker.report()
+    finally:
+        # Remove the spilled listings
+        checker.close()
@@ -13,7 +13,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import os
 import time
+from collections import deque
+
+from eventlet.queue import Queue
 
 from oio.account.client import AccountClient
 from oio.common import exceptions as exc
@@ -22,9 +27,11 @@ from oio.common.exceptions import NotFound
 from oio.common.utils import cid_from_name
 from oio.common.easy_value import int_value
 from oio.common.logger import get_logger
-from oio.common.green import ratelimit
+from oio.common.green import ContextPool, RateLimiter, pipelined_listing, \
+    ratelimit
 from oio.container.client import ContainerClient
 from oio.content.factory import ContentFactory
+from oio.content.transition import PolicyTransitioner
 
 SLEEP_TIME = 30
 
@@ -33,6 +40,20 @@ CONF_OUTDATED_THRESHOLD = 'outdated_threshold'
 CONF_NEW_POLICY = 'new_policy'
 
 
+class ContainerProgress(object):
+    """Progress of the storage tiering of a container."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        # The listing, and each content listed but not processed yet
+        self.pending = 1
+        self.processed = 0
+        self.errors = 0
+        self.bytes = 0
+        # The listing stopped before the end of the container
+        self.listing_failed = False
+
+
 class StorageTiererWorker(object):
 
     def __init__(self, conf, logger):
@@ -55,12 +76,35 @@ class StorageTiererWorker(object):
             conf.get('container_fetch_limit'), 100)
         self.content_fetch_limit = int_value(
             conf.get('content_fetch_limit'), 100)
+        self.listing_prefetch = int_value(
+            conf.get('listing_prefetch'), 1)
         self.outdated_threshold = int_value(
             conf.get(CONF_OUTDATED_THRESHOLD), 9999999999)
         self.new_policy = conf.get(CONF_NEW_POLICY)
 
-    def _list_containers(self):
-        container = None
+        # Worker pool mode, when concurrency > 1
+        self.concurrency = int_value(conf.get('concurrency'), 1)
+        self.listing_concurrency = int_value(
+            conf.get('listing_concurrency'), 4)
+        self.queue_size = int_value(
+            conf.get('queue_size'), 2 * self.concurrency)
+        self.container_contents_per_second = int_value(
+            conf.get('container_contents_per_second'), 0)
+        self.checkpoint_file = conf.get('checkpoint_file')
+        self.transitioner = PolicyTransitioner(
+            self.content_factory,
+            bytes_per_second=int_value(conf.get('bytes_per_second'), 0),
+            logger=self.logger)
+        self.start_time = self.report_time = 0
+        self.total_errors = 0
+        # Containers being processed, in listing order
+        self.containers = deque()
+        self.progress = dict()
+        # First container of the pass whose listing failed
+        self.listing_failed = None
+
+    def _list_containers(self, marker=None):
+        container = marker
         while True:
             resp = self.account_client.container_list(
                 self.account, marker=container,
@@ -71,34 +115,74 @@ class StorageTiererWorker(object):
                 container = res[0]
                 yield container
 
+    def _is_candidate(self, obj, now):
+        if obj["mtime"] > now - self.outdated_threshold:
+            return False
+        return obj["policy"] != self.new_policy
+
+    def _list_container_contents(self, container):
+        """Yield the description of the contents to process."""
+        pages = pipelined_listing(
+            self.container_client.content_list,
+            marker_key=lambda page: page[1]["objects"][-1]["name"],
+            truncated_key=lambda page: bool(page[1]["objects"]),
+            prefetch=self.listing_prefetch,
+            account=self.account, reference=container,
+            limit=self.content_fetch_limit)
+        try:
+            for _, listing in pages:
+                now = time.time()
+                for obj in listing["objects"]:
+                    if self._is_candidate(obj, now):
+                        yield obj
+        except NotFound:
+            self.logger.warn(
+                "Container %s appears in account but doesn't exist",
+                container)
+
     def _list_contents(self):
         for container in self._list_containers():
-            marker = None
-            while True:
-                try:
-                    _, listing = self.container_client.content_list(
-                        account=self.account, reference=container,
-                        limit=self.content_fetch_limit, marker=marker)
-                except NotFound:
-                    self.logger.warn(
-                        "Container %s appears in account but doesn't exist",
-                        container)
-                    break
-                if len(listing["objects"]) == 0:
-                    break
-                for obj in listing["objects"]:
-                    marker = obj["name"]
-                    if obj["mtime"] > time.time() - self.outdated_threshold:
-                        continue
-                    if obj["policy"] == self.new_policy:
-                        continue
-                    container_id = cid_from_name(self.account, container)
-                    yield (container_id, obj["content"])
+            container_id = cid_from_name(self.account, container)
+            for obj in self._list_container_contents(container):
+                yield (container_id, obj["content"])
 
-    def run(self):
-        start_time = report_time = time.time()
+    def _report(self, now):
+        if now - self.last_reported >= self.report_interval:
+            self.logger.info(
+                '%(start_time)s '
+                '%(passes)d '
+                '%(errors)d '
+                '%(c_rate).2f '
+                '%(total).2f ' % {
+                    'start_time': time.ctime(self.report_time),
+                    'passes': self.passes,
+                    'errors': self.errors,
+                    'c_rate': self.passes / (now - self.report_time),
+                    'total': (now - self.start_time)
+                }
+            )
+            self.report_time = now
+            self.total_errors += self.errors
+            self.passes = 0
+            self.errors = 0
+            self.last_reported = now
+
+    def _report_end(self):
+        elapsed = (time.time() - self.start_time) or 0.000001
+        self.logger.info(
+            '%(elapsed).02f '
+            '%(errors)d '
+            '%(content_rate).2f ' % {
+                'elapsed': elapsed,
+                'errors': self.total_errors + self.errors,
+                'content_rate': self.total_contents_processed / elapsed
+            }
+        )
 
-        total_errors = 0
+    def run(self):
+        if self.concurrency > 1:
+            return self.run_pool()
+        self.start_time = self.report_time = time.time()
 
         for (container_id, content_id) in self._list_contents():
             self.safe_change_policy(container_id, content_id)
@@ -108,37 +192,165 @@ class StorageTiererWorker(object):
                 self.max_contents_per_second
             )
             self.total_contents_processed += 1
-            now = time.time()
-
-            if now - self.last_reported >= self.report_interval:
-                self.logger.info(
-                    '%(start_time)s '
-                    '%(passes)d '
-                    '%(errors)d '
-                    '%(c_rate).2f '
-                    '%(total).2f ' % {
-                        'start_time': time.ctime(report_time),
-                        'passes': self.passes,
-                        'errors': self.errors,
-                        'c_rate': self.passes / (now - report_time),
-                        'total': (now - start_time)
-                    }
-                )
-                report_time = now
-                total_errors += self.errors
-                self.passes = 0
-                self.errors = 0
-                self.last_reported = now
-        elapsed = (time.time() - start_time) or 0.000001
+            self._report(time.time())
+        self._report_end()
+
+    def _load_checkpoint(self):
+        """Get the last container fully processed by a previous pass."""
+        if not self.checkpoint_file or \
+                not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file, 'r') as file_:
+                checkpoint = json.load(file_)
+        except (IOError, ValueError) as err:
+            self.logger.warn("Failed to load checkpoint from %s: %s",
+                             self.checkpoint_file, err)
+            return None
+        if checkpoint.get('account') != self.account:
+            return None
+        self.logger.info("Resuming after container %s",
+                         checkpoint['container'])
+        return checkpoint['container']
+
+    def _save_checkpoint(self, container):
+        if not self.checkpoint_file:
+            return
+        if container is None:
+            # Pass finished, the next one starts from the beginning
+            if os.path.exists(self.checkpoint_file):
+                os.remove(self.checkpoint_file)
+            return
+        tmp_path = self.checkpoint_file + '.tmp'
+        with open(tmp_path, 'w') as file_:
+            json.dump({'account': self.account, 'container': container},
+                      file_)
+        os.rename(tmp_path, self.checkpoint_file)
+
+    def _container_done(self, container):
+        """
+        Count one less pending operation for `container`. When the
+        container is finished, report its throughput, and save the last
+        container such that all containers before it are finished.
+        The checkpoint never goes past a container whose listing failed,
+        so the next pass processes it again.
+        """
+        progress = self.progress[container]
+        progress.pending -= 1
+        if progress.pending > 0:
+            return
+        elapsed = (time.time() - progress.start_time) or 0.000001
         self.logger.info(
-            '%(elapsed).02f '
-            '%(errors)d '
-            '%(content_rate).2f ' % {
-                'elapsed': elapsed,
-                'errors': total_errors + self.errors,
-                'content_rate': self.total_contents_processed / elapsed
-            }
-        )
+            "Container %s: %d contents processed, %d errors, %d bytes "
+            "in %.2fs (%.2f contents/s)",
+            container, progress.processed, progress.errors, progress.bytes,
+            elapsed, progress.processed / elapsed)
+        last = None
+        while self.containers and \
+                self.progress[self.containers[0]].pending <= 0:
+            done = self.containers.popleft()
+            if self.progress.pop(done).listing_failed and \
+                    self.listing_failed is None:
+                self.listing_failed = done
+            if self.listing_failed is None:
+                last = done
+        if last is not None:
+            self._save_checkpoint(last)
+
+    def _process(self, container, obj):
+        progress = self.progress[container]
+        try:
+            self.logger.info("Changing policy for content %s/%s",
+                             container, obj["name"])
+            self.transitioner.change_policy(
+                cid_from_name(self.account, container), obj["content"],
+                self.new_policy, account=self.account,
+                container_name=container,
+                metadata={'policy': obj["policy"], 'length': obj["size"]})
+            progress.bytes += int_value(obj["size"], 0)
+        except Exception:
+            self.errors += 1
+            progress.errors += 1
+            self.logger.exception("ERROR while changing policy for content "
+                                  "%s/%s", container, obj["name"])
+        self.passes += 1
+        progress.processed += 1
+        self.total_contents_processed += 1
+
+    def run_pool(self):
+        """
+        Process the contents with `concurrency` green threads, the
+        containers being listed by `listing_concurrency` green threads.
+        """
+        self.start_time = self.report_time = time.time()
+        limiter = RateLimiter(self.max_contents_per_second)
+        containers = Queue(self.listing_concurrency)
+        contents = Queue(self.queue_size)
+        listed = [False]
+        self.listing_failed = None
+
+        def _feed():
+            try:
+                for container in self._list_containers(
+                        marker=self._load_checkpoint()):
+                    self.progress[container] = ContainerProgress()
+                    self.containers.append(container)
+                    containers.put(container)
+                listed[0] = True
+            except Exception:
+                self.logger.exception("ERROR while listing containers")
+            finally:
+                for _ in range(self.listing_concurrency):
+                    containers.put(None)
+
+        def _list():
+            while True:
+                container = containers.get()
+                if container is None:
+                    break
+                container_limiter = RateLimiter(
+                    self.container_contents_per_second)
+                try:
+                    for obj in self._list_container_contents(container):
+                        container_limiter.wait()
+                        self.progress[container].pending += 1
+                        contents.put((container, obj))
+                except Exception:
+                    self.logger.exception(
+                        "ERROR while listing container %s", container)
+                    self.errors += 1
+                    self.progress[container].errors += 1
+                    self.progress[container].listing_failed = True
+                self._container_done(container)
+
+        def _work():
+            while True:
+                item = contents.get()
+                if item is None:
+                    break
+                limiter.wait()
+                self._process(*item)
+                self._container_done(item[0])
+                self._report(time.time())
+
+        with ContextPool(1 + self.listing_concurrency +
+                         self.concurrency) as pool:
+            pool.spawn(_feed)
+            listers = [pool.spawn(_list)
+                       for _ in range(self.listing_concurrency)]
+            for _ in range(self.concurrency):
+                pool.spawn(_work)
+            for lister in listers:
+                lister.wait()
+            for _ in range(self.concurrency):
+                contents.put(None)
+            pool.waitall()
+        if self.listing_failed is not None:
+            self.logger.warn("Failed to list container %s, the next pass "
+                             "will resume from it", self.listing_failed)
+        elif listed[0] and not self.containers:
+            self._save_checkpoint(None)
+        self._report_end()
 
     def safe_change_policy(self, container_id, content_id):
         try:
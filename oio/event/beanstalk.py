@@ -24,7 +24,6 @@ try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
-from io import BytesIO
 
 
 SYM_CRLF = '\r\n'
@@ -57,31 +56,61 @@ class InvalidResponse(BeanstalkError):
 
 
 class Reader(object):
+    """
+    Buffer the data received from a beanstalkd connection.
+
+    Data is received directly into a preallocated `bytearray`
+    (with `recv_into`). The unread data is moved back to the start
+    of the buffer only when there is not enough room left at its end,
+    and the buffer grows only for replies bigger than itself.
+    Lines and job bodies are copied once, from the buffer
+    to the returned string.
+    """
+
     def __init__(self, socket, socket_read_size):
         self._sock = socket
         self.socket_read_size = socket_read_size
-        self._buffer = BytesIO()
-        self.bytes_written = 0
-        self.bytes_read = 0
+        # Twice the read size: the unread data is moved only
+        # once every `socket_read_size` bytes, at most.
+        self._buffer = bytearray(2 * socket_read_size)
+        self._view = memoryview(self._buffer)
+        # Start of the unread data
+        self._start = 0
+        # End of the received data
+        self._end = 0
 
     @property
     def length(self):
-        return self.bytes_written - self.bytes_read
+        return self._end - self._start
+
+    def _make_room(self, length):
+        """Make sure `length` bytes can be received after the data."""
+        if len(self._buffer) - self._end >= length:
+            return
+        unread = self.length
+        if len(self._buffer) - unread < length:
+            # Grow the buffer (rare: the reply is bigger than the buffer)
+            buf = bytearray(max(unread + length, 2 * len(self._buffer)))
+            buf[:unread] = self._view[self._start:self._end]
+            self._buffer = buf
+            self._view = memoryview(buf)
+        elif unread:
+            self._buffer[:unread] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = unread
 
     def _read_from_socket(self, length=None):
         socket_read_size = self.socket_read_size
-        buf = self._buffer
-        buf.seek(self.bytes_written)
         marker = 0
 
         try:
             while True:
-                data = self._sock.recv(socket_read_size)
-                if isinstance(data, bytes) and len(data) == 0:
+                self._make_room(max(socket_read_size,
+                                    (length or 0) - marker))
+                data_length = self._sock.recv_into(self._view[self._end:])
+                if data_length == 0:
                     raise socket.error(SERVER_CLOSED_CONNECTION_ERROR)
-                buf.write(data)
-                data_length = len(data)
-                self.bytes_written += data_length
+                self._end += data_length
                 marker += data_length
 
                 if length is not None and length > marker:
@@ -95,49 +124,34 @@ class Reader(object):
                                   (e.args,))
 
     def read(self, length):
-        length = length + 2
-        if length > self.length:
-            self._read_from_socket(length - self.length)
-
-        self._buffer.seek(self.bytes_read)
-        data = self._buffer.read(length)
-        self.bytes_read += len(data)
-
-        if self.bytes_read == self.bytes_written:
-            self.purge()
-
-        return data[:-2]
+        if length + 2 > self._end - self._start:
+            self._read_from_socket(length + 2 - self.length)
+        start = self._start
+        self._start = start + length + 2
+        return self._view[start:start + length].tobytes()
 
     def readline(self):
-        buf = self._buffer
-        buf.seek(self.bytes_read)
-        data = buf.readline()
-        while not data.endswith(SYM_CRLF):
+        searched = self._start
+        while True:
+            end = self._buffer.find(b'\r\n', searched, self._end)
+            if end >= 0:
+                start = self._start
+                self._start = end + 2
+                return self._view[start:end].tobytes()
+            # The CRLF may be split between two reads. Receiving data
+            # may move the buffered data, remember a relative offset.
+            offset = max(0, self.length - 1)
             self._read_from_socket()
-            buf.seek(self.bytes_read)
-            data = buf.readline()
-
-        self.bytes_read += len(data)
-
-        if self.bytes_read == self.bytes_written:
-            self.purge()
-
-        return data[:-2]
+            searched = self._start + offset
 
     def purge(self):
-        self._buffer.seek(0)
-        self._buffer.truncate()
-        self.bytes_written = 0
-        self.bytes_read = 0
+        self._start = 0
+        self._end = 0
 
     def close(self):
-        try:
-            self.purge()
-            self._buffer.close()
-        except Exception:
-            pass
-
+        self.purge()
         self._buffer = None
+        self._view = None
         self._sock = None
 
 
@@ -312,10 +326,13 @@ class Connection(object):
             output.append(SYM_CRLF)
             output.append(body)
         output.append(SYM_CRLF)
-        return ''.join(output)
+        return b''.join(output)
 
     def send_command(self, command, *args, **kwargs):
         command = self.pack_command(command, kwargs.get('body'), *args)
+        self.send_packed_command(command)
+
+    def send_packed_command(self, command):
         if not self._sock:
             self.connect()
         try:
@@ -390,13 +407,16 @@ def parse_body(connection, response, **kwargs):
 class Beanstalk(object):
     RESPONSE_CALLBACKS = dict_merge(
         {'reserve': parse_body,
+         'reserve-with-timeout': parse_body,
          'stats-tube': parse_yaml}
     )
     EXPECTED_OK = dict_merge(
         {'reserve': ['RESERVED'],
+         'reserve-with-timeout': ['RESERVED'],
          'delete': ['DELETED'],
          'release': ['RELEASED'],
          'bury': ['BURIED'],
+         'touch': ['TOUCHED'],
          'put': ['INSERTED'],
          'use': ['USING'],
          'watch': ['WATCHING'],
@@ -407,9 +427,11 @@ class Beanstalk(object):
     )
     EXPECTED_ERR = dict_merge(
         {'reserve': ['DEADLINE_SOON', 'TIMED_OUT'],
+         'reserve-with-timeout': ['DEADLINE_SOON', 'TIMED_OUT'],
          'delete': ['NOT_FOUND'],
          'release': ['BURIED', 'NOT_FOUND', 'OUT_OF_MEMORY'],
          'bury': ['NOT_FOUND', 'OUT_OF_MEMORY'],
+         'touch': ['NOT_FOUND'],
          'stats-tube': ['NOT_FOUND'],
          'use': [],
          'watch': [],
@@ -465,6 +487,13 @@ class Beanstalk(object):
     def _release_connection(self, connection):
         self.conn_queue.put_nowait(connection)
 
+    def pipeline(self):
+        """
+        Get a `Pipeline`, to send several commands at once
+        on the connection of this client.
+        """
+        return Pipeline(self)
+
     def execute_command(self, *args, **kwargs):
         connection = self._get_connection()
         command_name = args[0]
@@ -509,6 +538,25 @@ class Beanstalk(object):
         else:
             return self.execute_command('reserve')
 
+    def reserve_many(self, count, timeout=None):
+        """
+        Reserve up to `count` jobs. Wait for the first one like `reserve`,
+        then take the jobs which are immediately available, with
+        pipelined 'reserve-with-timeout 0' commands.
+
+        :returns: a list of (job_id, body) tuples
+        """
+        jobs = [self.reserve(timeout=timeout)]
+        if count > 1:
+            pipeline = self.pipeline()
+            for _ in range(count - 1):
+                pipeline.reserve(timeout=0)
+            for result in pipeline.execute(raise_on_error=False):
+                # TIMED_OUT: no more ready job
+                if not isinstance(result, BeanstalkError):
+                    jobs.append(result)
+        return jobs
+
     def bury(self, job_id, priority=DEFAULT_PRIORITY):
         self.execute_command('bury', job_id, priority)
 
@@ -518,6 +566,10 @@ class Beanstalk(object):
     def delete(self, job_id):
         self.execute_command('delete', job_id)
 
+    def touch(self, job_id):
+        """Give more time (a full TTR) to process a reserved job."""
+        self.execute_command('touch', job_id)
+
     def kick_job(self, job_id):
         """
         Variant of` kick` that operates with a single job.
@@ -545,3 +597,68 @@ class Beanstalk(object):
     def close(self):
         if self._connection:
             self._connection.disconnect()
+
+
+class Pipeline(Beanstalk):
+    """
+    Queue several commands, then send them at once with `execute()`,
+    and read all their replies. Saves one round trip per command.
+    """
+
+    def __init__(self, beanstalk):
+        self.beanstalk = beanstalk
+        self.response_callbacks = beanstalk.response_callbacks
+        self.expected_ok = beanstalk.expected_ok
+        self.expected_err = beanstalk.expected_err
+        self.command_stack = list()
+
+    def __len__(self):
+        return len(self.command_stack)
+
+    def execute_command(self, *args, **kwargs):
+        self.command_stack.append((args, kwargs))
+        return self
+
+    def use(self, tube):
+        self.beanstalk.use(tube)
+
+    def watch(self, tube):
+        self.beanstalk.watch(tube)
+
+    def close(self):
+        self.command_stack = list()
+
+    def execute(self, raise_on_error=True):
+        """
+        Send all queued commands, and read their replies.
+
+        :param raise_on_error: raise the first `ResponseError` or
+            `InvalidResponse`, instead of returning it among the results
+        :returns: the list of results, in the order of the commands
+        """
+        stack, self.command_stack = self.command_stack, list()
+        if not stack:
+            return []
+        connection = self.beanstalk._get_connection()
+        try:
+            connection.send_packed_command(b''.join(
+                connection.pack_command(args[0], kwargs.get('body'),
+                                        *args[1:])
+                for args, kwargs in stack))
+            results = list()
+            for args, kwargs in stack:
+                try:
+                    results.append(
+                        self.parse_response(connection, args[0], **kwargs))
+                except (ResponseError, InvalidResponse) as err:
+                    results.append(err)
+        except (ConnectionError, TimeoutError):
+            connection.disconnect()
+            raise
+        finally:
+            self.beanstalk._release_connection(connection)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, BeanstalkError):
+                    raise result
+        return results
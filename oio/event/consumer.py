@@ -14,6 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import math
 import time
 import signal
 import os
@@ -26,9 +27,10 @@ from oio.common.exceptions import OioNetworkException, ClientException
 
 from oio.conscience.client import ConscienceClient
 from oio.rdir.client import RdirClient
-from oio.event.beanstalk import Beanstalk, ConnectionError
+from oio.event.beanstalk import Beanstalk, BeanstalkError, ConnectionError, \
+    ResponseError
 from oio.common.utils import drop_privileges
-from oio.common.easy_value import true_value, int_value
+from oio.common.easy_value import true_value, int_value, float_value
 from oio.common.json import json
 from oio.event.evob import is_success, is_error
 from oio.event.loader import loadhandlers
@@ -43,6 +45,11 @@ DEFAULT_TUBE = 'oio'
 BEANSTALK_RECONNECTION = 2.0
 # default release delay (in seconds)
 RELEASE_DELAY = 15
+# interval between two samples of the tube statistics (in seconds)
+AUTOSCALE_INTERVAL = 5.0
+# maximum time an idle consumer waits for a job, when the number of
+# consumers is adaptive (in seconds, beanstalkd only takes integers)
+RESERVE_TIMEOUT = 1
 
 
 def _eventlet_stop(client, server, beanstalk):
@@ -124,6 +131,145 @@ class EventTypes(object):
     CONTENT_DELETED = 'storage.content.deleted'
 
 
+class ConsumerGroup(object):
+    """
+    Green threads consuming the jobs of a tube, each one with its own
+    connection to the same beanstalkd service.
+
+    When `max_concurrency` is greater than `min_concurrency`, the number
+    of consumers is adaptive: the tube statistics are sampled every
+    `interval` seconds, and consumers are added or stopped according
+    to the backlog and to the time spent handling each job.
+    """
+
+    def __init__(self, worker, url, server_gt, min_concurrency,
+                 max_concurrency, interval=AUTOSCALE_INTERVAL):
+        self.worker = worker
+        self.url = url
+        self.server_gt = server_gt
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.interval = interval
+        self.consumers = set()
+        # Number of consumers asked to stop after their current job
+        self.retiring = 0
+        # Jobs handled (and time spent) since the last sample
+        self.handled = 0
+        self.busy_time = 0.0
+        # Last sample
+        self.latency = None
+        self.ready = 0
+        self.reserved = 0
+
+    @property
+    def adaptive(self):
+        return self.max_concurrency > self.min_concurrency
+
+    @property
+    def concurrency(self):
+        return len(self.consumers) - self.retiring
+
+    def spawn(self, count):
+        """Start `count` more consumers."""
+        for _ in range(count):
+            beanstalk = Beanstalk.from_url(self.url)
+            gt = eventlet.spawn(self.worker.handle, beanstalk, self)
+            gt.link(_eventlet_stop, self.server_gt, beanstalk)
+            self.consumers.add(gt)
+
+    def should_stop(self):
+        """
+        Tell the calling consumer whether it must stop,
+        because the group is shrinking.
+        """
+        if self.retiring <= 0:
+            return False
+        self.retiring -= 1
+        self.consumers.discard(greenthread.getcurrent())
+        return True
+
+    def record(self, jobs, elapsed):
+        """Record that `jobs` jobs have been handled in `elapsed` seconds."""
+        self.handled += jobs
+        self.busy_time += elapsed
+
+    def sample(self, beanstalk):
+        """Sample the tube statistics and the average job latency."""
+        try:
+            stats = beanstalk.stats_tube(self.worker.tube or 'default')
+            self.ready = int(stats.get('current-jobs-ready', 0))
+            self.reserved = int(stats.get('current-jobs-reserved', 0))
+        except ResponseError:
+            # NOT_FOUND: nobody ever used the tube
+            self.ready, self.reserved = 0, 0
+        if self.handled:
+            self.latency = self.busy_time / self.handled
+            self.handled, self.busy_time = 0, 0.0
+
+    def target_concurrency(self):
+        """
+        Estimate the number of consumers required to handle the jobs
+        of the tube within one sampling interval, given the average
+        time spent on each job. To avoid oscillations, the number of
+        consumers is at most doubled, and reduced by a quarter.
+        """
+        current = self.concurrency
+        if self.latency is None:
+            # No job handled yet
+            target = current + 1 if self.ready else self.min_concurrency
+        else:
+            backlog = self.ready + self.reserved
+            target = int(math.ceil(backlog * self.latency / self.interval))
+            target = min(target, 2 * current)
+            target = max(target, current - max(1, current // 4))
+        return min(max(target, self.min_concurrency), self.max_concurrency)
+
+    def scale(self):
+        """Add or stop consumers to reach the target concurrency."""
+        current = self.concurrency
+        target = self.target_concurrency()
+        if target == current:
+            return
+        self.worker.logger.info(
+            "Scaling consumers of %s from %d to %d "
+            "(ready=%d reserved=%d latency=%s)",
+            self.url, current, target, self.ready, self.reserved,
+            self.latency)
+        if target > current:
+            # Keep the consumers which have not stopped yet
+            kept = min(self.retiring, target - current)
+            self.retiring -= kept
+            self.spawn(target - current - kept)
+        else:
+            self.retiring += current - target
+
+    def autoscale(self):
+        """Periodically sample the tube, and scale the consumers."""
+        beanstalk = Beanstalk.from_url(self.url)
+        try:
+            while True:
+                eventlet.sleep(self.interval)
+                try:
+                    self.sample(beanstalk)
+                except ConnectionError as exc:
+                    self.worker.logger.warn(
+                        "Failed to sample tube stats from %s: %s",
+                        self.url, exc)
+                    continue
+                self.scale()
+        except StopServe:
+            pass
+        finally:
+            beanstalk.close()
+
+    def status(self):
+        return {'url': self.url,
+                'concurrency': self.concurrency,
+                'ready': self.ready,
+                'reserved': self.reserved,
+                'latency': self.latency}
+
+
 def _stop(client, server):
     try:
         client.wait()
@@ -137,6 +283,7 @@ class EventWorker(Worker):
     def __init__(self, *args, **kwargs):
         super(EventWorker, self).__init__(*args, **kwargs)
         self.app_env = dict()
+        self.groups = list()
 
     def init(self):
         eventlet.monkey_patch(os=False)
@@ -151,6 +298,13 @@ class EventWorker(Worker):
         )
         self.acct_update = true_value(self.conf.get('acct_update', True))
         self.rdir_update = true_value(self.conf.get('rdir_update', True))
+        # Number of jobs reserved at once, their deletions (or releases)
+        # are sent together when all of them have been processed.
+        self.batch_size = int_value(self.conf.get('batch_size'), 1)
+        # Delay after which the processed jobs of a batch are acknowledged,
+        # and the remaining ones touched, so that their TTR does not expire.
+        self.batch_touch_interval = float_value(
+            self.conf.get('batch_touch_interval'), 30.0)
         self.app_env['acct_addr'] = self.acct_addr
         if 'handlers_conf' not in self.conf:
             raise ValueError("'handlers_conf' path not defined in conf")
@@ -160,8 +314,15 @@ class EventWorker(Worker):
         super(EventWorker, self).init()
 
     def notify(self):
-        """TODO"""
-        pass
+        for group in self.groups:
+            self.logger.debug("Consumers status: %s", group.status())
+
+    def status(self):
+        """
+        Get the status of the consumers of each beanstalkd service:
+        current concurrency, backlog of the tube and job latency.
+        """
+        return [group.status() for group in self.groups]
 
     def safe_decode_job(self, job_id, data):
         try:
@@ -174,19 +335,28 @@ class EventWorker(Worker):
             return None
 
     def run(self):
-        coros = []
         queue_url = self.conf.get('queue_url', 'beanstalk://127.0.0.1:11300')
         concurrency = int_value(self.conf.get('concurrency'), 10)
+        if true_value(self.conf.get('autoscale', False)):
+            min_concurrency = int_value(self.conf.get('min_concurrency'), 1)
+            max_concurrency = int_value(self.conf.get('max_concurrency'),
+                                        concurrency)
+        else:
+            min_concurrency = max_concurrency = concurrency
+        interval = float_value(self.conf.get('autoscale_interval'),
+                               AUTOSCALE_INTERVAL)
 
         server_gt = greenthread.getcurrent()
 
+        scalers = []
         for url in queue_url.split(';'):
-            for i in range(concurrency):
-                beanstalk = Beanstalk.from_url(url)
-                gt = eventlet.spawn(self.handle, beanstalk)
-                gt.link(_eventlet_stop, server_gt, beanstalk)
-                coros.append(gt)
-                beanstalk, gt = None, None
+            group = ConsumerGroup(self, url, server_gt,
+                                  min_concurrency, max_concurrency,
+                                  interval=interval)
+            group.spawn(group.min_concurrency)
+            if group.adaptive:
+                scalers.append(eventlet.spawn(group.autoscale))
+            self.groups.append(group)
 
         while self.alive:
             self.notify()
@@ -197,6 +367,8 @@ class EventWorker(Worker):
                 break
 
         self.notify()
+        coros = scalers + [gt for grp in self.groups
+                           for gt in grp.consumers]
         try:
             with Timeout(self.graceful_timeout) as t:
                 [c.kill(StopServe()) for c in coros]
@@ -206,15 +378,27 @@ class EventWorker(Worker):
                 raise
             [c.kill() for c in coros]
 
-    def handle(self, beanstalk):
+    def handle(self, beanstalk, group=None):
+        """
+        Consume jobs from `beanstalk`. When `group` is adaptive,
+        stop as soon as it asks to.
+        """
         conn_error = False
+        reserve_timeout = None
+        if group is not None and group.adaptive:
+            # Do not wait forever, to notice when the group shrinks
+            reserve_timeout = RESERVE_TIMEOUT
         try:
             if self.tube:
                 beanstalk.use(self.tube)
                 beanstalk.watch(self.tube)
-            while True:
+            while group is None or not group.should_stop():
                 try:
-                    job_id, data = beanstalk.reserve()
+                    if self.batch_size > 1:
+                        jobs = beanstalk.reserve_many(self.batch_size,
+                                                      timeout=reserve_timeout)
+                    else:
+                        jobs = [beanstalk.reserve(timeout=reserve_timeout)]
                     if conn_error:
                         self.logger.warn("beanstalk reconnected")
                         conn_error = False
@@ -224,29 +408,75 @@ class EventWorker(Worker):
                         conn_error = True
                     eventlet.sleep(BEANSTALK_RECONNECTION)
                     continue
-                event = self.safe_decode_job(job_id, data)
-                if not event:
-                    self.logger.warn("Burying event %s: %s",
-                                     job_id, "malformed")
-                    beanstalk.bury(job_id)
+                except ResponseError:
+                    # TIMED_OUT: no job for now
+                    continue
+                start = time.time()
+                if len(jobs) == 1:
+                    self.handle_job(jobs[0][0], jobs[0][1], beanstalk)
                 else:
-                    try:
-                        self.process_event(job_id, event, beanstalk)
-                    except (ClientException, OioNetworkException) as exc:
-                        self.logger.warn("Burying event %s (%s): %s",
-                                         job_id, event.get('event'), exc)
-                        beanstalk.bury(job_id)
-                    except ExplicitBury:
-                        self.logger.info("Burying event %s (%s)",
-                                         job_id, event.get('event'))
-                        beanstalk.bury(job_id)
-                    except Exception:
-                        self.logger.exception("Burying event %s: %s",
-                                              job_id, event)
-                        beanstalk.bury(job_id)
+                    self.handle_batch(jobs, beanstalk)
+                if group is not None:
+                    group.record(len(jobs), time.time() - start)
         except StopServe:
             pass
 
+    def handle_batch(self, jobs, beanstalk):
+        """
+        Process several jobs, acknowledge them with a single round trip.
+        If processing takes longer than `batch_touch_interval`,
+        the processed jobs are acknowledged early and the remaining ones
+        are touched, so that they are not reserved again by another worker.
+        """
+        pipeline = beanstalk.pipeline()
+        last_flush = time.time()
+        for i, (job_id, data) in enumerate(jobs):
+            self.handle_job(job_id, data, pipeline)
+            if time.time() - last_flush >= self.batch_touch_interval:
+                for next_id, _ in jobs[i + 1:]:
+                    pipeline.touch(next_id)
+                self._flush_batch(pipeline)
+                last_flush = time.time()
+        self._flush_batch(pipeline)
+
+    def _flush_batch(self, pipeline):
+        try:
+            for result in pipeline.execute(raise_on_error=False):
+                if isinstance(result, BeanstalkError):
+                    self.logger.warn(
+                        "Failed to acknowledge event: %s", result)
+        except ConnectionError as exc:
+            # Unacknowledged jobs will be reserved again
+            # when their TTR expires.
+            self.logger.warn("beanstalk connection error: %s", exc)
+
+    def handle_job(self, job_id, data, beanstalk):
+        """
+        Decode and process a job. `beanstalk` can be a `Pipeline`,
+        in which case the job is only acknowledged when the pipeline
+        is executed.
+        """
+        event = self.safe_decode_job(job_id, data)
+        if not event:
+            self.logger.warn("Burying event %s: %s",
+                             job_id, "malformed")
+            beanstalk.bury(job_id)
+        else:
+            try:
+                self.process_event(job_id, event, beanstalk)
+            except (ClientException, OioNetworkException) as exc:
+                self.logger.warn("Burying event %s (%s): %s",
+                                 job_id, event.get('event'), exc)
+                beanstalk.bury(job_id)
+            except ExplicitBury:
+                self.logger.info("Burying event %s (%s)",
+                                 job_id, event.get('event'))
+                beanstalk.bury(job_id)
+            except Exception:
+                self.logger.exception("Burying event %s: %s",
+                                      job_id, event)
+                beanstalk.bury(job_id)
+
     def process_event(self, job_id, event, beanstalk):
         handler = self.get_handler(event)
         if not handler:
@@ -14,6 +14,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from eventlet import spawn_after
+from eventlet.event import Event as GreenEvent
+
+from oio.common.easy_value import float_value, int_value
 from oio.common.exceptions import ClientException, OioTimeout
 from oio.common.logger import get_logger
 from oio.account.client import AccountClient
@@ -29,8 +33,38 @@ CONTAINER_EVENTS = [
         EventTypes.CONTAINER_NEW,
         EventTypes.CONTAINER_DELETED]
 
+# Outcome of a container state replaced by a newer one before being sent
+SUPERSEDED = {'status': 200, 'message': 'superseded'}
+
+
+class _PendingState(object):
+    """State of a container, waiting to be sent to the account service."""
+
+    def __init__(self, body):
+        self.body = body
+        self.done = GreenEvent()
+
+
+class _AccountBatch(object):
+    """Latest states of the containers of an account, by container name."""
+
+    def __init__(self):
+        self.states = dict()
+        self.timer = None
+        self.sent = False
+
 
 class AccountUpdateFilter(Filter):
+    """
+    Forward container events to the account service.
+
+    When `batch_size` is greater than 1, the `storage.container.state`
+    events being processed concurrently are coalesced: only the latest
+    state of each container is kept, and the states of the containers
+    of an account are sent together, after at most `batch_delay`
+    seconds. Each event is processed once its state has been sent,
+    or replaced by a newer one.
+    """
 
     def __init__(self, app, conf, **kwargs):
         self.logger = get_logger(conf)
@@ -38,10 +72,95 @@ class AccountUpdateFilter(Filter):
                                                   logger=self.logger, **kwargs)
         self.account = AccountClient(conf, logger=self.logger)
 
+    def init(self):
+        self.batch_size = int_value(self.conf.get('batch_size'), 1)
+        self.batch_delay = float_value(self.conf.get('batch_delay'), 0.1)
+        # Batches being filled, by account
+        self._batches = dict()
+
+    def _flush(self, account, batch):
+        if self._batches.get(account) is batch:
+            del self._batches[account]
+        if batch.sent:
+            return
+        batch.sent = True
+        batch.timer.cancel()
+
+        states = list(batch.states.values())
+        try:
+            results = self.account.container_update_many(
+                account, [state.body for state in states],
+                read_timeout=ACCOUNT_TIMEOUT)
+        except Exception as exc:
+            results = [{'status': getattr(exc, 'http_status', 500) or 500,
+                        'message': str(exc)}] * len(states)
+        if len(results) != len(states):
+            self.logger.warn("Account service returned %d results "
+                             "for %d containers of %s",
+                             len(results), len(states), account)
+            # Do not leave the events waiting forever
+            results = list(results[:len(states)])
+            results.extend([{'status': 500, 'message': 'no result'}] *
+                           (len(states) - len(results)))
+        for state, result in zip(states, results):
+            state.done.send(result)
+
+    def _coalesce(self, account, container, body):
+        """
+        Queue the state of a container, and wait for it to be sent
+        with the states of other containers of the same account.
+
+        :returns: the outcome of the update, or `SUPERSEDED`
+        """
+        batch = self._batches.get(account)
+        if batch is None:
+            batch = _AccountBatch()
+            batch.timer = spawn_after(
+                self.batch_delay, self._flush, account, batch)
+            self._batches[account] = batch
+        previous = batch.states.get(container)
+        if previous is not None:
+            if previous.body['mtime'] >= body['mtime']:
+                # A newer state is already waiting
+                return SUPERSEDED
+            previous.done.send(SUPERSEDED)
+        body['name'] = container
+        state = _PendingState(body)
+        batch.states[container] = state
+        if len(batch.states) >= self.batch_size:
+            self._flush(account, batch)
+        return state.done.wait()
+
+    def _coalesced_update(self, event, account, container, body):
+        result = self._coalesce(account, container, body)
+        status = result['status']
+        if result is SUPERSEDED:
+            self.logger.debug("Discarding event %s (%s): superseded",
+                              event.job_id, event.event_type)
+        elif status == 409:
+            self.logger.info("Discarding event %s (%s): %s",
+                             event.job_id, event.event_type,
+                             result.get('message'))
+        elif status // 100 != 2:
+            return 'account update failure: %s' % result.get('message')
+        return None
+
     def process(self, env, cb):
         event = Event(env)
 
-        if event.event_type in CONTAINER_EVENTS:
+        if (self.batch_size > 1 and
+                event.event_type == EventTypes.CONTAINER_STATE):
+            data = event.data
+            url = event.env.get('url')
+            body = {'bytes': data.get('bytes-count', 0),
+                    'objects': data.get('object-count', 0),
+                    'mtime': event.when / 1000000.0}  # convert to seconds
+            msg = self._coalesced_update(
+                event, url.get('account'), url.get('user'), body)
+            if msg:
+                resp = EventError(event=Event(env), body=msg)
+                return resp(env, cb)
+        elif event.event_type in CONTAINER_EVENTS:
             mtime = event.when / 1000000.0  # convert to seconds
             data = event.data
             url = event.env.get('url')
@@ -14,20 +14,87 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from eventlet import spawn_after
+from eventlet.event import Event as GreenEvent
+
 from oio.event.evob import Event, EventError
 from oio.event.consumer import EventTypes
 from oio.event.filters.base import Filter
+from oio.common.easy_value import float_value, int_value
 from oio.common.exceptions import OioException
 
 
 CHUNK_EVENTS = [EventTypes.CHUNK_DELETED, EventTypes.CHUNK_NEW]
 
 
+class _ChunkBatch(object):
+    """Chunk records waiting to be sent to rdir in one request."""
+
+    def __init__(self):
+        self.records = list()
+        self.done = GreenEvent()
+        self.timer = None
+        self.sent = False
+
+
 class VolumeIndexFilter(Filter):
+    """
+    Reference new chunks in (or unreference deleted chunks from)
+    the reverse directory of their volume.
+
+    When `batch_size` is greater than 1, the records of the events
+    being processed concurrently are sent together, after at most
+    `batch_delay` seconds. Each event is processed once its batch
+    has been sent.
+    """
 
     _attempts_push = 3
     _attempts_delete = 3
 
+    def init(self):
+        self.batch_size = int_value(self.conf.get('batch_size'), 1)
+        self.batch_delay = float_value(self.conf.get('batch_delay'), 0.01)
+        # Batches being filled, by volume and event type
+        self._batches = dict()
+
+    def _flush(self, key, batch):
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        if batch.sent:
+            return
+        batch.sent = True
+        batch.timer.cancel()
+
+        volume_id, event_type = key
+        try:
+            if event_type == EventTypes.CHUNK_DELETED:
+                errors = self.app.rdir.chunk_delete_many(
+                    volume_id, batch.records)
+            else:
+                errors = self.app.rdir.chunk_push_many(
+                    volume_id, batch.records)
+        except Exception as ex:
+            errors = [(record, str(ex)) for record in batch.records]
+        action = ('delete' if event_type == EventTypes.CHUNK_DELETED
+                  else 'push')
+        for record, err in errors:
+            self.logger.warn("chunk %s failed (volume %s, chunk %s): %s",
+                             action, volume_id, record.get('chunk_id'), err)
+        batch.done.send(errors)
+
+    def _chunk_batch(self, event_type, volume_id, record):
+        key = (volume_id, event_type)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _ChunkBatch()
+            batch.timer = spawn_after(
+                self.batch_delay, self._flush, key, batch)
+            self._batches[key] = batch
+        batch.records.append(record)
+        if len(batch.records) >= self.batch_size:
+            self._flush(key, batch)
+        return batch.done.wait()
+
     def _chunk_delete(self,
                       volume_id, container_id, content_id, chunk_id):
         try:
@@ -54,7 +121,14 @@ class VolumeIndexFilter(Filter):
             content_id = data.get('content_id')
             chunk_id = data.get('chunk_id')
             try:
-                if event.event_type == EventTypes.CHUNK_DELETED:
+                if self.batch_size > 1:
+                    record = {'container_id': container_id,
+                              'content_id': content_id,
+                              'chunk_id': chunk_id}
+                    if event.event_type == EventTypes.CHUNK_NEW:
+                        record['mtime'] = event.when / 1000000  # seconds
+                    self._chunk_batch(event.event_type, volume_id, record)
+                elif event.event_type == EventTypes.CHUNK_DELETED:
                     self._chunk_delete(
                         volume_id, container_id, content_id, chunk_id)
                 else:
@@ -284,6 +284,41 @@ class RdirClient(HttpApi):
 
         self._rdir_request(volume_id, 'DELETE', 'delete', json=body)
 
+    def _chunk_batch(self, volume_id, method, action, chunks, **kwargs):
+        chunks = list(chunks)
+        if not chunks:
+            return []
+        _resp, body = self._rdir_request(volume_id, method, action,
+                                         json=chunks, **kwargs)
+        return [(chunks[error['index']], error.get('message'))
+                for error in body or ()]
+
+    def chunk_push_many(self, volume_id, chunks, **kwargs):
+        """
+        Reference several chunks in the reverse directory,
+        with only one request.
+
+        :param chunks: records to push, as dictionaries with at least
+            'container_id', 'content_id' and 'chunk_id' keys
+        :returns: a list of tuples with the record that could not be
+            pushed and the error message
+        """
+        return self._chunk_batch(volume_id, 'POST', 'push', chunks,
+                                 create=True, **kwargs)
+
+    def chunk_delete_many(self, volume_id, chunks, **kwargs):
+        """
+        Unreference several chunks from the reverse directory,
+        with only one request.
+
+        :param chunks: records to delete, as dictionaries with
+            'container_id', 'content_id' and 'chunk_id' keys
+        :returns: a list of tuples with the record that could not be
+            deleted and the error message
+        """
+        return self._chunk_batch(volume_id, 'DELETE', 'delete', chunks,
+                                 **kwargs)
+
     def chunk_fetch(self, volume, limit=100, rebuild=False,
                     container_id=None, max_attempts=3):
         """
@@ -19,8 +19,13 @@ import time
 from datetime import datetime
 from socket import gethostname
 
+from eventlet.queue import Empty
+
+from oio.common.cache import LruCache
 from oio.common.easy_value import int_value, true_value
 from oio.common.exceptions import ContentNotFound, NotFound, OrphanChunk
+from oio.common.green import ContextPool, RateLimiter, eventlet
+from oio.content.content import safe_update_spare_chunks
 from oio.content.factory import ContentFactory
 from oio.event.beanstalk import Beanstalk, ConnectionError
 from oio.rdir.client import RdirClient
@@ -29,6 +34,10 @@ from oio.rebuilder.rebuilder import Rebuilder, RebuilderWorker
 
 DEFAULT_REBUILDER_TUBE = 'oio-rebuild'
 
+# Default number of green threads of each stage of the pipeline
+DEFAULT_STAGE_WORKERS = (('locate', 4), ('spare', 4), ('transfer', 8),
+                         ('update', 2))
+
 
 class BlobRebuilder(Rebuilder):
 
@@ -43,6 +52,9 @@ class BlobRebuilder(Rebuilder):
                                         DEFAULT_REBUILDER_TUBE)
         self.beanstalk = None
         self.rdir_fetch_limit = int_value(conf.get('rdir_fetch_limit'), 100)
+        # Nothing to overlap in dry run mode
+        self.pipeline = (true_value(conf.get('pipeline')) and
+                         not true_value(conf.get('dry_run')))
 
     def _fetch_chunks_from_event(self, job_id, data):
         env = json.loads(data)
@@ -116,6 +128,13 @@ class BlobRebuilder(Rebuilder):
         finally:
             self.rdir_client.admin_unlock(self.volume)
 
+    def rebuilder_pass(self, **kwargs):
+        if not self.pipeline:
+            return super(BlobRebuilder, self).rebuilder_pass(**kwargs)
+        pipeline = BlobRebuilderPipeline(
+            self.conf, self.logger, self.volume, self.try_chunk_delete)
+        pipeline.run(self._fetch_chunks())
+
     def _create_worker(self, **kwargs):
         return BlobRebuilderWorker(
             self.conf, self.logger, self.volume, self.try_chunk_delete)
@@ -281,3 +300,350 @@ class BlobRebuilderWorker(RebuilderWorker):
 
         self.bytes_processed += chunk_size
         self.total_bytes_processed += chunk_size
+
+
+class ChunkRebuildTask(object):
+    """A chunk going through the stages of a `BlobRebuilderPipeline`."""
+
+    def __init__(self, container_id, content_id, chunk_id_or_pos):
+        self.container_id = container_id
+        self.content_id = content_id
+        self.chunk_id_or_pos = chunk_id_or_pos
+        self.content = None
+        self.chunk_id = None
+        self.current_chunk = None
+        self.sources = None
+        self.broken = None
+        self.spare_url = None
+
+    def __str__(self):
+        return '%s|%s|%s' % (self.container_id, self.content_id,
+                             self.chunk_id_or_pos)
+
+
+class StageStats(object):
+    """Where the green threads of a pipeline stage spend their time."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        # Time spent processing items, waiting for items to process,
+        # and waiting for room in the queue of the next stage
+        self.busy_time = 0.0
+        self.idle_time = 0.0
+        self.blocked_time = 0.0
+
+
+class BlobRebuilderPipeline(object):
+    """
+    Rebuild chunks in several stages, each one with its own green threads,
+    connected by bounded queues:
+    - locate: load the description of the content (meta2),
+    - spare: select services to host the new chunks (meta2),
+      with one request per metachunk,
+    - transfer: copy or reconstruct the data of the chunk (rawx),
+    - update: reference the new chunks (meta2) and unreference
+      the old ones (rdir), by batches, with one request per container
+      and one per volume.
+    The round trips of a chunk overlap with the ones of the others,
+    and the report tells which stage is the bottleneck.
+    """
+
+    def __init__(self, conf, logger, volume, try_chunk_delete=False,
+                 **kwargs):
+        self.conf = conf
+        self.logger = logger
+        self.volume = volume
+        self.try_chunk_delete = try_chunk_delete
+        self.allow_same_rawx = true_value(conf.get('allow_same_rawx'))
+        self.workers = [(stage, max(1, int_value(
+                            conf.get('%s_workers' % stage), default)))
+                        for stage, default in DEFAULT_STAGE_WORKERS]
+        self.spare_batch_size = int_value(conf.get('spare_batch_size'), 16)
+        self.update_batch_size = int_value(conf.get('update_batch_size'),
+                                           100)
+        self.queue_size = int_value(conf.get('queue_size'), 100)
+        self.report_interval = int_value(conf.get('report_interval'), 3600)
+        # Same total rate as the default mode, where each of the
+        # `workers` processes is limited to items_per_second
+        self.limiter = RateLimiter(
+            int_value(conf.get('items_per_second'), 30) *
+            int_value(conf.get('workers'), 1))
+        self.rdir_client = RdirClient(conf, logger=self.logger)
+        self.content_factory = ContentFactory(conf, logger=self.logger)
+        # Account and name of containers, to locate contents
+        # with only one request
+        self.container_names = LruCache(
+            int_value(conf.get('container_cache_size'), 1000))
+
+        self.stats = dict((stage, StageStats(workers))
+                          for stage, workers in self.workers)
+        self.start_time = self.last_report = time.time()
+        self.chunks_processed = 0
+        self.bytes_processed = 0
+        self.errors = 0
+
+    def run(self, chunks):
+        """
+        Rebuild chunks.
+
+        :param chunks: an iterable of chunk descriptions, like the ones
+            yielded by `BlobRebuilder._fetch_chunks()`
+        """
+        funcs = {'locate': (self._locate, 1),
+                 'spare': (self._select_spare, self.spare_batch_size),
+                 'transfer': (self._transfer, 1),
+                 'update': (self._update, self.update_batch_size)}
+        queues = [eventlet.Queue(self.queue_size) for _ in self.workers]
+        with ContextPool(sum(w for _, w in self.workers)) as pool:
+            for i, (stage, workers) in enumerate(self.workers):
+                func, batch_size = funcs[stage]
+                out_queue = queues[i + 1] if i + 1 < len(queues) else None
+                for _ in range(workers):
+                    pool.spawn(self._stage_worker, stage, func, batch_size,
+                               queues[i], out_queue)
+
+            for chunk in chunks:
+                queues[0].put(ChunkRebuildTask(*chunk[:3]))
+
+            # Each stage feeds the next one before acknowledging its items
+            for queue in queues:
+                queue.join()
+
+        self.logger.info(self._get_report('DONE', time.time()))
+
+    def _stage_worker(self, stage, func, batch_size, in_queue, out_queue):
+        stats = self.stats[stage]
+        while True:
+            begin = time.time()
+            batch = [in_queue.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(in_queue.get_nowait())
+                except Empty:
+                    break
+            start = time.time()
+            stats.idle_time += start - begin
+            done = list()
+            try:
+                processed = list()
+                try:
+                    for task in func(batch):
+                        processed.append(task[0])
+                        if isinstance(task[1], Exception):
+                            self._failed(stage, *task)
+                        else:
+                            done.append(task[0])
+                except Exception as exc:
+                    # Do not lose the tasks the batch did not report
+                    for task in batch:
+                        if task not in processed:
+                            self._failed(stage, task, exc)
+                end = time.time()
+                stats.busy_time += end - start
+                stats.items += len(batch)
+
+                if out_queue is not None:
+                    for task in done:
+                        out_queue.put(task)
+                    stats.blocked_time += time.time() - end
+            finally:
+                for _ in batch:
+                    in_queue.task_done()
+
+            if end - self.last_report >= self.report_interval:
+                self.logger.info(self._get_report('RUN ', end))
+                self.last_report = end
+
+    def _failed(self, stage, task, err):
+        self.stats[stage].errors += 1
+        self.errors += 1
+        self.logger.error('ERROR while rebuilding chunk %s (%s): %s',
+                          task, stage, err)
+
+    def _get_content(self, container_id, content_id):
+        names = self.container_names.get(container_id)
+        if names is None:
+            content = self.content_factory.get(container_id, content_id)
+            self.container_names.put(
+                container_id, (content.account, content.container_name))
+            return content
+        return self.content_factory.get(container_id, content_id,
+                                        account=names[0],
+                                        container_name=names[1])
+
+    def _locate(self, batch):
+        for task in batch:
+            try:
+                try:
+                    task.content = self._get_content(task.container_id,
+                                                     task.content_id)
+                except ContentNotFound:
+                    raise OrphanChunk(
+                        'Content not found: possible orphan chunk')
+                chunk_id = chunk_pos = None
+                if len(task.chunk_id_or_pos) < 32:
+                    chunk_pos = task.chunk_id_or_pos
+                else:
+                    chunk_id = task.chunk_id_or_pos.rsplit('/', 1)[-1]
+                task.current_chunk, task.chunk_id, task.sources, \
+                    task.broken = task.content._prepare_rebuild(
+                        chunk_id, allow_same_rawx=self.allow_same_rawx,
+                        chunk_pos=chunk_pos)
+                if (chunk_id is not None and self.volume and
+                        task.current_chunk.host != self.volume):
+                    raise ValueError("Chunk does not belong to this volume")
+                yield task, None
+            except Exception as err:
+                yield task, err
+
+    def _select_spare(self, batch):
+        by_content = dict()
+        for task in batch:
+            by_content.setdefault((task.container_id, task.content_id),
+                                  list()).append(task)
+        for tasks in by_content.values():
+            # One request per metachunk, whatever the number of its
+            # chunks being rebuilt
+            unique = list()
+            for task in tasks:
+                if task.current_chunk.url and any(
+                        task.current_chunk.url == other.current_chunk.url
+                        for other in unique):
+                    yield task, ValueError('Chunk already being rebuilt')
+                else:
+                    unique.append(task)
+            try:
+                spare_urls = unique[0].content._get_spare_chunks(
+                    [task.current_chunk for task in unique],
+                    [chunk for task in unique for chunk in task.broken])
+            except Exception as err:
+                for task in unique:
+                    yield task, err
+                continue
+            for task, spare_url in zip(unique, spare_urls):
+                task.spare_url = spare_url
+                yield task, None
+
+    def _transfer(self, batch):
+        for task in batch:
+            self.limiter.wait()
+            try:
+                task.content._rebuild_data(task.current_chunk, task.sources,
+                                           task.spare_url)
+                yield task, None
+            except Exception as err:
+                yield task, err
+
+    def _update(self, batch):
+        by_container = dict()
+        for task in batch:
+            by_container.setdefault(task.container_id, list()).append(task)
+        for container_id, tasks in by_container.items():
+            substitutions = list()
+            for task in tasks:
+                if task.chunk_id is None:
+                    try:
+                        task.content._add_raw_chunk(task.current_chunk,
+                                                    task.spare_url)
+                    except Exception as err:
+                        yield task, err
+                        continue
+                    self._rebuilt(task)
+                    yield task, None
+                else:
+                    substitutions.append(
+                        (task.content, task.current_chunk, task.spare_url))
+            if not substitutions:
+                continue
+
+            # All the chunks of the container in one meta2 transaction
+            failed = safe_update_spare_chunks(
+                tasks[0].content.container_client, container_id,
+                substitutions)
+            errors = dict((id(sub[1]), err) for sub, err in failed)
+            registered = list()
+            for task in tasks:
+                if task.chunk_id is None:
+                    continue
+                err = errors.get(id(task.current_chunk))
+                if err is not None:
+                    yield task, err
+                    continue
+                self._rebuilt(task)
+                self._delete_faulty_chunk(task)
+                registered.append(task)
+                yield task, None
+            self._flush_rdir(registered)
+
+    def _rebuilt(self, task):
+        self.logger.info('Chunk %s repaired in %s', task, task.spare_url)
+        self.chunks_processed += 1
+        self.bytes_processed += task.current_chunk.size or 0
+
+    def _delete_faulty_chunk(self, task):
+        if not self.try_chunk_delete:
+            return
+        try:
+            task.content.blob_client.chunk_delete(task.current_chunk.url)
+            self.logger.info("Chunk %s deleted", task.current_chunk.url)
+        except NotFound as exc:
+            self.logger.debug("Chunk %s: %s", task.current_chunk.url, exc)
+        except Exception as exc:
+            self.logger.warn("Failed to delete chunk %s: %s",
+                             task.current_chunk.url, exc)
+
+    def _flush_rdir(self, tasks):
+        """Unreference the rebuilt chunks, with one request per volume."""
+        by_volume = dict()
+        for task in tasks:
+            by_volume.setdefault(task.current_chunk.host, list()).append(
+                {'container_id': task.container_id,
+                 'content_id': task.content_id,
+                 'chunk_id': task.chunk_id})
+        for volume, records in by_volume.items():
+            try:
+                failed = self.rdir_client.chunk_delete_many(volume, records)
+            except Exception as exc:
+                failed = [(record, str(exc)) for record in records]
+            for record, message in failed:
+                self.logger.warn(
+                    'Failed to unreference chunk %s from %s: %s',
+                    record['chunk_id'], volume, message)
+
+    def _get_report(self, status, now):
+        elapsed = (now - self.start_time) or 0.000001
+        report = ('%(status)s %(volume)s '
+                  'started=%(start_time)s '
+                  'elapsed=%(elapsed).2f '
+                  'errors=%(errors)d '
+                  'chunks=%(nb_chunks)d %(c_rate).2f/s '
+                  'bytes=%(nb_bytes)d %(b_rate).2fB/s' % {
+                      'status': status,
+                      'volume': self.volume,
+                      'start_time': datetime.fromtimestamp(
+                          int(self.start_time)).isoformat(),
+                      'elapsed': elapsed,
+                      'errors': self.errors,
+                      'nb_chunks': self.chunks_processed,
+                      'nb_bytes': self.bytes_processed,
+                      'c_rate': self.chunks_processed / elapsed,
+                      'b_rate': self.bytes_processed / elapsed,
+                  })
+        for stage, _ in self.workers:
+            stats = self.stats[stage]
+            report += (' %(stage)s_chunks=%(items)d '
+                       '%(stage)s_errors=%(errors)d '
+                       '%(stage)s_time=%(busy).2f '
+                       '%(stage)s_usage=%(usage).2f%% '
+                       '%(stage)s_blocked=%(blocked).2f' % {
+                           'stage': stage,
+                           'items': stats.items,
+                           'errors': stats.errors,
+                           'busy': stats.busy_time,
+                           'usage': 100 * stats.busy_time /
+                           (elapsed * stats.workers),
+                           'blocked': stats.blocked_time,
+                       })
+        return report
@@ -2099,6 +2099,11 @@ _m2_content_delete_many (struct req_args_s *args, struct json_object * jbody) {
 		if (!json_object_object_get_ex(jcontent, "name", &jname)
 				|| !json_object_is_type(jname, json_type_string))
 			return _reply_format_error(args, BADREQ("Invalid content name"));
+		struct json_object * jversion = NULL;
+		if (json_object_object_get_ex(jcontent, "version", &jversion)
+				&& !json_object_is_type(jversion, json_type_string)
+				&& !json_object_is_type(jversion, json_type_int))
+			return _reply_format_error(args, BADREQ("Invalid content version"));
 	}
 
 	GString *gresponse = g_string_sized_new(2048);
@@ -2110,7 +2115,13 @@ _m2_content_delete_many (struct req_args_s *args, struct json_object * jbody) {
 		json_object_object_get_ex(jcontent, "name", &jname);
 		const gchar *name = json_object_get_string(jname);
 
+		/* Without a version, the latest version is deleted */
+		struct json_object * jversion = NULL;
+		json_object_object_get_ex(jcontent, "version", &jversion);
+		const gchar *version = jversion ? json_object_get_string(jversion) : "";
+
 		oio_url_set(args->url, OIOURL_PATH, name);
+		oio_url_set(args->url, OIOURL_VERSION, version);
 		GError *err = _resolve_meta2 (args, _prefer_master(), _pack, NULL);
 		_bulk_item_result(gresponse, i, name, err, HTTP_CODE_NO_CONTENT);
 		if (err) g_clear_error(&err);
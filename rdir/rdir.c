@@ -619,6 +619,27 @@ _db_vol_delete(const char *volid, GString *key)
 	return _map_errno_to_gerror(errno, errmsg);
 }
 
+static GError *
+_db_vol_write(const char *volid, gboolean autocreate,
+		leveldb_writebatch_t *batch)
+{
+	struct rdir_base_s *base = NULL;
+	GError *err = _db_get(volid, autocreate, &base);
+	if (err)
+		return err;
+
+	char *errmsg = NULL;
+
+	leveldb_writeoptions_t *options = leveldb_writeoptions_create();
+	leveldb_writeoptions_set_sync(options, 0);
+	leveldb_write(base->base, options, batch, &errmsg);
+	leveldb_writeoptions_destroy(options);
+
+	if (!errmsg)
+		return NULL;
+	return _map_errno_to_gerror(errno, errmsg);
+}
+
 static void
 _dump_vol_status(GString *value, GTree *tree_containers, GTree *tree_rebuilt)
 {
@@ -958,6 +979,71 @@ _request_to_key(struct json_object *jbody, GString **pkey)
 	return NULL;
 }
 
+/* Extract the records of a batch request, and put (or delete) them
+ * in a leveldb batch. Malformed records are skipped, and described
+ * in the returned array (with their index in the request). */
+static GString *
+_request_to_batch(struct json_object *jbody, gboolean push,
+		leveldb_writebatch_t *batch)
+{
+	GString *errors = g_string_sized_new(64);
+	g_string_append_c(errors, '[');
+
+	const int count = json_object_array_length(jbody);
+	for (int i = 0; i < count; i++) {
+		struct json_object *jrecord = json_object_array_get_idx(jbody, i);
+		struct rdir_record_s rec = {0};
+		GError *err = NULL;
+
+		if (!jrecord || !json_object_is_type(jrecord, json_type_object))
+			err = BADREQ("record is not an object");
+		else
+			err = _record_extract(&rec, jrecord);
+		if (err) {
+			if (errors->len > 1)
+				g_string_append_c(errors, ',');
+			g_string_append_c(errors, '{');
+			oio_str_gstring_append_json_pair_int(errors, "index", i);
+			g_string_append_c(errors, ',');
+			_append_status(errors, err->code, err->message);
+			g_string_append_c(errors, '}');
+			g_error_free(err);
+			continue;
+		}
+
+		GString *key = _record_to_key(&rec);
+		if (push) {
+			GString *value = g_string_sized_new(1024);
+			_record_encode(&rec, value);
+			leveldb_writebatch_put(batch,
+					key->str, key->len, value->str, value->len);
+			g_string_free(value, TRUE);
+		} else {
+			leveldb_writebatch_delete(batch, key->str, key->len);
+		}
+		g_string_free(key, TRUE);
+	}
+
+	g_string_append_c(errors, ']');
+	return errors;
+}
+
+static enum http_rc_e
+_route_vol_batch(struct req_args_s *args, struct json_object *jbody,
+		const char *volid, gboolean push, gboolean autocreate)
+{
+	leveldb_writebatch_t *batch = leveldb_writebatch_create();
+	GString *errors = _request_to_batch(jbody, push, batch);
+	GError *err = _db_vol_write(volid, autocreate, batch);
+	leveldb_writebatch_destroy(batch);
+
+	if (err) {
+		g_string_free(errors, TRUE);
+		return _reply_common_error(args->rp, err);
+	}
+	return _reply_ok(args->rp, errors);
+}
+
 static enum http_rc_e
 _route_vol_delete(struct req_args_s *args, struct json_object *jbody,
 		const char *volid)
@@ -966,6 +1052,10 @@ _route_vol_delete(struct req_args_s *args, struct json_object *jbody,
 	if (!volid)
 		return _reply_format_error(args->rp, BADREQ("no volume id"));
 
+	/* several records at once */
+	if (jbody && json_object_is_type(jbody, json_type_array))
+		return _route_vol_batch(args, jbody, volid, FALSE, FALSE);
+
 	/* extraction of the parameters */
 	GError *err = NULL;
 	GString *key = NULL;
@@ -985,13 +1075,17 @@ static enum http_rc_e
 _route_vol_push(struct req_args_s *args, struct json_object *jbody,
 		const char *volid, const char *str_autocreate)
 {
-	if (!jbody || !json_object_is_type(jbody, json_type_object))
-		return _reply_format_error(args->rp, BADREQ("null body"));
 	if (!volid)
 		return _reply_format_error(args->rp, BADREQ("no volume id"));
 
 	gboolean autocreate = oio_str_parse_bool(str_autocreate, FALSE);
 
+	/* several records at once */
+	if (jbody && json_object_is_type(jbody, json_type_array))
+		return _route_vol_batch(args, jbody, volid, TRUE, autocreate);
+	if (!jbody || !json_object_is_type(jbody, json_type_object))
+		return _reply_format_error(args->rp, BADREQ("null body"));
+
 	/* extract all the record's fields */
 	GError *err = NULL;
 	struct rdir_record_s rec = {0};
@@ -496,6 +496,100 @@ class TestAccountBackend(BaseTestCase):
         self.assertEqual(self.conn.hget(account_key, 'objects'),
                          str(total_objects))
 
+    def test_refresh_account_by_slices(self):
+        backend = AccountBackend({'refresh_batch_size': 3}, self.conn)
+        accounts = [random_str(16) for _ in range(2)]
+        total = 0
+        for account_id in accounts:
+            backend.create_account(account_id)
+            for i in range(10):
+                backend.update_container(account_id, "container%d" % i,
+                                         Timestamp(time()).normal, 0, i, i)
+                total += i
+            self.conn.hmset('account:%s' % account_id,
+                            {'bytes': 1, 'objects': 2})
+
+        backend.refresh_account(accounts[0])
+        info = backend.info_account(accounts[0])
+        self.assertEqual(total / 2, info['bytes'])
+        self.assertEqual(total / 2, info['objects'])
+
+        self.assertEqual(2, backend.refresh_all_accounts(
+            containers_per_second=100))
+        info = backend.info_account(accounts[1])
+        self.assertEqual(total / 2, info['bytes'])
+        self.assertEqual(total / 2, info['objects'])
+
+        backend.flush_account(accounts[1])
+        info = backend.info_account(accounts[1])
+        self.assertEqual(0, info['bytes'])
+        self.assertEqual(0, info['containers'])
+        self.assertFalse(self.conn.keys('container:%s:*' % accounts[1]))
+
+    def test_update_containers(self):
+        backend = AccountBackend({}, self.conn)
+        account_id = 'test'
+        self.assertEqual(backend.create_account(account_id), account_id)
+        mtime = Timestamp(time()).normal
+        backend.update_container(account_id, 'old', mtime, 0, 1, 1)
+
+        results = backend.update_containers(account_id, [
+            {'name': 'c1', 'mtime': mtime, 'objects': 2, 'bytes': 20},
+            {'name': 'c2', 'mtime': mtime, 'objects': 3, 'bytes': 30},
+            # Same event
+            {'name': 'old', 'mtime': mtime, 'objects': 4, 'bytes': 40},
+            {'name': 'c3', 'mtime': 'not a timestamp'},
+            {'mtime': mtime}])
+        self.assertEqual([('c1', 200), ('c2', 200), ('old', 409),
+                          ('c3', 400), (None, 400)],
+                         [(r['name'], r['status']) for r in results])
+
+        res = self.conn.zrangebylex('containers:%s' % account_id, '-', '+')
+        self.assertEqual(['c1', 'c2', 'old'], res)
+        info = backend.info_account(account_id)
+        self.assertEqual(6, info['objects'])
+        self.assertEqual(51, info['bytes'])
+
+        results = backend.update_containers(
+            'unknown', [{'name': 'c1', 'mtime': mtime}],
+            autocreate_account=False)
+        self.assertEqual(404, results[0]['status'])
+
+    def test_update_containers_same_as_update_container(self):
+        backend = AccountBackend({}, self.conn)
+        accounts = ('single', 'batch')
+        for account_id in accounts:
+            backend.create_account(account_id)
+        now = time()
+        events = list()
+        for _ in range(100):
+            mtime = Timestamp(now + random.randrange(20)).normal
+            dtime = 0
+            if random.random() < 0.2:
+                dtime, mtime = mtime, 0
+            events.append({'name': 'c%d' % random.randrange(5),
+                           'mtime': mtime, 'dtime': dtime,
+                           'objects': random.randrange(10),
+                           'bytes': random.randrange(100)})
+
+        single = list()
+        for event in events:
+            try:
+                backend.update_container(
+                    accounts[0], event['name'], event['mtime'],
+                    event['dtime'], event['objects'], event['bytes'])
+                single.append(200)
+            except Exception as exc:
+                single.append(exc.code)
+        batch = backend.update_containers(accounts[1], events)
+        self.assertEqual(single, [r['status'] for r in batch])
+
+        info = [backend.info_account(account_id) for account_id in accounts]
+        for key in ('containers', 'objects', 'bytes'):
+            self.assertEqual(info[0][key], info[1][key])
+        self.assertEqual(
+            *[backend.list_containers(account_id) for account_id in accounts])
+
     def test_update_container_wrong_timestamp_format(self):
         backend = AccountBackend({}, self.conn)
         account_id = 'test'
@@ -268,6 +268,38 @@ class TestRdirServer(RdirTestCase):
             self.assertListEqual(self.json_loads(resp.data), [])
             rec[k] = save
 
+    def test_push_delete_many(self):
+        records = [self._record() for _ in range(3)]
+        bad_record = self._record()
+        bad_record.pop('chunk_id')
+
+        resp = self._post(
+                "/v1/rdir/push", params={'vol': self.vol, 'create': True},
+                data=json.dumps(records[:1] + [bad_record] + records[1:]))
+        self.assertEqual(resp.status, 200)
+        errors = self.json_loads(resp.data)
+        self.assertEqual(1, len(errors))
+        self.assertEqual(1, errors[0]['index'])
+        self.assertEqual(400, errors[0]['status'])
+
+        resp = self._post("/v1/rdir/fetch", params={'vol': self.vol})
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(
+            sorted(_key(rec) for rec in records),
+            [key for key, _ in self.json_loads(resp.data)])
+
+        resp = self._delete(
+                "/v1/rdir/delete", params={'vol': self.vol},
+                data=json.dumps(records[:2]))
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(self.json_loads(resp.data), [])
+
+        resp = self._post("/v1/rdir/fetch", params={'vol': self.vol})
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(
+            [_key(records[2])],
+            [key for key, _ in self.json_loads(resp.data)])
+
     def test_lock_unlock(self):
         who = random_str(64)
 
@@ -38,7 +38,7 @@ def set_http_requests(cb):
         def __len__(self):
             return len(self.records)
 
-        def __call__(self, host, method, path, headers):
+        def __call__(self, host, method, path, headers, **_kwargs):
             req = {'host': host,
                    'method': method,
                    'path': path,
@@ -119,7 +119,8 @@ def fake_http_connect(*status_iter, **kwargs):
 
         def send(self, data):
             if self.cb_body:
-                self.cb_body(self.conn_id, data)
+                # Like a socket, copy the data before it is sent
+                self.cb_body(self.conn_id, memoryview(data).tobytes())
 
         def close(self):
             self.closed = True
@@ -0,0 +1,144 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import random
+import unittest
+
+from oio.account.backend import AccountBackend
+
+
+class FakeRedis(object):
+    """Sorted sets (lexical ranges only) and hashes, without Redis."""
+
+    def __init__(self):
+        self.zsets = dict()
+        self.hashes = dict()
+        self.round_trips = 0
+
+    def register_script(self, script):
+        return lambda keys=None, args=None, client=None: None
+
+    @staticmethod
+    def _in_range(value, min_, max_):
+        if min_ != '-':
+            if min_[0] == '[' and value < min_[1:]:
+                return False
+            if min_[0] == '(' and value <= min_[1:]:
+                return False
+        if max_ != '+':
+            if max_[0] == '[' and value > max_[1:]:
+                return False
+            if max_[0] == '(' and value >= max_[1:]:
+                return False
+        return True
+
+    def zrangebylex(self, name, min_, max_, start, num):
+        self.round_trips += 1
+        values = [v for v in sorted(self.zsets.get(name, ()))
+                  if self._in_range(v, min_, max_)]
+        return [v.encode('utf8') for v in values[start:start + num]]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = list()
+
+    def hmget(self, name, *fields):
+        self.commands.append((name, fields))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [[self.redis.hashes.get(name, {}).get(f) for f in fields]
+                for name, fields in self.commands]
+
+
+def reference_listing(names, limit, marker, end_marker, prefix, delimiter):
+    prefix = prefix or ''
+    results = list()
+    last_dir = None
+    for name in sorted(names):
+        if (marker and name <= marker) or \
+                (end_marker and name >= end_marker) or \
+                not name.startswith(prefix):
+            continue
+        end = name.find(delimiter, len(prefix))
+        if end > 0:
+            dir_name = name[:end + 1]
+            if dir_name == last_dir:
+                continue
+            last_dir = dir_name
+            if dir_name == marker:
+                continue
+            results.append([dir_name, 0, 0, 1, 0])
+        else:
+            results.append([name, 0, 0, 0, 0])
+        if len(results) >= limit:
+            break
+    return results
+
+
+class TestAccountBackendListing(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+
+    def test_delimiter(self):
+        backend = AccountBackend({}, self.redis)
+        rand = random.Random(42)
+        for _ in range(300):
+            names = set(''.join(rand.choice('ab/') for _ in
+                                range(rand.randint(1, 5)))
+                        for _ in range(rand.randint(0, 40)))
+            self.redis.zsets['containers:acct'] = names
+            kwargs = {'limit': rand.randint(1, 6),
+                      'marker': rand.choice(['', 'a', 'a/', 'ab/a', 'b']),
+                      'end_marker': rand.choice(['', 'b/', 'bb']),
+                      'prefix': rand.choice(['', 'a', 'a/', 'b']),
+                      'delimiter': '/'}
+            self.assertEqual(reference_listing(names, **kwargs),
+                             backend._raw_listing('acct', **kwargs),
+                             kwargs)
+
+    def test_skip_scan(self):
+        backend = AccountBackend({}, self.redis)
+        self.redis.zsets['containers:acct'] = set(
+            ['%s/%d' % (d, i) for d in 'abcdefgh' for i in range(3)])
+        listing = backend._raw_listing('acct', 10, None, None, '/', None)
+        self.assertEqual(['a/', 'b/', 'c/', 'd/', 'e/', 'f/', 'g/', 'h/'],
+                         [entry[0] for entry in listing])
+        # Several prefixes are found in each page of 10 containers,
+        # instead of one request per prefix
+        self.assertEqual(3, self.redis.round_trips)
+
+    def test_cache(self):
+        backend = AccountBackend({'listing_cache_ttl': 60}, self.redis)
+        self.redis.zsets['containers:acct'] = set(['a', 'b'])
+        self.redis.hashes['container:acct:a'] = {'objects': '3'}
+        listing = backend.list_containers('acct')
+        self.assertEqual([['a', 3, 0, 0, 0.0], ['b', 0, 0, 0, 0.0]], listing)
+        round_trips = self.redis.round_trips
+
+        self.redis.zsets['containers:acct'].add('c')
+        self.assertEqual(listing, backend.list_containers('acct'))
+        self.assertEqual(round_trips, self.redis.round_trips)
+        # Another page
+        self.assertEqual(3, len(backend.list_containers('acct', limit=3)))
+
+        backend.update_container('acct', 'c', 1.0, None, 0, 0)
+        self.assertEqual(3, len(backend.list_containers('acct')))
@@ -0,0 +1,267 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from mock import MagicMock as Mock
+
+from oio.account.backend import AccountBackend
+from oio.account.sharding import HashRing, move_account, \
+    rebalance_accounts
+
+
+class FakeShard(object):
+    """
+    The global hash of accounts, and other keys as opaque values,
+    without Redis.
+    """
+
+    def __init__(self, accounts=()):
+        self.accounts = list(accounts)
+        self.keys = dict()
+        self.expired = list()
+
+    def hkeys(self, name):
+        return list(self.accounts)
+
+    def hlen(self, name):
+        return len(self.accounts)
+
+    def hexists(self, name, key):
+        return key in self.accounts
+
+    def hset(self, name, key, value):
+        if key not in self.accounts:
+            self.accounts.append(key)
+
+    def hdel(self, name, key):
+        self.accounts.remove(key)
+
+    def zrangebylex(self, name, min_, max_, start, num):
+        values = sorted(v for v in self.keys.get(name, ())
+                        if min_ == '-' or v > min_[1:])
+        return [v.encode('utf8') for v in values[start:start + num]]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+    def expire(self, key, ttl):
+        self.expired.append((key, ttl))
+
+    def pipeline(self, transaction=True):
+        return FakeShardPipeline(self)
+
+
+class FakeShardPipeline(object):
+    def __init__(self, shard):
+        self.shard = shard
+        self.results = list()
+
+    def pttl(self, key):
+        self.results.append(-1)
+
+    def dump(self, key):
+        self.results.append(self.shard.keys.get(key))
+
+    def restore(self, key, ttl, value, replace=False):
+        self.shard.keys[key] = value
+        self.results.append(True)
+
+    def execute(self):
+        return self.results
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_spread(self):
+        ring = HashRing(['a:1', 'b:2', 'c:3'])
+        counts = dict()
+        for i in range(3000):
+            node = ring.get_node('account-%d' % i)
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(['a:1', 'b:2', 'c:3'], sorted(counts))
+        for count in counts.values():
+            self.assertGreater(count, 700)
+
+    def test_add_node(self):
+        keys = ['account-%d' % i for i in range(1000)]
+        ring = HashRing(['a:1', 'b:2'])
+        before = dict((key, ring.get_node(key)) for key in keys)
+        ring = HashRing(['a:1', 'b:2', 'c:3'])
+        for key in keys:
+            node = ring.get_node(key)
+            # Keys only move to the new node
+            self.assertIn(node, (before[key], 'c:3'))
+
+    def test_no_node(self):
+        self.assertRaises(ValueError, HashRing, [])
+
+
+class TestShardedAccountBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = AccountBackend(
+            {'redis_shards': '10.0.0.1:6379, 10.0.0.2:6379'})
+
+    def _set_shards(self, **accounts):
+        for addr, shard in self.backend.shards.items():
+            shard._conn = FakeShard(accounts.get(addr[:8], ()))
+
+    def test_load_shards(self):
+        self.assertEqual(['10.0.0.1:6379', '10.0.0.2:6379'],
+                         sorted(self.backend.shards))
+        shard = self.backend.shards['10.0.0.2:6379']
+        self.assertEqual('10.0.0.2', shard.conf['redis_host'])
+        self.assertEqual('6379', shard.conf['redis_port'])
+        self.assertIs(self.backend.redis_latencies, shard.redis_latencies)
+
+    def test_conn_for(self):
+        self._set_shards()
+        for i in range(20):
+            account_id = 'account-%d' % i
+            addr = self.backend.ring.get_node(account_id)
+            self.assertIs(self.backend.shards[addr].conn,
+                          self.backend._conn_for(account_id))
+
+    def test_no_account_id(self):
+        self._set_shards()
+        for account_id in (None, ''):
+            self.assertIsNone(self.backend.create_account(account_id))
+            self.assertIsNone(self.backend.delete_account(account_id))
+            self.assertIsNone(self.backend.info_account(account_id))
+            self.assertIsNone(self.backend.get_account_metadata(account_id))
+            self.assertIsNone(
+                self.backend.update_account_metadata(account_id, {}))
+
+    def test_list_account(self):
+        self._set_shards(**{'10.0.0.1': ['b', 'c'], '10.0.0.2': ['a', 'c']})
+        self.assertEqual(['a', 'b', 'c'], self.backend.list_account())
+        # Accounts being moved are only counted once
+        self.assertEqual(3, self.backend.status()['account_count'])
+
+    def test_rebalance_dry_run(self):
+        accounts = ['account-%d' % i for i in range(20)]
+        self._set_shards(**{'10.0.0.1': accounts})
+        moves = rebalance_accounts(self.backend, dry_run=True)
+        expected = [(account_id, '10.0.0.1:6379', '10.0.0.2:6379')
+                    for account_id in accounts
+                    if self.backend.ring.get_node(account_id) ==
+                    '10.0.0.2:6379']
+        self.assertTrue(expected)
+        self.assertEqual(expected, moves)
+
+    def test_move_account(self):
+        self.backend.refresh_batch_size = 2
+        self.backend.acquire_lock_with_timeout = Mock(return_value='lock')
+        self.backend.release_lock = Mock()
+        src = FakeShard(['acct', 'other'])
+        dst = FakeShard()
+        names = ['c%d' % i for i in range(5)]
+        src.keys['containers:acct'] = set(names)
+        src.keys['account:acct'] = {'id': 'acct'}
+        src.keys['container:other:c0'] = {}
+        for name in names:
+            src.keys['container:acct:%s' % name] = {'name': name}
+
+        move_account(self.backend, 'acct', src, dst, lock_timeout=30)
+        self.assertEqual(['acct'], dst.accounts)
+        self.assertEqual(['other'], src.accounts)
+        self.assertEqual(['container:other:c0'], list(src.keys))
+        self.assertEqual(
+            sorted(['containers:acct', 'account:acct'] +
+                   ['container:acct:%s' % name for name in names]),
+            sorted(dst.keys))
+        # Both shards are locked, the locks are extended after each slice
+        self.assertEqual(
+            [src, dst],
+            [call[1]['conn'] for call in
+             self.backend.acquire_lock_with_timeout.call_args_list])
+        self.assertEqual(2, self.backend.release_lock.call_count)
+        self.assertEqual([('lock:account:acct', 30)] * 3, src.expired)
+        self.assertEqual(src.expired, dst.expired)
+
+    def test_move_account_exists(self):
+        self.backend.acquire_lock_with_timeout = Mock(return_value='lock')
+        src = FakeShard(['acct'])
+        src.keys['account:acct'] = {'id': 'acct'}
+        dst = FakeShard(['acct'])
+        dst.keys['account:acct'] = {'id': 'acct', 'objects': 1}
+        self.assertRaises(Exception, move_account,
+                          self.backend, 'acct', src, dst)
+        self.assertEqual({'id': 'acct', 'objects': 1},
+                         dst.keys['account:acct'])
+        self.assertFalse(self.backend.acquire_lock_with_timeout.called)
+
+    def test_move_account_locked(self):
+        self.backend.acquire_lock_with_timeout = Mock(
+            side_effect=['lock', False])
+        self.backend.release_lock = Mock()
+        src = FakeShard(['acct'])
+        dst = FakeShard()
+        self.assertRaises(Exception, move_account,
+                          self.backend, 'acct', src, dst)
+        self.assertEqual(['acct'], src.accounts)
+        # The lock taken on the source is released
+        self.assertEqual(1, self.backend.release_lock.call_count)
+        self.assertIs(src, self.backend.release_lock.call_args[1]['conn'])
+
+
+class TestShardMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = AccountBackend(
+            {'redis_shards': '10.0.0.1:6379, 10.0.0.2:6379',
+             'redis_previous_shards': '10.0.0.1:6379, 10.0.0.3:6379'})
+        self.conns = dict()
+        for shards in (self.backend.shards, self.backend.old_shards):
+            for addr, shard in shards.items():
+                shard._conn = self.conns[addr] = FakeShard()
+
+    def _account(self, previous, current):
+        for i in range(1000):
+            account_id = 'account-%d' % i
+            if (self.backend.previous_ring.get_node(account_id) ==
+                    previous and
+                    self.backend.ring.get_node(account_id) == current):
+                return account_id
+
+    def test_load_shards(self):
+        self.assertEqual(['10.0.0.3:6379'], list(self.backend.old_shards))
+        self.assertEqual(3, len(self.backend._all_conns()))
+
+    def test_conn_for(self):
+        for previous, current in (('10.0.0.1:6379', '10.0.0.2:6379'),
+                                  ('10.0.0.3:6379', '10.0.0.1:6379'),
+                                  ('10.0.0.1:6379', '10.0.0.1:6379')):
+            account_id = self._account(previous, current)
+            # Served by the previous shard until moved
+            self.assertIs(self.conns[previous],
+                          self.backend._conn_for(account_id))
+            self.conns[current].hset('accounts:', account_id, 1)
+            self.assertIs(self.conns[current],
+                          self.backend._conn_for(account_id))
+
+    def test_list_account(self):
+        self.conns['10.0.0.3:6379'].accounts.append('old')
+        self.conns['10.0.0.2:6379'].accounts.append('new')
+        self.assertEqual(['new', 'old'], self.backend.list_account())
+
+    def test_rebalance(self):
+        account_id = self._account('10.0.0.3:6379', '10.0.0.1:6379')
+        self.conns['10.0.0.3:6379'].accounts.append(account_id)
+        moves = rebalance_accounts(self.backend, dry_run=True)
+        self.assertEqual([(account_id, '10.0.0.3:6379', '10.0.0.1:6379')],
+                         moves)
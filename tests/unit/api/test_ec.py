@@ -13,6 +13,10 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library.
 
+import os
+import subprocess
+import sys
+import threading
 import unittest
 import random
 from io import BytesIO
@@ -20,10 +24,12 @@ from collections import defaultdict
 import hashlib
 from copy import deepcopy
 from eventlet import Timeout
-from mock import patch
+from mock import patch, MagicMock as Mock
 from oio.common.storage_method import STORAGE_METHODS
 from oio.api.ec import EcMetachunkWriter, ECChunkDownloadHandler, \
-    ECRebuildHandler
+    ECRebuildHandler, ECSegmentEncoder, ec_encode, load_ec_executor, \
+    ECInlineExecutor, ECThreadExecutor, ECProcessExecutor, \
+    set_ec_thread_workers
 from oio.common import exceptions as exc, green
 from oio.common.constants import CHUNK_HEADERS
 from tests.unit.api import empty_stream, decode_chunked_body, \
@@ -295,6 +301,40 @@ class TestEC(unittest.TestCase):
         self.assertEqual(
             test_data_checksum, self.checksum(final_data).hexdigest())
 
+    def _legacy_encode(self, test_data, nb):
+        ec_stream = ec_encode(self.storage_method, nb)
+        ec_stream.send(None)
+        columns = [b''] * nb
+        for i in range(0, len(test_data), 65536):
+            fragments = ec_stream.send(test_data[i:i + 65536])
+            if fragments:
+                columns = [c + f for c, f in zip(columns, fragments)]
+        fragments = ec_stream.send(b'')
+        return [c + f for c, f in zip(columns, fragments)]
+
+    def test_segment_encoder(self):
+        segment_size = self.storage_method.ec_segment_size
+        nb = self.storage_method.ec_nb_data + self.storage_method.ec_nb_parity
+        for test_data in (b'', b'1234', (b'1234' * segment_size)[:-10],
+                          b'5678' * segment_size):
+            expected = self._legacy_encode(test_data, nb)
+            encoder = ECSegmentEncoder(self.storage_method, nb,
+                                       batch_segments=3)
+            columns = [b''] * nb
+            for i in range(0, len(test_data), 65536):
+                for batch in encoder.feed(test_data[i:i + 65536]):
+                    for j, (frame, fragments) in enumerate(batch):
+                        frame = frame.tobytes()
+                        self.assertTrue(frame.startswith(
+                            b'%x\r\n' % len(fragments)))
+                        self.assertTrue(frame.endswith(b'\r\n'))
+                        columns[j] += fragments.tobytes()
+            batch, last = encoder.flush()
+            for j, (_, fragments) in enumerate(batch or []):
+                columns[j] += fragments.tobytes()
+            columns = [c + f for c, f in zip(columns, last)]
+            self.assertEqual(expected, columns)
+
     def _test_write_checksum_algo(self, expected_checksum, **kwargs):
         global_checksum = self.checksum()
         source = empty_stream()
@@ -859,3 +899,137 @@ class TestEC(unittest.TestCase):
             # TODO use specialized exception
             self.assertRaises(exc.OioException, handler.rebuild)
             self.assertEqual(len(conn_record), nb - 1)
+
+
+class FakeECDriver(object):
+    """EC driver usable from worker processes."""
+
+    def encode(self, segment):
+        return [segment[:2], segment[2:]]
+
+    def decode(self, fragments):
+        return b''.join(fragments)
+
+    def reconstruct(self, fragments, missing):
+        # Tell which process did the work
+        return [str(os.getpid()).encode('ascii')]
+
+
+# Uses the process executor after monkey patching, in a new interpreter
+MONKEY_PATCHED_SCRIPT = """
+import eventlet
+eventlet.monkey_patch()
+from mock import MagicMock as Mock, patch
+from oio.api.ec import ECProcessExecutor
+from tests.unit.api.test_ec import FakeECDriver
+
+storage_method = Mock(ec_type='fake', ec_nb_data=2, ec_nb_parity=1)
+executor = ECProcessExecutor(workers=2)
+with patch('oio.api.ec._load_ec_driver', return_value=FakeECDriver()):
+    pool = eventlet.GreenPool(4)
+    results = pool.imap(
+        lambda segment: executor.encode_segments(storage_method, [segment]),
+        [b'abcd', b'efgh', b'ijkl', b'mnop'])
+    print(sorted(frag for res in results for frag in res[0]))
+executor.close()
+"""
+
+
+class TestECExecutor(unittest.TestCase):
+    def setUp(self):
+        self.storage_method = Mock(ec_executor=None, ec_type='fake',
+                                   ec_nb_data=2, ec_nb_parity=1)
+        self.storage_method.driver.encode.side_effect = \
+            lambda segment: [segment[:2], segment[2:]]
+        self.storage_method.driver.decode.side_effect = \
+            lambda fragments: b''.join(fragments)
+
+    def test_load_ec_executor(self):
+        executor = load_ec_executor(self.storage_method)
+        self.assertIsInstance(executor, ECInlineExecutor)
+
+        executor = load_ec_executor(self.storage_method, ec_executor='thread')
+        self.assertIsInstance(executor, ECThreadExecutor)
+        self.assertIs(executor, load_ec_executor(self.storage_method,
+                                                 ec_executor='thread'))
+        self.assertIs(executor, load_ec_executor(self.storage_method,
+                                                 ec_executor=executor))
+
+        self.storage_method.ec_executor = 'thread'
+        executor = load_ec_executor(self.storage_method)
+        self.assertIsInstance(executor, ECThreadExecutor)
+        executor = load_ec_executor(self.storage_method,
+                                    ec_executor='inline')
+        self.assertIsInstance(executor, ECInlineExecutor)
+
+        executor = load_ec_executor(self.storage_method,
+                                    ec_executor='process')
+        self.assertIsInstance(executor, ECProcessExecutor)
+        self.assertIs(executor, load_ec_executor(self.storage_method,
+                                                 ec_executor='process'))
+
+        self.assertRaises(ValueError, load_ec_executor, self.storage_method,
+                          ec_executor='gpu')
+
+    def _test_executor(self, executor):
+        self.assertEqual(
+            [[b'ab', b'cd'], [b'ef', b'gh']],
+            executor.encode_segments(self.storage_method,
+                                     [b'abcd', b'efgh']))
+        self.assertEqual(
+            b'abcd', executor.decode(self.storage_method, [b'ab', b'cd']))
+
+    def test_inline_executor(self):
+        self._test_executor(ECInlineExecutor())
+
+    def test_thread_executor(self):
+        self._test_executor(ECThreadExecutor())
+
+    def _process_executor(self, **kwargs):
+        executor = ECProcessExecutor(**kwargs)
+        self.addCleanup(executor.close)
+        # Patched before the workers are forked
+        patcher = patch('oio.api.ec._load_ec_driver',
+                        return_value=FakeECDriver())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return executor
+
+    def test_process_executor(self):
+        executor = self._process_executor(workers=2)
+        self._test_executor(executor)
+        pid = executor.reconstruct(self.storage_method, [b'ab'], [1])[0]
+        self.assertNotEqual(str(os.getpid()), pid.decode('ascii'))
+
+    def test_process_executor_buffer_full(self):
+        # The segments and fragments are pickled,
+        # but the decoded segment goes through the buffer
+        executor = self._process_executor(workers=1, buffer_size=4)
+        self._test_executor(executor)
+
+    def test_process_executor_monkey_patched(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)))))
+        proc = subprocess.Popen([sys.executable, '-c', MONKEY_PATCHED_SCRIPT],
+                                cwd=root, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        # Kill the interpreter if the pool hangs
+        timer = threading.Timer(30, proc.kill)
+        timer.start()
+        try:
+            out, err = proc.communicate()
+        finally:
+            timer.cancel()
+        self.assertEqual(0, proc.returncode, err)
+        self.assertEqual(
+            str(sorted([b'ab', b'cd', b'ef', b'gh', b'ij', b'kl',
+                        b'mn', b'op'])),
+            out.decode('ascii').strip())
+
+    def test_set_ec_thread_workers(self):
+        with patch('oio.api.ec.tpool') as tpool:
+            set_ec_thread_workers(4)
+            # A running pool is stopped, to restart with the new size
+            self.assertEqual(['killall', 'set_num_threads'],
+                             [call[0] for call in tpool.method_calls])
+            tpool.set_num_threads.assert_called_once_with(4)
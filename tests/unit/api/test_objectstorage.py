@@ -14,7 +14,7 @@
 # License along with this library.
 
 import json
-from mock import MagicMock as Mock
+from mock import MagicMock as Mock, patch
 import random
 import unittest
 from os.path import basename
@@ -391,6 +391,23 @@ class ObjectStorageTest(unittest.TestCase):
         self.api.container._direct_request.assert_called_once_with(
             'POST', uri, params=params, headers=self.headers)
 
+    def test_object_list_iter(self):
+        pages = [
+            {'objects': [{'name': 'a'}, {'name': 'b'}], 'truncated': True,
+             'next_marker': 'b'},
+            {'objects': [{'name': 'c'}], 'truncated': False},
+        ]
+        self.api.object_list = Mock(side_effect=pages)
+        names = [obj['name'] for obj in self.api.object_list_iter(
+            self.account, self.container, page_size=2, versions=True)]
+        self.assertEqual(['a', 'b', 'c'], names)
+        self.api.object_list.assert_any_call(
+            account=self.account, container=self.container, limit=2,
+            versions=True)
+        self.api.object_list.assert_called_with(
+            account=self.account, container=self.container, limit=2,
+            versions=True, marker='b')
+
     def test_sort_chunks(self):
         raw_chunks = [
             chunk("AAAA", "0"), chunk("BBBB", "0"),
@@ -428,3 +445,82 @@ class ObjectStorageTest(unittest.TestCase):
         self.assertRaises(
             exceptions.Conflict, self.api.container_refresh, self.account,
             self.container)
+
+
+class ObjectLocateCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeStorageApi("NS", endpoint="http://1.2.3.4:8000",
+                                  locate_cache_size=10)
+        self.account = "test"
+        self.container = "fake"
+        self.meta = {'chunk_method': 'plain/nb_copy=1', 'length': '32',
+                     'properties': {'a': 'b'}}
+        self.chunks = [chunk("AAAA", "0")]
+        self.api.container.content_locate = Mock(
+            return_value=(self.meta, self.chunks))
+
+    def test_disabled_by_default(self):
+        api = FakeStorageApi("NS", endpoint="http://1.2.3.4:8000")
+        api.container.content_locate = Mock(
+            return_value=(self.meta, self.chunks))
+        api.object_locate(self.account, self.container, 'obj')
+        api.object_locate(self.account, self.container, 'obj')
+        self.assertEqual(2, api.container.content_locate.call_count)
+
+    def test_locate_hit(self):
+        perfdata = dict()
+        for _ in range(3):
+            meta, chunks = self.api.object_locate(
+                self.account, self.container, 'obj', perfdata=perfdata)
+            self.assertEqual({'a': 'b'}, meta['properties'])
+            self.assertNotIn('offset', chunks[0])
+            # The caller must not alter the cached description
+            meta['properties']['c'] = 'd'
+            chunks[0]['offset'] = 0
+        self.assertEqual(1, self.api.container.content_locate.call_count)
+        self.assertEqual(2, perfdata['locate_cache_hits'])
+        self.assertEqual(1, perfdata['locate_cache_misses'])
+
+    def test_locate_versions(self):
+        self.api.object_locate(self.account, self.container, 'obj')
+        self.api.object_locate(self.account, self.container, 'obj',
+                               version=12)
+        self.api.object_locate(self.account, self.container, 'obj',
+                               version='12')
+        self.assertEqual(2, self.api.container.content_locate.call_count)
+
+    def test_locate_not_found(self):
+        self.api.container.content_locate = Mock(
+            side_effect=exceptions.NotFound("No object"))
+        for _ in range(2):
+            self.assertRaises(
+                exceptions.NoSuchObject, self.api.object_locate,
+                self.account, self.container, 'obj')
+        self.assertEqual(1, self.api.container.content_locate.call_count)
+
+    def test_locate_without_properties_not_cached(self):
+        self.api.object_locate(self.account, self.container, 'obj',
+                               properties=False)
+        self.api.object_locate(self.account, self.container, 'obj')
+        self.assertEqual(2, self.api.container.content_locate.call_count)
+
+    def test_invalidate_on_delete(self):
+        self.api.container._direct_request = Mock(
+            return_value=(FakeApiResponse(), None))
+        self.api.object_locate(self.account, self.container, 'obj')
+        self.api.object_delete(self.account, self.container, 'obj')
+        self.api.object_locate(self.account, self.container, 'obj')
+        self.assertEqual(2, self.api.container.content_locate.call_count)
+
+    def test_fetch_retry_on_read_error(self):
+        def _failing_stream():
+            raise exceptions.UnrecoverableContent("chunk moved")
+            yield  # pylint: disable=unreachable
+
+        self.api.object_locate(self.account, self.container, 'obj')
+        with patch('oio.api.object_storage.fetch_stream',
+                   side_effect=[_failing_stream(), iter([b'data'])]):
+            _meta, stream = self.api.object_fetch(
+                self.account, self.container, 'obj')
+            self.assertEqual(b'data', b''.join(stream))
+        self.assertEqual(2, self.api.container.content_locate.call_count)
@@ -15,14 +15,17 @@
 
 import unittest
 from collections import defaultdict
-from io import BytesIO
+from io import BytesIO, RawIOBase
 import hashlib
-from eventlet import Timeout
+from eventlet import Timeout, sleep
 from mock import patch
 
 from oio.common import exceptions as exc
 from oio.common import green
-from oio.api.replication import ReplicatedMetachunkWriter
+from oio.common.http import ranges_from_http_header
+from oio.common.storage_functions import fetch_stream
+from oio.api.replication import ReplicatedMetachunkWriter, \
+    read_chunked_frame
 from oio.common.storage_method import STORAGE_METHODS
 from tests.unit.api import CHUNK_SIZE, EMPTY_MD5, EMPTY_SHA256, \
     empty_stream, decode_chunked_body, FakeResponse
@@ -132,7 +135,10 @@ class TestReplication(unittest.TestCase):
         size = CHUNK_SIZE
         meta_chunk = self.meta_chunk()
         resps = [201] * (len(meta_chunk) - 1)
-        resps.append(Timeout(1.0))
+        timeout = Timeout(1.0)
+        # Only raised by the fake connection: do not let it expire
+        timeout.cancel()
+        resps.append(timeout)
         with set_http_connect(*resps):
             handler = ReplicatedMetachunkWriter(
                 self.sysmeta, meta_chunk, checksum, self.storage_method)
@@ -193,7 +199,9 @@ class TestReplication(unittest.TestCase):
     def test_write_timeout_source(self):
         class TestReader(object):
             def read(self, size):
-                raise Timeout(1.0)
+                timeout = Timeout(1.0)
+                timeout.cancel()
+                raise timeout
 
         checksum = self.checksum()
         source = TestReader()
@@ -520,3 +528,202 @@ class TestReplication(unittest.TestCase):
 
         # TODO test log output
         # TODO verify ranges
+
+    def _metachunks_for_fetch(self, sizes):
+        chunks = dict()
+        for pos, size in enumerate(sizes):
+            chunks[pos] = [
+                {'url': 'http://127.0.0.1:700%d/%d-%d' % (i, pos, i),
+                 'pos': str(pos), 'size': size}
+                for i in range(3)]
+        return chunks
+
+    def _fetch_response(self, data_by_pos):
+        def get_response(req):
+            pos = int(req['path'].lstrip('/').split('-')[0])
+            data = data_by_pos[pos]
+            start, end = ranges_from_http_header(req['headers']['Range'])[0]
+            part_data = data[start:end + 1]
+            return FakeResponse(206, part_data, {
+                'Content-Length': str(len(part_data)),
+                'Content-Type': 'text/plain',
+                'Content-Range': 'bytes %s-%s/%s' % (start, end, len(data))})
+        return get_response
+
+    def test_fetch_stream_prefetch(self):
+        data_by_pos = [b'0' * 100000, b'1' * 100000, b'2' * 12]
+        chunks = self._metachunks_for_fetch(
+            [len(x) for x in data_by_pos])
+
+        with set_http_requests(self._fetch_response(data_by_pos)) \
+                as conn_record:
+            data = b''.join(fetch_stream(
+                chunks, None, self.storage_method, prefetch_metachunks=2,
+                prefetch_buffer_size=1))
+
+        self.assertEqual(b''.join(data_by_pos), data)
+        self.assertEqual(len(conn_record), 3)
+
+    def test_fetch_stream_prefetch_range(self):
+        data_by_pos = [b'0' * 100, b'1' * 100, b'2' * 100]
+        chunks = self._metachunks_for_fetch(
+            [len(x) for x in data_by_pos])
+
+        with set_http_requests(self._fetch_response(data_by_pos)) \
+                as conn_record:
+            data = b''.join(fetch_stream(
+                chunks, [(90, 209)], self.storage_method,
+                prefetch_metachunks=1))
+
+        self.assertEqual(b''.join(data_by_pos)[90:210], data)
+        self.assertEqual(len(conn_record), 3)
+        # Each reader must work on its own copy of the headers
+        self.assertEqual(['bytes=90-99', 'bytes=0-99', 'bytes=0-9'],
+                         [conn.req['headers']['Range']
+                          for conn in conn_record.records])
+
+    def test_fetch_stream_prefetch_error(self):
+        data_by_pos = [b'0' * 100, b'1' * 100]
+        chunks = self._metachunks_for_fetch(
+            [len(x) for x in data_by_pos])
+        get_data = self._fetch_response(data_by_pos)
+
+        def get_response(req):
+            if req['path'].startswith('/1-'):
+                return FakeResponse(404)
+            return get_data(req)
+
+        with set_http_requests(get_response):
+            stream = fetch_stream(chunks, None, self.storage_method,
+                                  prefetch_metachunks=1)
+            self.assertEqual(data_by_pos[0], next(stream))
+            self.assertRaises(exc.UnrecoverableContent, next, stream)
+
+    def test_fetch_stream_prefetch_early_close(self):
+        data_by_pos = [b'0' * 100, b'1' * 100, b'2' * 100]
+        chunks = self._metachunks_for_fetch(
+            [len(x) for x in data_by_pos])
+
+        with set_http_requests(self._fetch_response(data_by_pos)) \
+                as conn_record:
+            stream = fetch_stream(chunks, None, self.storage_method,
+                                  prefetch_metachunks=1)
+            self.assertEqual(data_by_pos[0], next(stream))
+            stream.close()
+            sleep(0)
+
+        # The last metachunk must not have been requested
+        self.assertEqual(len(conn_record), 2)
+
+    def test_read_hedged(self):
+        test_data = (b'1234' * 1024)[:-10]
+        meta_chunk = self.meta_chunk()
+
+        def get_response(req):
+            if req['host'].endswith(':7000'):
+                sleep(0.5)
+            return FakeResponse(200, test_data)
+
+        perfdata = dict()
+        with set_http_requests(get_response) as conn_record:
+            reader = io.ChunkReader(iter(meta_chunk), None, {},
+                                    hedge_delay=0.01, perfdata=perfdata)
+            data = b''.join(d for part in reader.get_iter()
+                            for d in part['iter'])
+
+        self.assertEqual(test_data, data)
+        self.assertEqual(len(conn_record), 2)
+        self.assertEqual(1, perfdata['hedged_reads'])
+        self.assertEqual(1, perfdata['hedged_reads_won'])
+
+    def test_read_hedged_fast_source(self):
+        test_data = (b'1234' * 1024)[:-10]
+        meta_chunk = self.meta_chunk()
+
+        def get_response(req):
+            return FakeResponse(200, test_data)
+
+        perfdata = dict()
+        with set_http_requests(get_response) as conn_record:
+            reader = io.ChunkReader(iter(meta_chunk), None, {},
+                                    hedge_delay=0.5, perfdata=perfdata)
+            data = b''.join(d for part in reader.get_iter()
+                            for d in part['iter'])
+
+        self.assertEqual(test_data, data)
+        self.assertEqual(len(conn_record), 1)
+        self.assertNotIn('hedged_reads', perfdata)
+
+    def test_read_hedged_error(self):
+        test_data = (b'1234' * 1024)[:-10]
+        meta_chunk = self.meta_chunk()
+        responses = [
+            FakeResponse(500),
+            FakeResponse(200, test_data),
+        ]
+
+        def get_response(req):
+            return responses.pop(0) if responses else FakeResponse(404)
+
+        perfdata = dict()
+        with set_http_requests(get_response) as conn_record:
+            reader = io.ChunkReader(iter(meta_chunk), None, {},
+                                    hedge_delay=0.5, perfdata=perfdata)
+            data = b''.join(d for part in reader.get_iter()
+                            for d in part['iter'])
+
+        # An error is not a reason to hedge, just try the next chunk
+        self.assertEqual(test_data, data)
+        self.assertEqual(len(conn_record), 2)
+        self.assertNotIn('hedged_reads', perfdata)
+
+    def test_hedge_delay_percentile(self):
+        chunk = self.meta_chunk()[0]
+        reader = io.ChunkReader(iter([]), None, {},
+                                hedge_delay=1.0, hedge_percentile=90)
+        with patch('oio.api.io._RAWX_TTFB', new=dict()):
+            # Not enough samples
+            self.assertEqual(1.0, reader._hedge_delay_for(chunk))
+            for i in range(io.TTFB_MIN_SAMPLES * 2):
+                io._record_ttfb('127.0.0.1:7000', i / 100.0)
+            self.assertAlmostEqual(0.28, reader._hedge_delay_for(chunk))
+
+    def test_read_chunked_frame(self):
+        source = BytesIO(b'a' * 20)
+        frame, data = read_chunked_frame(source, 16)
+        self.assertEqual(b'10\r\n' + b'a' * 16 + b'\r\n', frame.tobytes())
+        self.assertEqual(b'a' * 16, data.tobytes())
+        frame, data = read_chunked_frame(source, 16)
+        self.assertEqual(b'4\r\naaaa\r\n', frame.tobytes())
+        self.assertEqual(b'aaaa', data.tobytes())
+        frame, data = read_chunked_frame(source, 16)
+        self.assertEqual(0, len(data))
+
+    def test_read_chunked_frame_no_readinto(self):
+        class ReadOnly(object):
+            def __init__(self, data):
+                self.data = data
+
+            def read(self, size):
+                res, self.data = self.data[:size], self.data[size:]
+                return res
+
+        frame, data = read_chunked_frame(ReadOnly(b'abc'), 256)
+        self.assertEqual(b'3\r\nabc\r\n', frame.tobytes())
+        self.assertEqual(b'abc', data.tobytes())
+
+    def test_read_chunked_frame_readinto_not_implemented(self):
+        class RawReadOnly(RawIOBase):
+            def __init__(self, data):
+                self.data = data
+
+            def readinto(self, b):
+                raise NotImplementedError()
+
+            def read(self, size=-1):
+                res, self.data = self.data[:size], self.data[size:]
+                return res
+
+        frame, data = read_chunked_frame(RawReadOnly(b'abc'), 256)
+        self.assertEqual(b'3\r\nabc\r\n', frame.tobytes())
+        self.assertEqual(b'abc', data.tobytes())
@@ -0,0 +1,82 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from mock import MagicMock as Mock, patch
+
+from oio.blob.indexer import BlobIndexer
+
+
+class TestBlobIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = ['/vol/%s/%s' % (str(i) * 3, str(i) * 64)
+                      for i in range(5)]
+        # Not a chunk, ignored
+        self.paths.append('/vol/AAA/AAA.pending')
+        self.index_client = Mock()
+
+    def _run(self, **conf):
+        conf.update({'volume': '/vol', 'namespace': 'NS',
+                     'batch_delay': 3600})
+        with patch('oio.blob.indexer.check_volume',
+                   return_value=('NS', 'vol1')), \
+                patch('oio.blob.indexer.RdirClient',
+                      return_value=self.index_client):
+            indexer = BlobIndexer(conf)
+        indexer.logger = Mock()
+        indexer.chunk_record = Mock(side_effect=lambda path: {
+            'container_id': 'CID', 'content_id': 'OBJID',
+            'chunk_id': path.rsplit('/', 1)[-1], 'mtime': 1})
+
+        def _walk(index):
+            for path in self.paths:
+                index(path)
+
+        with patch('oio.blob.indexer.VolumeWalker') as walker_cls:
+            walker_cls.from_conf.return_value.run = Mock(side_effect=_walk)
+            indexer.index_pass()
+        return indexer
+
+    def test_index_pass_batch(self):
+        failed_id = '3' * 64
+
+        def _push_many(volume_id, records):
+            return [(record, 'boom') for record in records
+                    if record['chunk_id'] == failed_id]
+
+        push_many = self.index_client.chunk_push_many
+        push_many.side_effect = _push_many
+        indexer = self._run(batch_size=2)
+        # Two full batches, the last incomplete one is sent at the end
+        self.assertEqual([2, 2, 1],
+                         [len(call[0][1])
+                          for call in push_many.call_args_list])
+        self.assertEqual(4, indexer.successes)
+        self.assertEqual(1, indexer.errors)
+        self.assertIn(self.paths[3], indexer.logger.warn.call_args[0])
+
+    def test_index_pass_batch_exception(self):
+        self.index_client.chunk_push_many.side_effect = IOError('rdir down')
+        indexer = self._run(batch_size=10)
+        self.assertEqual(0, indexer.successes)
+        self.assertEqual(5, indexer.errors)
+
+    def test_index_pass_no_batch(self):
+        indexer = self._run(batch_size=1)
+        self.assertEqual(5, indexer.index_client.chunk_push.call_count)
+        self.assertFalse(indexer.index_client.chunk_push_many.called)
+        self.assertEqual(5, indexer.successes)
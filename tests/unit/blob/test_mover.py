@@ -0,0 +1,166 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from mock import MagicMock as Mock, patch
+
+from oio.blob.mover import BlobMoverWorker
+from tests.unit.content import make_content
+
+
+VOLUME = '127.0.0.1:6010'
+
+
+def make_chunks(content_id):
+    return [{'url': 'http://%s/%s%d%d' % (addr, content_id, pos, copy),
+             'pos': str(pos), 'size': 16, 'hash': 'A' * 32}
+            for pos in range(2)
+            for copy, addr in enumerate((VOLUME, '127.0.0.1:6011'))]
+
+
+class TestBlobMoverWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.blob_client = Mock()
+        self.contents = dict()
+
+        def _get(container_id, content_id, **kwargs):
+            content = make_content(
+                make_chunks(content_id), container_id=container_id,
+                content_id=content_id, chunk_method='plain/nb_copy=2',
+                policy='TWOCOPIES', blob_client=self.blob_client)
+            content._copy_chunk_to_spare = Mock(
+                side_effect=lambda chunk_id: (
+                    content.chunks.filter(id=chunk_id).one(),
+                    'http://127.0.0.1:6012/%s' % chunk_id))
+            self.contents[content_id] = content
+            return content
+
+        self.failed = set()
+
+        def _update(container_client, container_id, substitutions,
+                    **kwargs):
+            if container_id in self.failed:
+                raise IOError('meta2 down')
+            return [(sub, IOError('deleted')) for sub in substitutions
+                    if sub[0].content_id == 'deleted']
+
+        self.update = Mock(side_effect=_update)
+        patcher = patch('oio.blob.mover.safe_update_spare_chunks',
+                        new=self.update)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        conf = {'namespace': 'NS', 'update_batch_size': 3,
+                'max_pending_chunks': 100}
+        with patch('oio.blob.mover.BlobClient'), \
+                patch('oio.blob.mover.ContainerClient'), \
+                patch('oio.blob.mover.ContentFactory'):
+            self.mover = BlobMoverWorker(conf, Mock(), '/vol')
+        self.mover.address = VOLUME
+        self.mover.content_factory.get = Mock(side_effect=_get)
+
+    def _move(self, container_id, content_id, pos):
+        chunk_id = '%s%d0' % (content_id, pos)
+        self.mover.load_chunk_metadata = Mock(return_value={
+            'container_id': container_id, 'content_id': content_id,
+            'chunk_id': chunk_id, 'chunk_size': 16})
+        self.mover.safe_chunk_move('/vol/%s' % chunk_id)
+
+    def _deleted(self):
+        return [call[0][0] for call in
+                self.blob_client.chunk_delete.call_args_list]
+
+    def test_batch_per_container(self):
+        for content_id in ('c1', 'c2'):
+            for pos in range(2):
+                self._move('CID1', content_id, pos)
+        self._move('CID2', 'c3', 0)
+        # One full batch
+        self.assertEqual(1, self.update.call_count)
+        self.assertEqual(2, self.mover.pending_count)
+        self.assertEqual(32, self.mover.pending_bytes)
+        self.assertEqual(3, len(self._deleted()))
+
+        self.mover.flush_all()
+        self.assertEqual(3, self.update.call_count)
+        self.assertEqual(['CID1', 'CID1', 'CID2'],
+                         sorted(call[0][1]
+                                for call in self.update.call_args_list))
+        self.assertEqual(0, self.mover.pending_count)
+        self.assertEqual(0, self.mover.pending_bytes)
+        # The original chunks are deleted once the copies are referenced
+        self.assertEqual(
+            sorted('http://%s/%s0' % (VOLUME, chunk)
+                   for chunk in ('c10', 'c11', 'c20', 'c21', 'c30')),
+            sorted(self._deleted()))
+        self.assertEqual(5 * 16, self.mover.total_bytes_processed)
+        self.assertEqual(0, self.mover.errors)
+
+    def test_max_pending_bytes(self):
+        self.mover.max_pending_bytes = 32
+        self._move('CID1', 'c1', 0)
+        self._move('CID2', 'c2', 0)
+        self.assertEqual(2, self.update.call_count)
+        self.assertEqual(0, self.mover.pending_count)
+
+    def test_update_errors(self):
+        self.failed.add('CID2')
+        self._move('CID1', 'deleted', 0)
+        self._move('CID1', 'c1', 0)
+        self._move('CID2', 'c2', 0)
+        self.mover.flush_all()
+        self.assertEqual(2, self.mover.errors)
+        # The copies which could not be referenced are deleted
+        self.assertEqual(
+            sorted(['http://127.0.0.1:6012/deleted00',
+                    'http://%s/c100' % VOLUME,
+                    'http://127.0.0.1:6012/c200']),
+            sorted(self._deleted()))
+
+    @patch('oio.blob.mover.check_volume', return_value=('NS', VOLUME))
+    @patch('oio.blob.mover.VolumeWalker')
+    def test_flush_before_usage_check(self, walker_cls, _check_volume):
+        self.mover.usage_target = 50
+        self.mover.usage_check_interval = 0
+        pending = list()
+
+        def _statfs(volume):
+            pending.append(self.mover.pending_count)
+            return 40, 100
+
+        def _walk(move):
+            self._move('CID1', 'c1', 0)
+            move('/vol/c110')
+
+        walker_cls.from_conf.return_value.run = Mock(side_effect=_walk)
+        with patch('oio.blob.mover.statfs', new=_statfs):
+            self.mover.mover_pass()
+        # The moved chunk was deleted before measuring the usage
+        self.assertEqual([0], pending)
+        self.assertTrue(walker_cls.from_conf.return_value.stop.called)
+
+    @patch('oio.blob.mover.check_volume', return_value=('NS', VOLUME))
+    @patch('oio.blob.mover.VolumeWalker')
+    def test_flush_on_error(self, walker_cls, _check_volume):
+        def _walk(move):
+            self._move('CID1', 'c1', 0)
+            raise Exception('interrupted')
+
+        walker_cls.from_conf.return_value.run = Mock(side_effect=_walk)
+        self.assertRaises(Exception, self.mover.mover_pass)
+        self.assertEqual(0, self.mover.pending_count)
+        self.assertEqual(['http://%s/c100' % VOLUME], self._deleted())
@@ -0,0 +1,91 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import eventlet
+
+from oio.blob.walker import VolumeWalker, list_dir
+
+
+class VolumeWalkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.volume = tempfile.mkdtemp()
+        self.files = set()
+        for top in ('000', '001', '002'):
+            for sub in ('AA', 'AB'):
+                path = os.path.join(self.volume, top, sub)
+                os.makedirs(path)
+                for i in range(3):
+                    name = os.path.join(path, 'chunk%d' % i)
+                    open(name, 'w').close()
+                    self.files.add(name)
+        os.symlink(os.path.join(self.volume, '000'),
+                   os.path.join(self.volume, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.volume)
+
+    def test_list_dir(self):
+        dirs, files = list_dir(self.volume)
+        self.assertEqual(['000', '001', '002'],
+                         sorted(os.path.basename(d) for d in dirs))
+        self.assertEqual([], files)
+
+    def _walk(self, **kwargs):
+        walker = VolumeWalker(self.volume, **kwargs)
+        processed = list()
+
+        def process(path):
+            eventlet.sleep(0)
+            processed.append(path)
+
+        walker.run(process)
+        return processed
+
+    def test_run(self):
+        for walkers in (1, 3):
+            for concurrency in (1, 5):
+                processed = self._walk(walkers=walkers,
+                                       concurrency=concurrency)
+                self.assertEqual(len(self.files), len(processed))
+                self.assertEqual(self.files, set(processed))
+
+    def test_run_error(self):
+        walker = VolumeWalker(self.volume, concurrency=3)
+        processed = list()
+
+        def process(path):
+            processed.append(path)
+            raise ValueError('failed')
+
+        walker.run(process)
+        self.assertEqual(self.files, set(processed))
+
+    def test_stop(self):
+        walker = VolumeWalker(self.volume, concurrency=2, walkers=2)
+        processed = list()
+
+        def process(path):
+            processed.append(path)
+            if len(processed) >= 4:
+                walker.stop()
+
+        walker.run(process)
+        self.assertLess(len(processed), len(self.files))
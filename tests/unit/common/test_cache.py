@@ -0,0 +1,87 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from oio.common.cache import LruCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, LruCache, 0)
+
+    def test_get_put(self):
+        cache = LruCache(2, clock=self.clock)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIn('a', cache)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_evict_least_recently_used(self):
+        cache = LruCache(2, clock=self.clock)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertNotIn('b', cache)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(1, cache.evictions)
+
+    def test_ttl(self):
+        cache = LruCache(10, ttl=5.0, clock=self.clock)
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=20.0)
+        self.clock.now += 6.0
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        self.assertEqual(1, len(cache))
+
+    def test_pop(self):
+        cache = LruCache(10, clock=self.clock)
+        cache.put('a', 1)
+        self.assertEqual(1, cache.pop('a'))
+        self.assertIsNone(cache.pop('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_weigher(self):
+        cache = LruCache(10, clock=self.clock, weigher=len)
+        cache.put('a', 'x' * 4)
+        cache.put('b', 'x' * 4)
+        self.assertEqual(8, cache.weight)
+        cache.put('c', 'x' * 4)
+        self.assertNotIn('a', cache)
+        self.assertEqual(8, cache.weight)
+        # The newest entry is kept, even if it is too heavy
+        cache.put('d', 'x' * 20)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(20, cache.weight)
+        cache.pop('d')
+        self.assertEqual(0, cache.weight)
@@ -0,0 +1,93 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import time
+import unittest
+
+import eventlet
+
+from oio.common.green import RateLimiter, pipelined_listing
+
+
+class FakeLister(object):
+    """List integers by pages of 2, up to `count`."""
+
+    def __init__(self, count, fail_at=None):
+        self.count = count
+        self.fail_at = fail_at
+        self.calls = list()
+
+    def __call__(self, marker=0):
+        self.calls.append(marker)
+        if marker == self.fail_at:
+            raise ValueError('fail at %d' % marker)
+        eventlet.sleep(0)
+        return list(range(marker, min(marker + 2, self.count)))
+
+
+def _next_marker(listing):
+    return listing[-1] + 1
+
+
+class PipelinedListingTest(unittest.TestCase):
+
+    def _list(self, lister, prefetch):
+        return list(pipelined_listing(lister, _next_marker, bool,
+                                      prefetch=prefetch, marker=0))
+
+    def test_listing(self):
+        for prefetch in (0, 1, 3):
+            lister = FakeLister(5)
+            pages = self._list(lister, prefetch)
+            self.assertEqual([[0, 1], [2, 3], [4], []], pages)
+            self.assertEqual([0, 2, 4, 5], lister.calls)
+
+    def test_listing_error(self):
+        for prefetch in (0, 1, 3):
+            lister = FakeLister(10, fail_at=4)
+            self.assertRaises(ValueError, self._list, lister, prefetch)
+
+    def test_listing_prefetch(self):
+        lister = FakeLister(20)
+        pages = pipelined_listing(lister, _next_marker, bool,
+                                  prefetch=2, marker=0)
+        self.assertEqual([0, 1], next(pages))
+        eventlet.sleep(0.01)
+        # The first page has been consumed, two more are waiting
+        self.assertEqual([0, 2, 4], lister.calls)
+        pages.close()
+        eventlet.sleep(0.01)
+        self.assertEqual([0, 2, 4], lister.calls)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_unlimited(self):
+        limiter = RateLimiter(0)
+        start = time.time()
+        for _ in range(1000):
+            limiter.wait()
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_shared_limit(self):
+        limiter = RateLimiter(100, rate_buffer=0)
+        pool = eventlet.GreenPool(10)
+        start = time.time()
+        for _ in range(10):
+            pool.spawn(lambda: [limiter.wait() for _ in range(5)])
+        pool.waitall()
+        # 50 requests at 100 requests per second, whatever the number
+        # of green threads
+        self.assertGreaterEqual(time.time() - start, 0.45)
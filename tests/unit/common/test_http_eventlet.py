@@ -0,0 +1,132 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+import eventlet
+
+from oio.common.http_eventlet import HttpConnectionPool, http_connect, \
+    release_connection
+
+
+class KeepAliveServer(object):
+    """Answer 'hello' to each request, keeping connections open."""
+
+    def __init__(self, close_after=None):
+        self.sock = eventlet.listen(('127.0.0.1', 0))
+        self.netloc = '127.0.0.1:%d' % self.sock.getsockname()[1]
+        self.close_after = close_after
+        self.connections = 0
+        self.requests = 0
+        self.server = eventlet.spawn(self._serve)
+
+    def _serve(self):
+        while True:
+            client, _ = self.sock.accept()
+            self.connections += 1
+            eventlet.spawn(self._handle, client)
+
+    def _handle(self, client):
+        reader = client.makefile('rb')
+        handled = 0
+        while True:
+            line = reader.readline()
+            if not line:
+                break
+            while line not in (b'\r\n', b''):
+                line = reader.readline()
+            self.requests += 1
+            handled += 1
+            client.sendall(b'HTTP/1.1 200 OK\r\n'
+                           b'Content-Length: 5\r\n\r\nhello')
+            if self.close_after and handled >= self.close_after:
+                break
+        client.close()
+
+    def stop(self):
+        self.server.kill()
+        self.sock.close()
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HttpConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = KeepAliveServer()
+        self.clock = FakeClock()
+        self.pool = HttpConnectionPool(max_idle_per_host=2, idle_timeout=5.0,
+                                       clock=self.clock)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.stop()
+
+    def _request(self, read=True):
+        conn = http_connect(self.server.netloc, 'GET', '/chunk',
+                            pool=self.pool)
+        resp = conn.getresponse()
+        self.assertEqual(200, resp.status)
+        if read:
+            self.assertEqual(b'hello', resp.read())
+        release_connection(conn, resp)
+        return conn
+
+    def test_reuse(self):
+        conn = self._request()
+        self.assertIs(conn, self._request())
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual({'idle': 1, 'hits': 1, 'misses': 1, 'discarded': 0},
+                         self.pool.stats())
+
+    def test_not_reused_when_not_read(self):
+        self._request(read=False)
+        self.assertEqual(0, self.pool.stats()['idle'])
+        self._request()
+        self.assertEqual(2, self.server.connections)
+
+    def test_idle_timeout(self):
+        self._request()
+        self.clock.now += 6.0
+        self._request()
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(1, self.pool.stats()['discarded'])
+
+    def test_max_idle(self):
+        conns = [http_connect(self.server.netloc, 'GET', '/chunk',
+                              pool=self.pool)
+                 for _ in range(3)]
+        for conn in conns:
+            resp = conn.getresponse()
+            resp.read()
+            release_connection(conn, resp)
+        self.assertEqual(2, self.pool.stats()['idle'])
+        self.assertEqual(1, self.pool.stats()['discarded'])
+
+    def test_closed_by_server(self):
+        self.server.close_after = 1
+        self._request()
+        eventlet.sleep(0.01)
+        # The connection is checked before being reused
+        self._request()
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(1, self.pool.stats()['discarded'])
@@ -0,0 +1,38 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from oio.common.metrics import LatencyHistogram, LatencyHistograms
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = LatencyHistogram(bounds=(0.1, 1.0))
+        for duration in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(duration)
+        self.assertEqual({'count': 4, 'sum': 2.65, 'max': 2.0,
+                          'buckets': [[0.1, 2], [1.0, 3], ['+Inf', 4]]},
+                         histogram.to_dict())
+
+    def test_histograms(self):
+        histograms = LatencyHistograms(bounds=(1.0, ))
+        histograms.observe('GET', 0.5)
+        histograms.observe('GET', 1.5)
+        histograms.observe('SET', 0.5)
+        stats = histograms.to_dict()
+        self.assertEqual(['GET', 'SET'], sorted(stats))
+        self.assertEqual([[1.0, 1], ['+Inf', 2]], stats['GET']['buckets'])
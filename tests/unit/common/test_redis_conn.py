@@ -0,0 +1,67 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import socket
+import unittest
+
+import redis
+
+from oio.common.redis_conn import BlockingSentinelConnectionPool, RedisConn
+
+
+class RedisConnTest(unittest.TestCase):
+
+    def _free_port(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def test_pool(self):
+        conn = RedisConn({'redis_max_connections': '4',
+                          'redis_socket_keepalive': 'true',
+                          'redis_socket_timeout': '1.5'}).conn
+        pool = conn.connection_pool
+        self.assertIsInstance(pool, redis.BlockingConnectionPool)
+        self.assertEqual(4, pool.max_connections)
+        self.assertTrue(pool.connection_kwargs['socket_keepalive'])
+        self.assertEqual(1.5, pool.connection_kwargs['socket_timeout'])
+
+    def test_reconnect_attempts(self):
+        backend = RedisConn({'redis_port': self._free_port(),
+                             'redis_reconnect_attempts': '3',
+                             'redis_reconnect_delay': '0'})
+        self.assertRaises(redis.exceptions.ConnectionError,
+                          backend.conn.get, 'key')
+        self.assertEqual(3, backend.redis_latencies.to_dict()['GET']['count'])
+
+    def test_no_reconnect_attempts_on_writes(self):
+        backend = RedisConn({'redis_port': self._free_port(),
+                             'redis_reconnect_attempts': '3',
+                             'redis_reconnect_delay': '0'})
+        self.assertRaises(redis.exceptions.ConnectionError,
+                          backend.conn.hincrby, 'key', 'field', 1)
+        self.assertEqual(
+            1, backend.redis_latencies.to_dict()['HINCRBY']['count'])
+
+    def test_sentinel_pool(self):
+        conn = RedisConn({'sentinel_hosts': '127.0.0.1:26379',
+                          'redis_max_connections': '4',
+                          'redis_pool_timeout': '2.5'}).conn
+        pool = conn.connection_pool
+        self.assertIsInstance(pool, BlockingSentinelConnectionPool)
+        self.assertEqual(4, pool.max_connections)
+        self.assertEqual(2.5, pool.timeout)
@@ -21,8 +21,8 @@ try:
 except ImportError:
     from xml.etree import cElementTree as etree
 
-from oio.container.lifecycle import Expiration, \
-    LifecycleRule, LifecycleRuleFilter, Transition, \
+from oio.container.lifecycle import ContainerLifecycle, Expiration, \
+    LifecycleExecutor, LifecycleRule, LifecycleRuleFilter, Transition, \
     NoncurrentVersionExpiration
 
 
@@ -508,3 +508,141 @@ class TestContainerLifecycle(unittest.TestCase):
         self.assertFalse(rule.match(obj_meta))
         obj_meta['properties']['key2'] = 'value2'
         self.assertTrue(rule.match(obj_meta))
+
+
+class FakeStorageApi(object):
+    """Objects of one container, without any service."""
+
+    def __init__(self, names, max_versions='1'):
+        self.objects = dict((name, {'name': name, 'version': '1',
+                                    'ctime': '554119200', 'properties': {}})
+                            for name in names)
+        self.max_versions = max_versions
+        self.listings = list()
+        self.deletes = list()
+
+    def container_get_properties(self, account, container):
+        return {'properties': {},
+                'system': {'sys.m2.policy.version': self.max_versions}}
+
+    def object_list(self, account, container, limit=None, marker=None,
+                    prefix=None, **kwargs):
+        self.listings.append((prefix, marker))
+        names = [name for name in sorted(self.objects)
+                 if name > (marker or '') and
+                 name.startswith(prefix or '')]
+        names, truncated = names[:limit], len(names) > limit
+        return {'objects': [dict(self.objects[name]) for name in names],
+                'truncated': truncated,
+                'next_marker': names[-1] if names else None}
+
+    def object_delete_many(self, account, container, objs, versions=None,
+                           **kwargs):
+        self.deletes.append(list(objs))
+        results = list()
+        for name, version in zip(objs, versions or [None] * len(objs)):
+            obj = self.objects.get(name)
+            deleted = obj is not None and version in (None, obj['version'])
+            if deleted:
+                del self.objects[name]
+            results.append((name, deleted))
+        return results
+
+    def object_delete(self, account, container, obj, version=None,
+                      **kwargs):
+        self.deletes.append(obj)
+        return self.objects.pop(obj, None) is not None
+
+
+class TestLifecycleExecutor(unittest.TestCase):
+
+    def _rule(self, prefix):
+        return """
+            <Rule>
+                <Filter><Prefix>%s</Prefix></Filter>
+                <Status>Enabled</Status>
+                <Expiration><Days>1</Days></Expiration>
+            </Rule>""" % prefix
+
+    def _executor(self, api, *prefixes):
+        lc = ContainerLifecycle(api, 'account', 'container')
+        lc.load_xml("<LifecycleConfiguration>%s</LifecycleConfiguration>" %
+                    ''.join(self._rule(prefix) for prefix in prefixes))
+        return LifecycleExecutor(lc, batch_size=3, page_size=4)
+
+    def test_listing_prefixes(self):
+        api = FakeStorageApi([])
+        executor = self._executor(api, 'logs/2018/', 'logs/', 'tmp/')
+        self.assertEqual(['logs/', 'tmp/'], executor.listing_prefixes())
+        executor = self._executor(api, 'logs/', '')
+        self.assertEqual([None], executor.listing_prefixes())
+
+    def test_batch_deletes(self):
+        names = ['logs/%d' % i for i in range(7)] + ['data/%d' % i
+                                                     for i in range(5)]
+        api = FakeStorageApi(names)
+        executor = self._executor(api, 'logs/')
+        results = list(executor.execute())
+        self.assertEqual(7, len(results))
+        self.assertEqual(set(['Deleted']), set(res[3] for res in results))
+        self.assertEqual(['data/%d' % i for i in range(5)],
+                         sorted(api.objects))
+        # Only the objects under the prefix have been listed,
+        # and deleted by batches of 3 (for each page of 4)
+        self.assertEqual(['logs/'], list(set(p for p, _ in api.listings)))
+        self.assertEqual([3, 1, 3], [len(batch) for batch in api.deletes])
+        stats = executor.stats()
+        self.assertEqual(7, stats['objects'])
+        self.assertEqual(7, stats['deleted'])
+
+    def test_overwritten_before_delete(self):
+        api = FakeStorageApi(['logs/%d' % i for i in range(3)])
+        object_list = api.object_list
+
+        def _list_then_overwrite(*args, **kwargs):
+            listing = object_list(*args, **kwargs)
+            api.objects['logs/1'] = dict(api.objects['logs/1'], version='2')
+            return listing
+
+        api.object_list = _list_then_overwrite
+        executor = self._executor(api, 'logs/')
+        results = list(executor.execute())
+        self.assertEqual(['Deleted', 'Kept', 'Deleted'],
+                         [res[3] for res in results])
+        # Only the listed version is deleted, not the new one
+        self.assertEqual(['logs/1'], list(api.objects))
+        self.assertEqual('2', api.objects['logs/1']['version'])
+
+    def test_versioning(self):
+        api = FakeStorageApi(['a', 'b'], max_versions='-1')
+        executor = self._executor(api, 'a')
+        results = list(executor.execute())
+        self.assertEqual(['Deleted'], [res[3] for res in results])
+        # Versions are deleted one by one
+        self.assertEqual(['a'], api.deletes)
+
+    def test_checkpoint(self):
+        names = ['%s/%d' % (prefix, i)
+                 for prefix in ('logs', 'tmp') for i in range(6)]
+        api = FakeStorageApi(names)
+        executor = self._executor(api, 'logs/', 'tmp/')
+        positions = list()
+        results = executor.execute(checkpoint=positions.append)
+        # Stop after the first page
+        for _ in range(4):
+            next(results)
+        results.close()
+        self.assertEqual({'prefix': 'logs/', 'marker': 'logs/3'},
+                         positions[-1])
+
+        executor = self._executor(api, 'logs/', 'tmp/')
+        positions = list()
+        results = list(executor.execute(position={'prefix': 'logs/',
+                                                  'marker': 'logs/3'},
+                                        checkpoint=positions.append))
+        # One result per object and per rule
+        self.assertEqual(8, len([res for res in results
+                                 if res[3] == 'Deleted']))
+        self.assertEqual(16, len(results))
+        self.assertEqual([], sorted(api.objects))
+        self.assertIsNone(positions[-1])
@@ -0,0 +1,38 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+from mock import MagicMock as Mock
+
+from oio.common.storage_method import STORAGE_METHODS
+from oio.content.plain import PlainContent
+
+
+def make_content(chunks, container_id='CID', content_id='AAAA',
+                 chunk_method='plain/nb_copy=3', policy='THREECOPIES',
+                 chunk_size=16, container_client=None, blob_client=None):
+    """
+    Build a replicated content from a list of chunk descriptions
+    (with 'url', 'pos', 'size' and 'hash' keys), without any service.
+    """
+    sizes = dict((chunk['pos'], chunk['size']) for chunk in chunks)
+    metadata = {'id': content_id, 'name': 'obj',
+                'length': sum(sizes.values()), 'version': 1,
+                'hash': 'F' * 32, 'chunk_method': chunk_method,
+                'chunk_size': chunk_size, 'policy': policy,
+                'mime_type': 'application/octet-stream'}
+    return PlainContent({}, container_id, metadata, chunks,
+                        STORAGE_METHODS.load(chunk_method), 'acct', 'cont',
+                        blob_client=blob_client or Mock(),
+                        container_client=container_client or Mock())
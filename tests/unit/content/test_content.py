@@ -14,9 +14,16 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library.
 
+import itertools
 import unittest
-from oio.content.content import Chunk, ChunksHelper
+
+from mock import MagicMock as Mock
+
+from oio.common.exceptions import SpareChunkException
+from oio.content.content import Chunk, ChunksHelper, \
+    safe_update_spare_chunks
 from oio.common.utils import GeneratorIO
+from tests.unit.content import make_content
 
 
 class TestChunk(unittest.TestCase):
@@ -343,3 +350,67 @@ class TestGeneratorIO(unittest.TestCase):
         data = ["", "", ""]
         gen = GeneratorIO(data)
         self.assertEqual(gen.read(10), "")
+
+
+def make_chunks(content_id):
+    return [{'url': 'http://127.0.0.1:60%d%d/%s%d%d' % (
+                 pos, copy, content_id, pos, copy),
+             'pos': str(pos), 'size': 8, 'hash': '0' * 32}
+            for pos in range(2) for copy in range(3)]
+
+
+class TestSpareChunks(unittest.TestCase):
+
+    def setUp(self):
+        self.container_client = Mock()
+        ids = itertools.count()
+
+        def _content_spare(data=None, **kwargs):
+            return {'chunks': [{'id': 'http://127.0.0.1:7000/%d' % next(ids)}
+                               for _ in range(3 - len(data['notin']))]}
+        self.container_client.content_spare = Mock(
+            side_effect=_content_spare)
+        self.content = make_content(
+            make_chunks('AA'), content_id='AA', chunk_size=8,
+            container_client=self.container_client)
+
+    def test_get_spare_chunks(self):
+        chunks = [self.content.chunks[i] for i in (0, 5, 1)]
+        urls = self.content._get_spare_chunks(chunks)
+        self.assertEqual(3, len(set(urls)))
+        # One request per metachunk
+        self.assertEqual(2, self.container_client.content_spare.call_count)
+        for call in self.container_client.content_spare.call_args_list:
+            data = call[1]['data']
+            self.assertEqual(3, len(data['notin']) + len(data['broken']))
+
+    def test_get_spare_chunks_not_enough(self):
+        self.container_client.content_spare = Mock(
+            return_value={'chunks': [{'id': 'http://127.0.0.1:7000/0'}]})
+        chunks = self.content.chunks.filter(pos=0).all()[:2]
+        self.assertRaises(SpareChunkException,
+                          self.content._get_spare_chunks, chunks)
+
+    def test_safe_update_spare_chunks(self):
+        other = make_content(make_chunks('BB'), content_id='BB',
+                             chunk_size=8,
+                             container_client=self.container_client)
+        substitutions = [(self.content, self.content.chunks[0], 'new0'),
+                         (other, other.chunks[0], 'new1'),
+                         (other, other.chunks[1], 'new2')]
+
+        def _raw_update(old, new, **kwargs):
+            if len(old) > 1 or new[0]['id'] == 'new1':
+                raise IOError('deleted')
+        self.container_client.container_raw_update = Mock(
+            side_effect=_raw_update)
+        failed = safe_update_spare_chunks(self.container_client, 'CID',
+                                          substitutions)
+        self.assertEqual([substitutions[1]], [sub for sub, _ in failed])
+        calls = self.container_client.container_raw_update.call_args_list
+        self.assertEqual(4, len(calls))
+        # Everything is tried in one request first
+        old, new = calls[0][0]
+        self.assertEqual(['AA', 'BB', 'BB'], [b['content'] for b in old])
+        self.assertEqual(['new0', 'new1', 'new2'], [b['id'] for b in new])
+        self.assertEqual(self.content.chunks[0].url, old[0]['id'])
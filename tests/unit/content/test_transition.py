@@ -0,0 +1,142 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+import eventlet
+
+from oio.content.factory import ContentFactory
+from oio.content.transition import PolicyTransitioner
+from tests.unit.content import make_content
+
+
+class FakeBlobClient(object):
+    def __init__(self, broken=()):
+        self.broken = broken
+        self.puts = dict()
+
+    def chunk_get(self, url, **kwargs):
+        if url in self.broken:
+            raise IOError('broken')
+        return {}, FakeStream(url)
+
+    def chunk_put(self, url, meta, data, **kwargs):
+        self.puts[url] = (meta, data.url)
+
+
+class FakeStream(object):
+    def __init__(self, url):
+        self.url = url
+
+    def close(self):
+        pass
+
+
+class TestChangePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.blob_client = FakeBlobClient()
+        self.factory = ContentFactory({'namespace': 'NS'},
+                                      container_client=object())
+        self.factory.blob_client = self.blob_client
+        self.old = make_content(
+            [{'url': 'http://127.0.0.1:6010/A0', 'pos': '0', 'size': 16,
+              'hash': 'A' * 32},
+             {'url': 'http://127.0.0.1:6010/A1', 'pos': '1', 'size': 14,
+              'hash': 'B' * 32}],
+            chunk_method='plain/nb_copy=1', policy='SINGLE',
+            container_client=object())
+
+    def _new(self, chunk_method, positions, chunk_size=16):
+        content = make_content(
+            [{'url': 'http://127.0.0.1:6011/N%s' % i, 'pos': pos,
+              'size': chunk_size, 'hash': '0' * 32}
+             for i, pos in enumerate(positions)],
+            chunk_method=chunk_method, policy='NEW', chunk_size=chunk_size,
+            container_client=object(), blob_client=self.blob_client)
+        # Same length as the old content
+        content.metadata['length'] = 30
+        return content
+
+    def test_same_geometry(self):
+        self.assertTrue(self.factory._same_geometry(
+            self.old, self._new('plain/nb_copy=3', ['0', '0', '1'])))
+        self.assertFalse(self.factory._same_geometry(
+            self.old, self._new('plain/nb_copy=3', ['0', '0', '0'])))
+        # Same positions, but not the same chunk size
+        self.assertFalse(self.factory._same_geometry(
+            self.old, self._new('plain/nb_copy=1', ['0', '1'],
+                                chunk_size=20)))
+        # A copy of the old content is truncated
+        self.old.chunks.filter(pos='1').one().size = 10
+        self.assertFalse(self.factory._same_geometry(
+            self.old, self._new('plain/nb_copy=3', ['0', '0', '1'])))
+
+    def test_copy_chunks(self):
+        new = self._new('plain/nb_copy=2', ['0', '0', '1', '1'])
+        self.factory._copy_chunks(self.old, new)
+        self.assertEqual(4, len(self.blob_client.puts))
+        for chunk in new.chunks:
+            meta, source = self.blob_client.puts[chunk.url]
+            self.assertEqual(source[-1], chunk.pos)
+            self.assertEqual(chunk.pos, meta['chunk_pos'])
+            self.assertEqual('NEW', meta['policy'])
+        self.assertEqual([16, 16, 14, 14], [c.size for c in new.chunks])
+        self.assertEqual(['A' * 32] * 2 + ['B' * 32] * 2,
+                         [c.checksum for c in new.chunks])
+
+    def test_copy_chunks_broken_source(self):
+        self.blob_client.broken = ('http://127.0.0.1:6010/A1', )
+        new = self._new('plain/nb_copy=1', ['0', '1'])
+        self.assertRaises(Exception, self.factory._copy_chunks,
+                          self.old, new)
+
+
+class FakeFactory(object):
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    def change_policy(self, container_id, content_id, new_policy,
+                      **kwargs):
+        if content_id == 'broken':
+            raise IOError('broken')
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        eventlet.sleep(0.01)
+        self.running -= 1
+        return content_id
+
+
+class TestPolicyTransitioner(unittest.TestCase):
+
+    def test_run(self):
+        factory = FakeFactory()
+        transitioner = PolicyTransitioner(factory, concurrency=3)
+        items = [{'container_id': 'CID', 'content_id': str(i),
+                  'policy': 'NEW',
+                  'metadata': {'policy': 'NEW' if i == 2 else 'OLD',
+                               'length': 10}}
+                 for i in range(10)]
+        items.append({'container_id': 'CID', 'content_id': 'broken',
+                      'policy': 'NEW'})
+        results = list(transitioner.run(items))
+        self.assertEqual(items, [item for item, _ in results])
+        contents = [res for _, res in results]
+        # Already in the new policy
+        self.assertIsNone(contents[2])
+        self.assertEqual('9', contents[9])
+        self.assertIsInstance(contents[10], IOError)
+        self.assertEqual(3, factory.max_running)
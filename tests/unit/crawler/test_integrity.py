@@ -0,0 +1,129 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import MagicMock as Mock, patch
+
+from oio.crawler.integrity import Checker, ListingSpill, Target
+
+
+class ListingSpillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.spill = ListingSpill(self.spill_dir)
+
+    def tearDown(self):
+        self.spill.close()
+        shutil.rmtree(self.spill_dir)
+
+    def test_listing(self):
+        self.spill.BATCH_SIZE = 2
+        listing = self.spill.listing('acct', 'ct')
+        listing.update((name, {'name': name}) for name in 'acbde')
+        other = self.spill.listing('acct', 'ct2')
+        other.update([('z', {'name': 'z'})])
+        self.assertIn('a', listing)
+        self.assertNotIn('z', listing)
+        self.assertEqual({'name': 'c'}, listing['c'])
+        self.assertRaises(KeyError, listing.__getitem__, 'z')
+        self.assertEqual(list('abcde'), list(listing))
+        # Listing again the container drops the previous listing
+        listing = self.spill.listing('acct', 'ct')
+        self.assertEqual([], list(listing))
+        self.assertEqual(['z'], list(other))
+
+    def test_close(self):
+        path = self.spill.path
+        self.assertTrue(os.path.exists(path))
+        self.spill.close()
+        self.assertFalse(os.path.exists(path))
+        self.spill = ListingSpill(self.spill_dir)
+
+
+class CheckerCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir)
+
+    def _checker(self, **kwargs):
+        with patch('oio.crawler.integrity.AccountClient'), \
+                patch('oio.crawler.integrity.ContainerClient'), \
+                patch('oio.crawler.integrity.BlobClient'):
+            checker = Checker('NS', **kwargs)
+        checker.account_client.container_list = Mock(side_effect=[
+            {'listing': [['ct', 0, 0, 0]]}, {'listing': []}])
+        checker.container_client.content_list = Mock(side_effect=[
+            ({}, {'objects': [{'name': 'a'}, {'name': 'b'}]}),
+            ({}, {'objects': [], 'system': {'sys.name': 'CID.1'}}),
+        ] * 2)
+        return checker
+
+    def test_check_container_cached(self):
+        checker = self._checker()
+        listing, ct_meta = checker.check_container(Target('acct', 'ct'))
+        self.assertEqual(['a', 'b'], sorted(listing))
+        self.assertEqual({'system': {'sys.name': 'CID.1'}}, ct_meta)
+        checker.check_container(Target('acct', 'ct'))
+        self.assertEqual(1, checker.containers_checked)
+        self.assertEqual(2, checker.container_client.content_list.call_count)
+
+    def test_check_container_evicted(self):
+        checker = self._checker(cache_size=3)
+        checker.check_container(Target('acct', 'ct'))
+        # The container listing (2 objects) made the cache evict
+        # the account listing (1 container)
+        self.assertEqual(1, checker.list_cache.evictions)
+        self.assertNotIn('acct', checker.list_cache)
+        self.assertIn(('acct', 'ct'), checker.list_cache)
+        checker.account_client.container_list.side_effect = [
+            {'listing': [['ct', 0, 0, 0]]}, {'listing': []}]
+        checker.check_account(Target('acct'))
+        self.assertEqual(2, checker.accounts_checked)
+
+    def test_check_container_spilled(self):
+        checker = self._checker(spill_dir=self.spill_dir, cache_size=2)
+        listing, _ = checker.check_container(Target('acct', 'ct'))
+        self.assertIn('a', listing)
+        self.assertEqual(['a', 'b'], list(listing))
+        # The listing is on disk, only the account listing is evicted
+        self.assertEqual(1, checker.list_cache.evictions)
+        checker.check_container(Target('acct', 'ct'))
+        self.assertEqual(1, checker.containers_checked)
+        checker.close()
+        self.assertEqual([], os.listdir(self.spill_dir))
+
+    def test_missing_chunk_rebuild_input(self):
+        rebuild_file = os.path.join(self.spill_dir, 'rebuild')
+        # Listings of explicit targets are not cached
+        checker = self._checker(rebuild_file=rebuild_file, limit_listings=2)
+        checker.container_client.content_list = Mock(return_value=(
+            {}, {'objects': [], 'system': {'sys.name': 'CID.1'}}))
+        checker.container_client.content_locate = Mock(return_value=(
+            {'id': 'OBJID', 'chunk_method': 'plain/nb_copy=2'},
+            [{'url': 'http://127.0.0.1:6010/AA', 'pos': '0', 'size': 1}]))
+        checker.rebuild_writer = Mock()
+        checker.check_obj(Target('acct', 'ct', 'a'))
+        checker.rebuild_writer.writerow.assert_called_once_with(
+            ('CID', 'OBJID', '0'))
+        # The container is not listed again to write the rebuilder input
+        self.assertEqual(1, checker.container_client.content_list.call_count)
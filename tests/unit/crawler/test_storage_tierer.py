@@ -0,0 +1,152 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import MagicMock as Mock, patch
+
+from oio.crawler.storage_tierer import ContainerProgress, \
+    StorageTiererWorker
+
+
+CONTAINERS = ['c1', 'c2', 'c3']
+
+
+def container_list(account, marker=None, limit=None, **kwargs):
+    names = [name for name in CONTAINERS if name > (marker or '')]
+    return {'listing': [[name, 0, 0, 0] for name in names[:limit]]}
+
+
+def content_list(account=None, reference=None, limit=None, marker=None,
+                 **kwargs):
+    objects = list()
+    for i in range(5):
+        name = 'obj%d' % i
+        if name <= (marker or ''):
+            continue
+        objects.append({'name': name, 'content': '%s-%s' % (reference, name),
+                        # obj4 is too recent, obj3 already has the policy
+                        'mtime': 9999999999 if i == 4 else 0,
+                        'policy': 'EC' if i == 3 else 'SINGLE',
+                        'size': 10})
+    return {}, {'objects': objects[:limit]}
+
+
+class StorageTiererWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmp_dir, 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _worker(self, **kwargs):
+        conf = {'namespace': 'NS', 'account': 'acct',
+                'outdated_threshold': 3600, 'new_policy': 'EC',
+                'concurrency': 3, 'listing_concurrency': 2,
+                'content_fetch_limit': 2, 'contents_per_second': 0,
+                'checkpoint_file': self.checkpoint}
+        conf.update(kwargs)
+        with patch('oio.crawler.storage_tierer.AccountClient'), \
+                patch('oio.crawler.storage_tierer.ContainerClient'), \
+                patch('oio.crawler.storage_tierer.ContentFactory'):
+            worker = StorageTiererWorker(conf, Mock())
+        worker.account_client.container_list = Mock(
+            side_effect=container_list)
+        worker.container_client.content_list = Mock(side_effect=content_list)
+        self.changed = list()
+
+        def _change_policy(cid, content_id, policy, **kwargs):
+            if content_id == 'c2-obj1':
+                raise IOError('broken')
+            self.changed.append(content_id)
+        worker.content_factory.change_policy = Mock(
+            side_effect=_change_policy)
+        return worker
+
+    def test_run_pool(self):
+        worker = self._worker()
+        worker.run()
+        self.assertEqual(
+            ['%s-obj%d' % (c, i) for c in CONTAINERS for i in range(3)
+             if (c, i) != ('c2', 1)],
+            sorted(self.changed))
+        self.assertEqual(9, worker.total_contents_processed)
+        self.assertEqual(1, worker.total_errors + worker.errors)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume(self):
+        with open(self.checkpoint, 'w') as file_:
+            json.dump({'account': 'acct', 'container': 'c2'}, file_)
+        worker = self._worker()
+        worker.run()
+        self.assertEqual(['c3-obj0', 'c3-obj1', 'c3-obj2'],
+                         sorted(self.changed))
+
+    def test_checkpoint_order(self):
+        worker = self._worker()
+        for container in CONTAINERS:
+            worker.containers.append(container)
+            worker.progress[container] = ContainerProgress()
+        worker._container_done('c2')
+        self.assertFalse(os.path.exists(self.checkpoint))
+        worker._container_done('c1')
+        # c1 and c2 are finished, c3 is not
+        with open(self.checkpoint) as file_:
+            self.assertEqual('c2', json.load(file_)['container'])
+        self.assertEqual(['c3'], list(worker.containers))
+
+    def test_listing_failure(self):
+        with open(self.checkpoint, 'w') as file_:
+            json.dump({'account': 'acct', 'container': 'c1'}, file_)
+        worker = self._worker()
+
+        def _content_list(account=None, reference=None, marker=None,
+                          **kwargs):
+            if reference == 'c2' and marker:
+                raise IOError('meta2 down')
+            return content_list(account=account, reference=reference,
+                                marker=marker, **kwargs)
+
+        worker.container_client.content_list = Mock(
+            side_effect=_content_list)
+        worker.run()
+        # The first page of c2 was processed, then its listing failed
+        self.assertIn('c2-obj0', self.changed)
+        self.assertNotIn('c2-obj2', self.changed)
+        self.assertIn('c3-obj2', self.changed)
+        self.assertEqual('c2', worker.listing_failed)
+        # The checkpoint stays before c2, whose contents were not all listed
+        with open(self.checkpoint) as file_:
+            self.assertEqual('c1', json.load(file_)['container'])
+
+    def test_checkpoint_listing_failed(self):
+        worker = self._worker()
+        for container in CONTAINERS:
+            worker.containers.append(container)
+            worker.progress[container] = ContainerProgress()
+        worker.progress['c2'].listing_failed = True
+        worker._container_done('c1')
+        worker._container_done('c2')
+        worker._container_done('c3')
+        with open(self.checkpoint) as file_:
+            self.assertEqual('c1', json.load(file_)['container'])
+        self.assertEqual([], list(worker.containers))
+        self.assertEqual({}, worker.progress)
@@ -0,0 +1,102 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+import eventlet
+
+from oio.event.consumer import EventTypes
+from oio.event.filters.account_update import AccountUpdateFilter
+
+
+class FakeApp(object):
+    app_env = dict()
+
+    def __call__(self, env, cb):
+        cb(200, '')
+
+
+class FakeAccountClient(object):
+    def __init__(self):
+        self.requests = list()
+
+    def container_update_many(self, account, containers, **_kwargs):
+        self.requests.append((account, containers))
+        return [{'name': c['name'], 'status': 409 if c['objects'] < 0
+                 else 200, 'message': 'conflict'}
+                for c in containers]
+
+
+class TestAccountUpdateFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.filter = AccountUpdateFilter(
+            FakeApp(), {'namespace': 'NS', 'proxyd_url': 'http://127.0.0.1',
+                        'batch_size': '3', 'batch_delay': '0.05'})
+        self.filter.account = FakeAccountClient()
+        self.results = dict()
+
+    def _state(self, job_id, account, container, objects, when):
+        env = {'job_id': job_id,
+               'event': EventTypes.CONTAINER_STATE,
+               'when': when,
+               'url': {'account': account, 'user': container},
+               'data': {'object-count': objects, 'bytes-count': 0}}
+
+        def cb(status, msg):
+            self.results[job_id] = status
+        return eventlet.spawn(self.filter, env, cb)
+
+    def test_coalesce(self):
+        coros = [self._state('1', 'acct', 'c1', 1, 1000000),
+                 self._state('2', 'acct', 'c1', 2, 3000000),
+                 # Older than the previous one
+                 self._state('3', 'acct', 'c1', 3, 2000000),
+                 self._state('4', 'acct', 'c2', -1, 1000000),
+                 self._state('5', 'other', 'c1', 5, 1000000)]
+        for coro in coros:
+            coro.wait()
+        self.assertEqual({'1': 200, '2': 200, '3': 200, '4': 200,
+                          '5': 200}, self.results)
+        requests = sorted(self.filter.account.requests)
+        self.assertEqual(2, len(requests))
+        account, containers = requests[0]
+        self.assertEqual('acct', account)
+        self.assertEqual([('c1', 2, 3.0), ('c2', -1, 1.0)],
+                         sorted((c['name'], c['objects'], c['mtime'])
+                                for c in containers))
+        self.assertEqual('other', requests[1][0])
+
+    def test_failure(self):
+        def _fail(account, containers, **_kwargs):
+            return [{'name': c['name'], 'status': 503, 'message': 'busy'}
+                    for c in containers]
+
+        self.filter.account.container_update_many = _fail
+        self._state('1', 'acct', 'c1', 1, 1000000).wait()
+        self.assertEqual(500, self.results['1'])
+
+    def test_missing_results(self):
+        def _partial(account, containers, **_kwargs):
+            return [{'name': containers[0]['name'], 'status': 200}]
+
+        self.filter.account.container_update_many = _partial
+        coros = [self._state('1', 'acct', 'c1', 1, 1000000),
+                 self._state('2', 'acct', 'c2', 1, 1000000)]
+        with eventlet.Timeout(5):
+            for coro in coros:
+                coro.wait()
+        # The state without result is reported as failed
+        self.assertEqual([200, 500], sorted(self.results.values()))
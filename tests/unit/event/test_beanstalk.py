@@ -0,0 +1,355 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import logging
+import os
+import time
+import unittest
+from collections import deque
+
+import eventlet
+
+from oio.common.json import json
+from oio.event.beanstalk import Beanstalk, ConnectionError, Reader, \
+    ResponseError
+from oio.event.consumer import ConsumerGroup, EventWorker, StopServe
+
+
+class FakeBeanstalkd(object):
+    """Minimal beanstalkd, with a single tube."""
+
+    def __init__(self):
+        self.sock = eventlet.listen(('127.0.0.1', 0))
+        self.url = 'beanstalk://127.0.0.1:%d' % self.sock.getsockname()[1]
+        self.ready = deque()
+        self.reserved = dict()
+        self.buried = dict()
+        self.touched = list()
+        self.last_id = 0
+        # Number of reads which returned commands
+        self.reads = 0
+        self.server = eventlet.spawn(self._serve)
+
+    def _serve(self):
+        while True:
+            client, _ = self.sock.accept()
+            eventlet.spawn(self._handle, client)
+
+    def _handle(self, client):
+        buf = ''
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            self.reads += 1
+            buf += data
+            replies = list()
+            while True:
+                end = buf.find('\r\n')
+                if end < 0:
+                    break
+                args = buf[:end].split()
+                body = None
+                consumed = end + 2
+                if args[0] == 'put':
+                    body = buf[consumed:consumed + int(args[4])]
+                    consumed += int(args[4]) + 2
+                    if len(buf) < consumed:
+                        break
+                buf = buf[consumed:]
+                replies.append(self._command(args, body))
+            client.sendall(''.join(replies))
+        client.close()
+
+    def _command(self, args, body):
+        cmd = args[0]
+        if cmd == 'use':
+            return 'USING %s\r\n' % args[1]
+        if cmd == 'watch':
+            return 'WATCHING 1\r\n'
+        if cmd == 'put':
+            self.last_id += 1
+            self.ready.append((str(self.last_id), body))
+            return 'INSERTED %d\r\n' % self.last_id
+        if cmd in ('reserve', 'reserve-with-timeout'):
+            deadline = None
+            if cmd == 'reserve-with-timeout':
+                deadline = time.time() + int(args[1])
+            while not self.ready and (deadline is None or
+                                      time.time() < deadline):
+                eventlet.sleep(0.01)
+            if not self.ready:
+                return 'TIMED_OUT\r\n'
+            job_id, body = self.ready.popleft()
+            self.reserved[job_id] = body
+            return 'RESERVED %s %d\r\n%s\r\n' % (job_id, len(body), body)
+        if cmd == 'delete':
+            if self.reserved.pop(args[1], None) is None:
+                return 'NOT_FOUND\r\n'
+            return 'DELETED\r\n'
+        if cmd == 'release':
+            self.ready.append((args[1], self.reserved.pop(args[1])))
+            return 'RELEASED\r\n'
+        if cmd == 'touch':
+            if args[1] not in self.reserved:
+                return 'NOT_FOUND\r\n'
+            self.touched.append(args[1])
+            return 'TOUCHED\r\n'
+        if cmd == 'bury':
+            self.buried[args[1]] = self.reserved.pop(args[1])
+            return 'BURIED\r\n'
+        if cmd == 'stats-tube':
+            stats = 'current-jobs-ready: %d\ncurrent-jobs-reserved: %d\n' % (
+                len(self.ready), len(self.reserved))
+            return 'OK %d\r\n%s\r\n' % (len(stats), stats)
+        return 'UNKNOWN_COMMAND\r\n'
+
+    def stop(self):
+        self.server.kill()
+        self.sock.close()
+
+
+class FakeSocket(object):
+    """Deliver data by pieces of at most `piece_size` bytes."""
+
+    def __init__(self, data, piece_size):
+        self.data = data
+        self.piece_size = piece_size
+
+    def recv_into(self, buf):
+        size = min(len(buf), self.piece_size, len(self.data))
+        buf[:size] = self.data[:size]
+        self.data = self.data[size:]
+        return size
+
+
+class TestReader(unittest.TestCase):
+
+    def _body(self, i, body_size):
+        return '%x' % (i % 16) * body_size
+
+    def _replies(self, count, body_size):
+        return ''.join('RESERVED %d %d\r\n%s\r\n' % (
+            i, body_size, self._body(i, body_size)) for i in range(count))
+
+    def _check(self, count, body_size, piece_size, read_size):
+        sock = FakeSocket(self._replies(count, body_size), piece_size)
+        reader = Reader(sock, read_size)
+        for i in range(count):
+            line = reader.readline()
+            self.assertEqual('RESERVED %d %d' % (i, body_size), line)
+            self.assertEqual(self._body(i, body_size),
+                             reader.read(body_size))
+        self.assertEqual(0, reader.length)
+        self.assertRaises(ConnectionError, reader.readline)
+
+    def test_small_pieces(self):
+        # CRLF and bodies split between reads
+        self._check(10, 7, 1, 16)
+        self._check(10, 7, 3, 16)
+
+    def test_big_bodies(self):
+        # Bodies bigger than the buffer
+        self._check(5, 100, 7, 16)
+        self._check(5, 1000, 4096, 64)
+
+    def test_many_replies(self):
+        # Unread data moved back to the start of the buffer
+        self._check(100, 5, 50, 64)
+
+
+class TestBeanstalkPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeBeanstalkd()
+        self.beanstalk = Beanstalk.from_url(self.server.url)
+
+    def tearDown(self):
+        self.beanstalk.close()
+        self.server.stop()
+
+    def test_pipeline(self):
+        pipeline = self.beanstalk.pipeline()
+        for i in range(3):
+            pipeline.put('job%d' % i)
+        self.assertEqual(3, len(pipeline))
+        results = pipeline.execute()
+        self.assertEqual([('INSERTED', ['1']), ('INSERTED', ['2']),
+                          ('INSERTED', ['3'])], results)
+        self.assertEqual(0, len(pipeline))
+        self.assertEqual(1, self.server.reads)
+
+    def test_pipeline_errors(self):
+        self.beanstalk.put('job')
+        self.beanstalk.reserve()
+        pipeline = self.beanstalk.pipeline()
+        pipeline.delete('42')
+        pipeline.delete('1')
+        self.assertRaises(ResponseError, pipeline.execute)
+
+        self.beanstalk.put('job')
+        self.beanstalk.reserve()
+        pipeline.delete('42')
+        pipeline.delete('2')
+        results = pipeline.execute(raise_on_error=False)
+        self.assertIsInstance(results[0], ResponseError)
+        self.assertEqual(('DELETED', []), results[1])
+        # The connection is still usable
+        self.assertEqual([('INSERTED', ['3'])],
+                         self.beanstalk.pipeline().put('job').execute())
+
+    def test_reserve_many(self):
+        for i in range(5):
+            self.beanstalk.put('job%d' % i)
+        jobs = self.beanstalk.reserve_many(3)
+        self.assertEqual([('1', 'job0'), ('2', 'job1'), ('3', 'job2')], jobs)
+        jobs = self.beanstalk.reserve_many(3)
+        self.assertEqual([('4', 'job3'), ('5', 'job4')], jobs)
+
+        pipeline = self.beanstalk.pipeline()
+        for job_id in ('1', '2', '3', '4'):
+            pipeline.delete(job_id)
+        pipeline.bury('5')
+        pipeline.execute()
+        self.assertEqual({}, self.server.reserved)
+        self.assertEqual(['5'], list(self.server.buried))
+
+
+class TestEventWorkerBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeBeanstalkd()
+        self.beanstalk = Beanstalk.from_url(self.server.url)
+        self.worker = EventWorker(os.getppid(), {}, logging.getLogger())
+        self.worker.tube = None
+        self.worker.batch_size = 4
+        self.worker.batch_touch_interval = 30.0
+        self.processed = list()
+
+        def process_event(job_id, event, beanstalk):
+            self.processed.append(job_id)
+            if event['event'] == 'fail':
+                raise Exception('failed')
+            beanstalk.delete(job_id)
+
+        self.worker.process_event = process_event
+
+    def tearDown(self):
+        self.beanstalk.close()
+        self.server.stop()
+
+    def test_batch(self):
+        for event in ('ok', 'ok', 'fail', 'ok', 'ok'):
+            self.beanstalk.put(json.dumps({'event': event}))
+        self.beanstalk.put('malformed')
+        reads = self.server.reads
+        worker = eventlet.spawn(self.worker.handle, self.beanstalk)
+        for _ in range(100):
+            if len(self.processed) == 5 and not self.server.reserved:
+                break
+            eventlet.sleep(0.01)
+        worker.kill(StopServe())
+        self.assertEqual(['1', '2', '3', '4', '5'], self.processed)
+        self.assertEqual({}, self.server.reserved)
+        self.assertEqual(['3', '6'], sorted(self.server.buried))
+        # 2 batches, each with: reserve, reserve-with-timeout (pipelined),
+        # then all acknowledgements (pipelined). Then a last reserve.
+        self.assertEqual(reads + 7, self.server.reads)
+        self.assertEqual([], self.server.touched)
+
+    def test_batch_touch(self):
+        self.worker.batch_touch_interval = 0
+        for _ in range(3):
+            self.beanstalk.put(json.dumps({'event': 'ok'}))
+        self.worker.handle_batch(self.beanstalk.reserve_many(4),
+                                 self.beanstalk)
+        self.assertEqual(['1', '2', '3'], self.processed)
+        self.assertEqual({}, self.server.reserved)
+        # The jobs not processed yet are touched after each job
+        self.assertEqual(['2', '3', '3'], self.server.touched)
+
+
+class TestConsumerGroup(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeBeanstalkd()
+        self.beanstalk = Beanstalk.from_url(self.server.url)
+        self.worker = EventWorker(os.getppid(), {}, logging.getLogger())
+        self.worker.tube = None
+        self.worker.batch_size = 1
+
+        def process_event(job_id, event, beanstalk):
+            eventlet.sleep(0.01)
+            beanstalk.delete(job_id)
+
+        self.worker.process_event = process_event
+        self.group = ConsumerGroup(self.worker, self.server.url,
+                                   eventlet.getcurrent(), 1, 4, interval=0.1)
+
+    def tearDown(self):
+        for consumer in list(self.group.consumers):
+            consumer.kill(StopServe())
+        self.beanstalk.close()
+        self.server.stop()
+
+    def _wait(self, predicate):
+        for _ in range(300):
+            if predicate():
+                return
+            eventlet.sleep(0.01)
+        self.fail('Timeout')
+
+    def test_target_concurrency(self):
+        # Nothing handled yet
+        self.assertEqual(1, self.group.target_concurrency())
+        self.group.ready = 10
+        self.assertEqual(1, self.group.target_concurrency())
+        self.group.spawn(1)
+        self.assertEqual(2, self.group.target_concurrency())
+        # 1s of work for each 0.1s interval, but at most doubled
+        self.group.latency = 0.01
+        self.group.ready = 100
+        self.assertEqual(2, self.group.target_concurrency())
+        self.group.spawn(3)
+        self.assertEqual(4, self.group.target_concurrency())
+        # No more work, but at most reduced by a quarter
+        self.group.ready = 0
+        self.assertEqual(3, self.group.target_concurrency())
+
+    def test_scale(self):
+        for _ in range(40):
+            self.beanstalk.put(json.dumps({'event': 'ok'}))
+        self.group.spawn(1)
+        self._wait(lambda: self.group.handled >= 2)
+        self.group.sample(self.beanstalk)
+        self.assertGreater(self.group.ready, 0)
+        self.group.scale()
+        self.assertEqual(2, self.group.concurrency)
+        self.group.scale()
+        self.assertEqual(4, self.group.concurrency)
+        self.assertEqual(4, len(self.group.consumers))
+
+        self._wait(lambda: not self.server.ready and not self.server.reserved)
+        self.group.sample(self.beanstalk)
+        self.assertEqual(0, self.group.ready)
+        self.group.scale()
+        self.assertEqual(3, self.group.concurrency)
+        # A consumer stops after its next job
+        self.beanstalk.put(json.dumps({'event': 'ok'}))
+        self._wait(lambda: len(self.group.consumers) == 3)
+        self.assertEqual({'url': self.server.url, 'concurrency': 3,
+                          'ready': 0, 'reserved': 0,
+                          'latency': self.group.latency},
+                         self.group.status())
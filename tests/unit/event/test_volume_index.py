@@ -0,0 +1,106 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+import eventlet
+from mock import MagicMock as Mock
+
+from oio.event.consumer import EventTypes
+from oio.event.filters.volume_index import VolumeIndexFilter
+
+
+class FakeRdirClient(object):
+    def __init__(self):
+        self.requests = list()
+
+    def chunk_push_many(self, volume_id, chunks, **_kwargs):
+        self.requests.append(('push', volume_id, list(chunks)))
+        return [(chunk, 'broken') for chunk in chunks
+                if chunk['chunk_id'] == 'bad']
+
+    def chunk_delete_many(self, volume_id, chunks, **_kwargs):
+        self.requests.append(('delete', volume_id, list(chunks)))
+        raise IOError('rdir down')
+
+    def chunk_push(self, volume_id, container_id, content_id, chunk_id,
+                   **kwargs):
+        self.requests.append(('push', volume_id, chunk_id))
+
+
+class FakeApp(object):
+    app_env = dict()
+
+    def __init__(self):
+        self.rdir = FakeRdirClient()
+
+    def __call__(self, env, cb):
+        cb(200, '')
+
+
+class TestVolumeIndexFilter(unittest.TestCase):
+
+    def _filter(self, **conf):
+        conf.setdefault('namespace', 'NS')
+        self.filter = VolumeIndexFilter(FakeApp(), conf, logger=Mock())
+        self.rdir = self.filter.app.rdir
+        self.results = dict()
+
+    def _event(self, job_id, event_type, volume_id, chunk_id):
+        env = {'job_id': job_id,
+               'event': event_type,
+               'when': 2000000,
+               'url': {},
+               'data': {'volume_id': volume_id, 'container_id': 'CID',
+                        'content_id': 'OBJID', 'chunk_id': chunk_id}}
+
+        def cb(status, msg):
+            self.results[job_id] = status
+        return eventlet.spawn(self.filter, env, cb)
+
+    def test_no_batch(self):
+        self._filter()
+        self._event('1', EventTypes.CHUNK_NEW, 'vol1', 'AA').wait()
+        self.assertEqual([('push', 'vol1', 'AA')], self.rdir.requests)
+        self.assertEqual({'1': 200}, self.results)
+
+    def test_batch(self):
+        self._filter(batch_size='3', batch_delay='0.05')
+        coros = [self._event('1', EventTypes.CHUNK_NEW, 'vol1', 'AA'),
+                 self._event('2', EventTypes.CHUNK_NEW, 'vol1', 'bad'),
+                 self._event('3', EventTypes.CHUNK_NEW, 'vol2', 'CC'),
+                 self._event('4', EventTypes.CHUNK_NEW, 'vol1', 'DD'),
+                 self._event('5', EventTypes.CHUNK_DELETED, 'vol1', 'EE')]
+        for coro in coros:
+            coro.wait()
+        self.assertEqual(dict((str(i), 200) for i in range(1, 6)),
+                         self.results)
+
+        requests = sorted(self.rdir.requests)
+        self.assertEqual(['delete', 'push', 'push'],
+                         [action for action, _, _ in requests])
+        # Full batch
+        _, volume_id, records = requests[1]
+        self.assertEqual('vol1', volume_id)
+        self.assertEqual(['AA', 'bad', 'DD'],
+                         [r['chunk_id'] for r in records])
+        self.assertEqual(2, records[0]['mtime'])
+        # Sent after batch_delay
+        self.assertEqual(('push', 'vol2'), requests[2][:2])
+
+        # The errors are reported for each record
+        failed = sorted(call[0][3] for call
+                        in self.filter.logger.warn.call_args_list)
+        self.assertEqual(['EE', 'bad'], failed)
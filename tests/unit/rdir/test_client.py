@@ -0,0 +1,50 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+from mock import MagicMock as Mock, patch
+
+from oio.rdir.client import RdirClient
+
+
+class TestRdirClient(unittest.TestCase):
+
+    def setUp(self):
+        with patch('oio.rdir.client.DirectoryClient'):
+            self.rdir_client = RdirClient({'namespace': 'NS'})
+        self.rdir_client._rdir_request = Mock(
+            return_value=(None, [{'index': 1, 'message': 'boom'}]))
+        self.chunks = [{'container_id': 'CID', 'content_id': 'OBJID',
+                        'chunk_id': chunk_id} for chunk_id in 'ABC']
+
+    def test_chunk_push_many(self):
+        failed = self.rdir_client.chunk_push_many(
+            'vol1', iter(self.chunks))
+        self.rdir_client._rdir_request.assert_called_once_with(
+            'vol1', 'POST', 'push', json=self.chunks, create=True)
+        # Errors are mapped to the records by their index
+        self.assertEqual([(self.chunks[1], 'boom')], failed)
+
+    def test_chunk_delete_many(self):
+        self.rdir_client._rdir_request.return_value = (None, None)
+        failed = self.rdir_client.chunk_delete_many('vol1', self.chunks)
+        self.rdir_client._rdir_request.assert_called_once_with(
+            'vol1', 'DELETE', 'delete', json=self.chunks)
+        self.assertEqual([], failed)
+
+    def test_chunk_many_empty(self):
+        self.assertEqual([], self.rdir_client.chunk_delete_many('vol1', []))
+        self.assertFalse(self.rdir_client._rdir_request.called)
@@ -0,0 +1,168 @@
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3.0 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.
+
+import unittest
+
+import eventlet
+from mock import MagicMock as Mock, patch
+
+from oio.common.exceptions import ContentNotFound
+from oio.rebuilder.blob_rebuilder import BlobRebuilderPipeline, \
+    ChunkRebuildTask
+from tests.unit.content import make_content
+
+
+VOLUME = '127.0.0.1:6010'
+CHUNK_ID = '%s%%d' % ('A' * 63)
+OTHER_CHUNK_ID = '%s%%d' % ('B' * 63)
+
+
+def make_chunks():
+    chunks = list()
+    for pos in range(2):
+        chunks.append({'url': 'http://%s/%s' % (VOLUME, CHUNK_ID % pos),
+                       'pos': str(pos), 'size': 16, 'hash': 'A' * 32})
+        chunks.append({'url': 'http://127.0.0.1:6011/%s' %
+                       (OTHER_CHUNK_ID % pos),
+                       'pos': str(pos), 'size': 16, 'hash': 'A' * 32})
+    return chunks
+
+
+class TestBlobRebuilderPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.container_client = Mock()
+        self.container_client.content_spare = Mock(
+            return_value={'chunks': [{'id': 'http://127.0.0.1:6012/NEW'}]})
+        self.blob_client = Mock()
+
+        def _get(container_id, content_id, **kwargs):
+            if content_id == 'missing':
+                raise ContentNotFound(content_id)
+            return make_content(
+                make_chunks(), container_id=container_id,
+                content_id=content_id, chunk_method='plain/nb_copy=2',
+                policy='TWOCOPIES', container_client=self.container_client,
+                blob_client=self.blob_client)
+
+        conf = {'namespace': 'NS', 'locate_workers': 2, 'spare_workers': 2,
+                'transfer_workers': 3, 'update_workers': 1,
+                'queue_size': 2, 'items_per_second': 0}
+        with patch('oio.rebuilder.blob_rebuilder.RdirClient'), \
+                patch('oio.rebuilder.blob_rebuilder.ContentFactory'):
+            self.pipeline = BlobRebuilderPipeline(conf, Mock(), VOLUME)
+        self.pipeline.content_factory.get = Mock(side_effect=_get)
+        self.pipeline.rdir_client.chunk_delete_many = Mock(return_value=[])
+
+    def test_run(self):
+        chunks = [[cid, content_id, CHUNK_ID % pos, None]
+                  for cid in ('CID1', 'CID2')
+                  for content_id, pos in (('c1', 0), ('c1', 1), ('c2', 0))]
+        chunks.append(['CID1', 'missing', CHUNK_ID % 0, None])
+        self.pipeline.run(chunks)
+
+        self.assertEqual(6, self.pipeline.chunks_processed)
+        self.assertEqual(6 * 16, self.pipeline.bytes_processed)
+        self.assertEqual(1, self.pipeline.errors)
+        self.assertEqual(1, self.pipeline.stats['locate'].errors)
+        self.assertEqual(7, self.pipeline.stats['locate'].items)
+        self.assertEqual(6, self.pipeline.stats['update'].items)
+        self.assertEqual(6, self.blob_client.chunk_copy.call_count)
+        # One request per batch of chunks of the same container
+        updated = list()
+        for call in self.container_client.container_raw_update.call_args_list:
+            updated.extend((call[1]['cid'], bean['content'])
+                           for bean in call[0][0])
+        self.assertEqual(
+            sorted((cid, content_id) for cid, content_id, _, _ in chunks[:6]),
+            sorted(updated))
+        # The chunks are copied from the other volume
+        for call in self.blob_client.chunk_copy.call_args_list:
+            self.assertTrue(call[0][0].startswith('http://127.0.0.1:6011/'))
+        # Account and container name are only asked for once per container
+        self.assertEqual(2, len(self.pipeline.container_names))
+
+        unreferenced = list()
+        for call in self.pipeline.rdir_client.chunk_delete_many.call_args_list:
+            self.assertEqual(VOLUME, call[0][0])
+            unreferenced.extend((r['container_id'], r['content_id'])
+                                for r in call[0][1])
+        self.assertEqual(
+            sorted((cid, content_id) for cid, content_id, _, _ in chunks[:6]),
+            sorted(unreferenced))
+
+    def test_select_spare_batch(self):
+        self.pipeline.volume = None
+        tasks = list()
+        for chunk_id in (CHUNK_ID % 0, OTHER_CHUNK_ID % 0, CHUNK_ID % 1,
+                         CHUNK_ID % 0):
+            tasks.extend(task for task, _ in self.pipeline._locate(
+                [ChunkRebuildTask('CID1', 'c1', chunk_id)]))
+        self.container_client.content_spare = Mock(side_effect=[
+            {'chunks': [{'id': 'http://127.0.0.1:6012/NEW%d%d' % (count, i)}
+                        for i in range(count)]}
+            for count in (2, 1)])
+        results = list(self.pipeline._select_spare(tasks))
+        # One request per metachunk, the duplicate is ignored
+        self.assertEqual(2, self.container_client.content_spare.call_count)
+        self.assertEqual([tasks[3]],
+                         [res for res, err in results if err is not None])
+        self.assertEqual(3, len(set(t.spare_url for t in tasks[:3])))
+
+    def test_stage_worker_exception(self):
+        tasks = [ChunkRebuildTask('CID1', 'c1', CHUNK_ID % i)
+                 for i in range(3)]
+
+        def _broken(batch):
+            yield batch[0], None
+            raise Exception('boom')
+
+        in_queue = eventlet.Queue()
+        out_queue = eventlet.Queue()
+        for task in tasks:
+            in_queue.put(task)
+        worker = eventlet.spawn(self.pipeline._stage_worker, 'transfer',
+                                _broken, 3, in_queue, out_queue)
+        # Returns once all tasks have been marked as done
+        with eventlet.Timeout(5):
+            in_queue.join()
+        worker.kill()
+        self.assertEqual([tasks[0]], [out_queue.get_nowait()])
+        self.assertEqual(2, self.pipeline.stats['transfer'].errors)
+        self.assertEqual(3, self.pipeline.stats['transfer'].items)
+
+    def test_rate_limit(self):
+        conf = {'namespace': 'NS', 'items_per_second': 10, 'workers': 2,
+                'transfer_workers': 8}
+        with patch('oio.rebuilder.blob_rebuilder.RdirClient'), \
+                patch('oio.rebuilder.blob_rebuilder.ContentFactory'), \
+                patch('oio.rebuilder.blob_rebuilder.RateLimiter') as limiter:
+            BlobRebuilderPipeline(conf, Mock(), VOLUME)
+        # Not multiplied by the number of transfer workers
+        limiter.assert_called_once_with(20)
+
+    def test_chunk_not_on_volume(self):
+        self.pipeline.volume = '127.0.0.1:6666'
+        self.pipeline.run([['CID1', 'c1', CHUNK_ID % 0, None]])
+        self.assertEqual(0, self.pipeline.chunks_processed)
+        self.assertEqual(1, self.pipeline.errors)
+        self.assertFalse(self.blob_client.chunk_copy.called)
+
+    def test_report(self):
+        self.pipeline.run([['CID1', 'c1', CHUNK_ID % 1, None]])
+        report = self.pipeline._get_report('DONE', self.pipeline.start_time)
+        for stage in ('locate', 'spare', 'transfer', 'update'):
+            self.assertIn(' %s_chunks=1 ' % stage, report)
+            self.assertIn(' %s_usage=' % stage, report)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# oio-bench-beanstalk-reader.py
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the speed of the beanstalkd reply parser, with the legacy
+`BytesIO` buffer and with the current `bytearray` buffer.
+
+Replies are served from memory, so only the parser cost is measured.
+The peak memory allocated while parsing is reported when
+`tracemalloc` is available (Python 3).
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+from io import BytesIO
+
+from oio.event.beanstalk import Reader
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class MemorySocket(object):
+    """Serve `data` by pieces of at most `piece_size` bytes."""
+
+    def __init__(self, data, piece_size):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.piece_size = piece_size
+
+    def recv(self, size):
+        size = min(size, self.piece_size)
+        data = self.data[self.offset:self.offset + size].tobytes()
+        self.offset += len(data)
+        return data
+
+    def recv_into(self, buf):
+        size = min(len(buf), self.piece_size, len(self.data) - self.offset)
+        buf[:size] = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+
+class LegacyReader(object):
+    """The parser as it was before the `bytearray` buffer."""
+
+    def __init__(self, socket, socket_read_size):
+        self._sock = socket
+        self.socket_read_size = socket_read_size
+        self._buffer = BytesIO()
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    @property
+    def length(self):
+        return self.bytes_written - self.bytes_read
+
+    def _read_from_socket(self, length=None):
+        buf = self._buffer
+        buf.seek(self.bytes_written)
+        marker = 0
+        while True:
+            data = self._sock.recv(self.socket_read_size)
+            buf.write(data)
+            self.bytes_written += len(data)
+            marker += len(data)
+            if length is not None and length > marker:
+                continue
+            break
+
+    def read(self, length):
+        length = length + 2
+        if length > self.length:
+            self._read_from_socket(length - self.length)
+        self._buffer.seek(self.bytes_read)
+        data = self._buffer.read(length)
+        self.bytes_read += len(data)
+        if self.bytes_read == self.bytes_written:
+            self.purge()
+        return data[:-2]
+
+    def readline(self):
+        buf = self._buffer
+        buf.seek(self.bytes_read)
+        data = buf.readline()
+        while not data.endswith(b'\r\n'):
+            self._read_from_socket()
+            buf.seek(self.bytes_read)
+            data = buf.readline()
+        self.bytes_read += len(data)
+        if self.bytes_read == self.bytes_written:
+            self.purge()
+        return data[:-2]
+
+    def purge(self):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+
+def parse_all(reader, count):
+    for _ in range(count):
+        line = reader.readline()
+        reader.read(int(line.split()[2]))
+
+
+def run(name, reader_cls, data, count, piece_size, read_size):
+    reader = reader_cls(MemorySocket(data, piece_size), read_size)
+    start = time.time()
+    parse_all(reader, count)
+    elapsed = time.time() - start
+    memory = ''
+    if tracemalloc is not None:
+        # Another run, tracing allocations slows the parser down
+        tracemalloc.start()
+        reader = reader_cls(MemorySocket(data, piece_size), read_size)
+        parse_all(reader, count)
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = '%8.1f KiB peak' % (peak / 1024.0)
+    print('%-8s %10.0f jobs/s %s' % (name, count / elapsed, memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=200000,
+                        help='Number of replies to parse')
+    parser.add_argument('--body-size', type=int, default=512,
+                        help='Size of the jobs, in bytes')
+    parser.add_argument('--piece-size', type=int, default=16384,
+                        help='Maximum amount of data received at once')
+    parser.add_argument('--read-size', type=int, default=65536,
+                        help='Size of the socket reads of the parser')
+    args = parser.parse_args()
+
+    body = b'x' * args.body_size
+    data = b''.join(b'RESERVED %d %d\r\n%s\r\n' % (i, len(body), body)
+                    for i in range(args.jobs))
+    for name, reader_cls in (('legacy', LegacyReader),
+                             ('current', Reader)):
+        run(name, reader_cls, data, args.jobs,
+            args.piece_size, args.read_size)
+
+
+if __name__ == '__main__':
+    main()
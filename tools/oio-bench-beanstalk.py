@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# oio-bench-beanstalk.py
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure how many jobs per second can be consumed from beanstalkd,
+one job per round trip (reserve, then delete), or by batches
+(pipelined reserves, then pipelined deletes).
+
+No beanstalkd service is involved: a minimal stand-in serves the jobs,
+and simulates the network round trip time.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+from collections import deque
+
+import eventlet
+
+from oio.event.beanstalk import Beanstalk
+
+
+class BeanstalkdStandIn(object):
+    """
+    Serve `count` jobs. Each read from a client is answered
+    after `latency` seconds, like on a real network.
+    """
+
+    def __init__(self, count, body, latency):
+        self.sock = eventlet.listen(('127.0.0.1', 0))
+        self.url = 'beanstalk://127.0.0.1:%d' % self.sock.getsockname()[1]
+        self.jobs = deque((str(i), body) for i in range(count))
+        self.latency = latency
+        self.server = eventlet.spawn(self._serve)
+
+    def _serve(self):
+        while True:
+            client, _ = self.sock.accept()
+            eventlet.spawn(self._handle, client)
+
+    def _handle(self, client):
+        buf = ''
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            buf += data
+            replies = list()
+            while '\r\n' in buf:
+                line, buf = buf.split('\r\n', 1)
+                replies.append(self._command(line.split()))
+            eventlet.sleep(self.latency)
+            client.sendall(''.join(replies))
+        client.close()
+
+    def _command(self, args):
+        if args[0] in ('reserve', 'reserve-with-timeout'):
+            if not self.jobs:
+                return 'TIMED_OUT\r\n'
+            job_id, body = self.jobs.popleft()
+            return 'RESERVED %s %d\r\n%s\r\n' % (job_id, len(body), body)
+        if args[0] == 'delete':
+            return 'DELETED\r\n'
+        return 'UNKNOWN_COMMAND\r\n'
+
+    def stop(self):
+        self.server.kill()
+        self.sock.close()
+
+
+def consume_single(beanstalk, count, _batch_size):
+    for _ in range(count):
+        job_id, _data = beanstalk.reserve(timeout=0)
+        beanstalk.delete(job_id)
+
+
+def consume_batched(beanstalk, count, batch_size):
+    consumed = 0
+    while consumed < count:
+        jobs = beanstalk.reserve_many(batch_size, timeout=0)
+        pipeline = beanstalk.pipeline()
+        for job_id, _data in jobs:
+            pipeline.delete(job_id)
+        pipeline.execute()
+        consumed += len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=10000,
+                        help='Number of jobs to consume')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Number of jobs reserved at once')
+    parser.add_argument('--latency', type=float, default=0.0002,
+                        help='Simulated round trip time, in seconds')
+    parser.add_argument('--body-size', type=int, default=512,
+                        help='Size of the jobs, in bytes')
+    args = parser.parse_args()
+
+    body = 'x' * args.body_size
+    for name, func in (('single', consume_single),
+                       ('batched', consume_batched)):
+        server = BeanstalkdStandIn(args.jobs, body, args.latency)
+        beanstalk = Beanstalk.from_url(server.url)
+        start = time.time()
+        func(beanstalk, args.jobs, args.batch_size)
+        elapsed = time.time() - start
+        beanstalk.close()
+        server.stop()
+        print('%-8s %10.0f jobs/s' % (name, args.jobs / elapsed))
+
+
+if __name__ == '__main__':
+    main()
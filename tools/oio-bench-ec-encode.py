@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# oio-bench-ec-encode.py
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the client-side EC encoding throughput, in MB/s per core,
+of the legacy `ec_encode` generator and of `ECSegmentEncoder`.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import resource
+
+from oio.api.ec import ECSegmentEncoder, ec_encode
+from oio.api.io import WRITE_CHUNK_SIZE
+from oio.common.storage_method import STORAGE_METHODS
+
+
+DEFAULT_POLICIES = ('6+3', '12+3', '14+4')
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def legacy_encode(storage_method, nb_chunks, data):
+    ec_stream = ec_encode(storage_method, nb_chunks)
+    ec_stream.send(None)
+    for i in range(0, len(data), WRITE_CHUNK_SIZE):
+        ec_stream.send(data[i:i + WRITE_CHUNK_SIZE])
+    ec_stream.send(b'')
+
+
+def batched_encode(storage_method, nb_chunks, data):
+    encoder = ECSegmentEncoder(storage_method, nb_chunks)
+    for i in range(0, len(data), WRITE_CHUNK_SIZE):
+        encoder.feed(data[i:i + WRITE_CHUNK_SIZE])
+    encoder.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=256,
+                        help='Amount of data to encode, in MiB')
+    parser.add_argument('--algo', default='liberasurecode_rs_vand',
+                        help='Erasure coding algorithm')
+    parser.add_argument('policies', nargs='*', default=DEFAULT_POLICIES,
+                        metavar='K+M',
+                        help='Data and parity fragment counts (default: %s)'
+                        % ' '.join(DEFAULT_POLICIES))
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * 1024 * 1024)
+    for policy in args.policies:
+        k, m = policy.split('+')
+        storage_method = STORAGE_METHODS.load(
+            'ec/algo=%s,k=%s,m=%s' % (args.algo, k, m))
+        nb_chunks = int(k) + int(m)
+        for name, func in (('legacy', legacy_encode),
+                           ('batched', batched_encode)):
+            start = cpu_time()
+            func(storage_method, nb_chunks, data)
+            elapsed = cpu_time() - start
+            print('%-6s %-8s %8.1f MB/s per core' % (
+                policy, name, len(data) / elapsed / 1000000.0))
+
+
+if __name__ == '__main__':
+    main()
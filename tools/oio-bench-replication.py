@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+# oio-bench-replication.py
+# Copyright (C) 2018 OpenIO SAS, as part of OpenIO SDS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the client CPU time spent uploading replicated chunks.
+
+No rawx service is involved: connections are faked and discard
+the data they are sent, so only the client-side cost is measured.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import os
+import resource
+from io import BytesIO
+
+from mock import patch
+
+from oio.api import io
+from oio.api.replication import ReplicatedMetachunkWriter, \
+    read_chunked_frame
+from oio.common.constants import OIO_VERSION
+from oio.common.storage_method import STORAGE_METHODS
+
+
+GIB = 1024 * 1024 * 1024
+
+
+class NullResponse(object):
+    status = 201
+
+    def getheader(self, *_args):
+        return None
+
+
+class NullConnection(object):
+    """Connection that discards everything it is sent."""
+
+    def send(self, data):
+        # A real socket would copy the data into a kernel buffer
+        len(data)
+
+    def getresponse(self):
+        return NullResponse()
+
+    def close(self):
+        pass
+
+
+def null_connect(*_args, **_kwargs):
+    return NullConnection()
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def legacy_framing(source, replicas):
+    """Framing as it was done before frames were shared by replicas."""
+    while True:
+        data = source.read(io.WRITE_CHUNK_SIZE)
+        if not data:
+            break
+        for _ in range(replicas):
+            data_put = ('%x\r\n' % len(data)).encode()
+            data_put += data + b'\r\n'
+
+
+def shared_framing(source, replicas):
+    """Framing as it is done by ReplicatedMetachunkWriter."""
+    while True:
+        frame, data = read_chunked_frame(source, io.WRITE_CHUNK_SIZE)
+        if not data:
+            break
+        for _ in range(replicas):
+            len(frame)
+
+
+def writer_stream(source, replicas, size):
+    chunk_method = 'plain/nb_copy=%d' % replicas
+    sysmeta = {
+        'id': '705229BB7F330500A65C3A49A3116B83',
+        'version': '1463998577463950',
+        'chunk_method': chunk_method,
+        'container_id': '3E32B63E6039FD3104F63BFAE034FADA'
+                        'A823371DD64599A8779BA02B3439A268',
+        'policy': 'THREECOPIES',
+        'content_path': 'bench',
+        'full_path': ['account/container/bench'],
+        'oio_version': OIO_VERSION,
+    }
+    meta_chunk = [{'url': 'http://127.0.0.1:%d/%064X' % (6000 + i, i),
+                   'pos': '0'}
+                  for i in range(replicas)]
+    with patch('oio.api.io.http_connect', new=null_connect):
+        writer = ReplicatedMetachunkWriter(
+            sysmeta, meta_chunk, hashlib.md5(),
+            STORAGE_METHODS.load(chunk_method), chunk_checksum_algo=None)
+        writer.stream(source, size)
+
+
+def run(name, func, data, replicas, *args):
+    start = cpu_time()
+    func(BytesIO(data), replicas, *args)
+    elapsed = cpu_time() - start
+    print('%-8s %8.3fs CPU per GiB (%d replicas)' % (
+        name, elapsed * GIB / len(data), replicas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=256,
+                        help='Amount of data to upload, in MiB')
+    parser.add_argument('--replicas', type=int, default=3,
+                        help='Number of replicas')
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * 1024 * 1024)
+    run('legacy', legacy_framing, data, args.replicas)
+    run('shared', shared_framing, data, args.replicas)
+    run('writer', writer_stream, data, args.replicas, len(data))
+
+
+if __name__ == '__main__':
+    main()